@@ -0,0 +1,85 @@
+from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+
+from . import profiling
+from .models import RequestProfile
+
+
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('pk',
+                    'created',
+                    'method',
+                    'path',
+                    'view_name',
+                    'status_code',
+                    'duration_ms',
+                    'trigger',
+                    'user',)
+    list_filter = ('trigger', 'view_name', 'created')
+    search_fields = ('path',)
+    list_select_related = ('user',)
+    exclude = ('stats',)
+    readonly_fields = ('created', 'method', 'path', 'view_name', 'user',
+                       'status_code', 'duration_ms', 'trigger', 'downloads',
+                       'top_functions')
+    empty_value_display = '-пусто-'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/stacks/',
+                 self.admin_site.admin_view(self.download_stacks),
+                 name='core_requestprofile_stacks'),
+            path('<int:pk>/pstats/',
+                 self.admin_site.admin_view(self.download_pstats),
+                 name='core_requestprofile_pstats'),
+            *super().get_urls(),
+        ]
+
+    def downloads(self, obj):
+        return format_html(
+            '<a href="{}">стеки для flame graph</a> · '
+            '<a href="{}">.prof</a>',
+            reverse('admin:core_requestprofile_stacks', args=[obj.pk]),
+            reverse('admin:core_requestprofile_pstats', args=[obj.pk]))
+    downloads.short_description = 'Скачать'
+
+    def top_functions(self, obj):
+        return format_html(
+            '<pre>{}</pre>', profiling.top_functions(profiling.load(obj)))
+    top_functions.short_description = 'Самые дорогие функции'
+
+    def download_stacks(self, request, pk):
+        profile = self.get_profile(request, pk)
+        return self.attachment(
+            profiling.folded_stacks(profiling.load(profile)),
+            f'profile-{pk}.folded', 'text/plain; charset=utf-8')
+
+    def download_pstats(self, request, pk):
+        profile = self.get_profile(request, pk)
+        return self.attachment(bytes(profile.stats), f'profile-{pk}.prof',
+                               'application/octet-stream')
+
+    def get_profile(self, request, pk):
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        if not self.has_view_permission(request, profile):
+            raise PermissionDenied
+        return profile
+
+    @staticmethod
+    def attachment(content, filename, content_type):
+        response = HttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+admin.site.register(RequestProfile, RequestProfileAdmin)
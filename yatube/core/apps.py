@@ -1,5 +1,12 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from . import slow_queries, tracing
+        connection_created.connect(slow_queries.install)
+        connection_created.connect(tracing.install)
+        tracing.install_template_hook()
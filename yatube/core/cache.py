@@ -0,0 +1,149 @@
+"""Кеширование фрагментов с поколениями и защитой от лавины пересчётов.
+
+У каждой области (вся лента, группа, автор...) есть номер поколения.
+Он входит в ключ закешированного фрагмента, поэтому после изменения
+данных достаточно увеличить номер: старые фрагменты больше не читаются
+и истекают сами, а TTL можно делать большим.
+
+`get_or_set()` пересчитывает значение один раз на все процессы: заранее
+и с вероятностью, растущей к концу срока (XFetch), под короткой
+блокировкой в кеше; остальные запросы в это время получают старое
+значение.
+
+Если бэкенд поддерживает теги (core.cache_backends.TieredCache),
+фрагменты помечаются своими областями, и смена поколения сразу
+выбрасывает их из памяти всех процессов, не дожидаясь вытеснения.
+"""
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+GENERATION_KEY = 'generation:{}'
+LOCK_KEY = 'lock:{}'
+# сколько секунд держится блокировка пересчёта
+LOCK_TIMEOUT = 10
+# как часто ждущий запрос проверяет, не готово ли значение
+POLL_INTERVAL = 0.05
+# коэффициент XFetch: чем больше, тем раньше начинается пересчёт
+EARLY_RECOMPUTE_BETA = 1.0
+
+
+def _initial_generation():
+    # после вытеснения ключа номер не должен совпасть со старым
+    return int(time.time() * 1000)
+
+
+def get_generations(*scopes):
+    """Номера поколений областей за одно обращение к кешу."""
+    keys = [GENERATION_KEY.format(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        if hasattr(cache, 'add_many'):
+            initial = _initial_generation()
+            cache.add_many(dict.fromkeys(missing, initial), None)
+        else:
+            for key in missing:
+                cache.add(key, _initial_generation(), None)
+        # номер мог положить другой процесс, поэтому он перечитывается
+        found.update(cache.get_many(missing))
+    return [found.get(key) for key in keys]
+
+
+def _supports_tags():
+    return hasattr(cache, 'invalidate_tags')
+
+
+def bump_generation(*scopes):
+    """Делает устаревшими все фрагменты перечисленных областей."""
+    for scope in scopes:
+        key = GENERATION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # номер вытеснен из общего кеша, но мог остаться в L1 других
+            # процессов: incr рассылает его смену, см. TieredCache
+            cache.add(key, _initial_generation(), None)
+            cache.incr(key)
+    if _supports_tags():
+        cache.invalidate_tags(*scopes)
+
+
+def _is_fresh(expires_at, delta, beta):
+    """Значение свежее с учётом вероятностного раннего пересчёта."""
+    early = delta * beta * math.log(1 - random.random())
+    return time.time() - early < expires_at
+
+
+def _wait_for(key, timeout):
+    """Ждёт, пока другой запрос положит значение в кеш."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+        if cache.get(LOCK_KEY.format(key)) is None:
+            return None
+    return None
+
+
+def get_or_set(key, build, timeout, beta=EARLY_RECOMPUTE_BETA, tags=()):
+    """Значение из кеша; при необходимости пересчитывает его через build().
+
+    В кеше хранится тройка (значение, время пересчёта, срок годности),
+    а сама запись живёт вдвое дольше срока: устаревшее значение отдаётся,
+    пока другой запрос держит блокировку и пересчитывает его. Теги
+    передаются бэкенду, если он их поддерживает.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        value, delta, expires_at = entry
+        if _is_fresh(expires_at, delta, beta):
+            return value
+    lock_key = LOCK_KEY.format(key)
+    locked = cache.add(lock_key, True, LOCK_TIMEOUT)
+    if not locked:
+        if entry is not None:
+            return value
+        entry = _wait_for(key, LOCK_TIMEOUT)
+        if entry is not None:
+            return entry[0]
+    try:
+        started = time.time()
+        value = build()
+        delta = time.time() - started
+        entry = (value, delta, time.time() + timeout)
+        if tags and _supports_tags():
+            cache.set(key, entry, timeout * 2, tags=tags)
+        else:
+            cache.set(key, entry, timeout * 2)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return value
+
+
+class GenerationCacheMixin:
+    """Добавляет в контекст версию и время жизни кеша фрагментов.
+
+    Шаблон передаёт `cache_version` в `{% cache %}` среди параметров
+    ключа; области задаёт `get_cache_scopes()`, они же служат тегами
+    фрагментов.
+    """
+    cache_scopes = ()
+
+    def get_cache_scopes(self):
+        return self.cache_scopes
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        scopes = self.get_cache_scopes()
+        context['cache_timeout'] = settings.FRAGMENT_CACHE_TIMEOUT
+        context['cache_scopes'] = scopes
+        context['cache_version'] = '.'.join(
+            str(generation) for generation in get_generations(*scopes))
+        return context
@@ -0,0 +1,397 @@
+import base64
+import pickle
+import time
+from collections import defaultdict, namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DatabaseError, connections, router, transaction
+from django.utils import timezone
+
+from . import invalidation, tracing
+
+STATS_KEY = 'tiered:stats:{}:{}'
+TIERS = ('l1', 'l2')
+RESULTS = ('hits', 'misses')
+# события шины, полученные процессами, и их суммарная задержка
+BUS_STATS = (('bus', 'events'), ('bus', 'lag_ms'))
+
+_MISSING = object()
+# строк в одном INSERT пачки; SQLite ограничивает число параметров
+WRITE_BATCH_SIZE = 100
+
+# значение с тегами; теги нужны читающему процессу для своего индекса L1
+Tagged = namedtuple('Tagged', 'value tags')
+
+
+def traced(method):
+    """Интервал трассы на вызов метода кеша, см. core.tracing."""
+    name = f'cache.{method.__name__}'
+
+    @wraps(method)
+    def wrapper(self, key, *args, **kwargs):
+        if tracing.current() is None:
+            return method(self, key, *args, **kwargs)
+        if isinstance(key, str):
+            attributes = {'key': key}
+        else:
+            key = list(key)
+            attributes = {'keys': len(key)}
+        with tracing.span(name, **attributes):
+            return method(self, key, *args, **kwargs)
+    return wrapper
+
+
+class BatchDatabaseCache(DatabaseCache):
+    """DatabaseCache, который пишет пачку ключей за три запроса.
+
+    Django пишет каждый ключ set_many отдельным set: подсчёт строк,
+    SELECT и INSERT или UPDATE. Здесь подсчёт строк и вытеснение идут
+    один раз на пачку, прежние строки удаляются одним DELETE, новые
+    вставляются одним INSERT. `add_many()` вставляет только ключи,
+    которых нет или которые истекли.
+    """
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        if self._write_many(data, timeout, version, replace=True):
+            return []
+        return list(data)
+
+    def add_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        self._write_many(data, timeout, version, replace=False)
+
+    def _expires(self, timeout):
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is None:
+            expires = datetime.max
+        elif settings.USE_TZ:
+            expires = datetime.utcfromtimestamp(timeout)
+        else:
+            expires = datetime.fromtimestamp(timeout)
+        return expires.replace(microsecond=0)
+
+    def _write_many(self, data, timeout, version, replace):
+        if not data:
+            return True
+        db = router.db_for_write(self.cache_model_class)
+        connection = connections[db]
+        table = connection.ops.quote_name(self._table)
+        now = timezone.now().replace(microsecond=0)
+        expires = connection.ops.adapt_datetimefield_value(
+            self._expires(timeout))
+        rows = []
+        for key, value in data.items():
+            key = self.make_key(key, version)
+            self.validate_key(key)
+            pickled = pickle.dumps(value, self.pickle_protocol)
+            rows.append((key, base64.b64encode(pickled).decode('latin1'),
+                         expires))
+        insert = '%s %s (cache_key, value, expires) VALUES ' % (
+            connection.ops.insert_statement(ignore_conflicts=not replace),
+            table)
+        suffix = connection.ops.ignore_conflicts_suffix_sql(
+            ignore_conflicts=not replace)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM %s' % table)
+            if cursor.fetchone()[0] > self._max_entries:
+                self._cull(db, cursor, now)
+            try:
+                with transaction.atomic(using=db):
+                    for start in range(0, len(rows), WRITE_BATCH_SIZE):
+                        batch = rows[start:start + WRITE_BATCH_SIZE]
+                        keys = [row[0] for row in batch]
+                        sql = 'DELETE FROM %s WHERE cache_key IN (%s)' % (
+                            table, ', '.join(['%s'] * len(keys)))
+                        if not replace:
+                            sql += ' AND expires < %s'
+                            keys.append(
+                                connection.ops.adapt_datetimefield_value(
+                                    now))
+                        cursor.execute(sql, keys)
+                        cursor.execute(
+                            insert + ', '.join(['(%s, %s, %s)'] * len(batch))
+                            + (' ' + suffix if suffix else ''),
+                            [param for row in batch for param in row])
+            except DatabaseError:
+                # как и у DatabaseCache.set, сбой записи не ошибка
+                return False
+        return True
+
+
+class TieredCache(BaseCache):
+    """Двухуровневый кеш: LRU в памяти процесса перед общим кешем.
+
+    LOCATION — алиас общего кеша (L2) в settings.CACHES. Параметры:
+    MAX_ENTRIES — размер L1; L1_TIMEOUT — сколько секунд ключ живёт
+    в L1; SYNC_INTERVAL — как часто процесс читает журнал инвалидаций
+    core.invalidation и сбрасывает изменённые другими процессами ключи;
+    SHARED_PREFIXES — ключи, которые всегда читаются только из L2
+    (блокировки и прочее, что должно быть общим без задержки).
+
+    События в журнал пишут только delete, incr, invalidate_tags и clear.
+    set их не пишет: ключи с поколениями не перезаписываются другими
+    значениями, а перезаписанный ключ живёт в чужих L1 не дольше
+    L1_TIMEOUT. Значение, которое должно смениться сразу во всех
+    процессах, удаляют через delete.
+
+    `set(..., tags=...)` помечает значение тегами, а `invalidate_tags()`
+    сбрасывает помеченные значения во всех процессах. В L2 значения
+    по тегу не удаляются: ключи общего кеша должны меняться сами,
+    как у фрагментов с поколениями в core.cache.
+
+    Счётчики попаданий и промахов по уровням, а также число и задержка
+    полученных событий шины копятся в процессе и при синхронизации
+    складываются в L2, см. команду cache_stats. `track()` считает
+    попадания и промахи внутри одного запроса для core.metrics.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._l2_alias = location
+        self._l1 = LocMemCache(f'tiered:{location}', {
+            'OPTIONS': {'MAX_ENTRIES': self._max_entries,
+                        'CULL_FREQUENCY': self._cull_frequency},
+        })
+        self._l1_timeout = options.get('L1_TIMEOUT', 60)
+        self._sync_interval = options.get('SYNC_INTERVAL', 0.5)
+        self._shared_prefixes = tuple(options.get('SHARED_PREFIXES', ()))
+        self._sync_lock = Lock()
+        self._synced_at = 0
+        self._subscriber = invalidation.Subscriber()
+        self._tagged = defaultdict(set)
+        self.stats = {(tier, result): 0
+                      for tier in TIERS for result in RESULTS}
+        self.stats.update(dict.fromkeys(BUS_STATS, 0))
+        # у каждого потока свой экземпляр кеша, см. CacheHandler
+        self._tracked = None
+
+    def _count(self, tier, result):
+        self.stats[tier, result] += 1
+        if self._tracked is not None:
+            self._tracked[tier, result] += 1
+
+    @contextmanager
+    def track(self):
+        """Попадания и промахи по уровням внутри блока with."""
+        previous = self._tracked
+        self._tracked = {(tier, result): 0
+                         for tier in TIERS for result in RESULTS}
+        try:
+            yield self._tracked
+        finally:
+            self._tracked = previous
+
+    @property
+    def _l2(self):
+        return caches[self._l2_alias]
+
+    def _is_shared(self, key):
+        return key.startswith(self._shared_prefixes)
+
+    def _l1_timeout_for(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return self._l1_timeout
+        return min(timeout, self._l1_timeout)
+
+    def _publish(self, *names, kind=invalidation.KEY):
+        try:
+            if len(names) == 1:
+                self._subscriber.publish(names[0], kind)
+            elif names:
+                self._subscriber.publish_many(names, kind)
+        except DatabaseError:
+            # без журнала чужие L1 сбросятся по L1_TIMEOUT
+            pass
+
+    def _l1_set(self, made_key, value, timeout):
+        if isinstance(value, Tagged):
+            for tag in value.tags:
+                self._tagged[tag].add(made_key)
+        self._l1.set(made_key, value, timeout)
+
+    def _l1_drop_tags(self, tags):
+        for tag in tags:
+            for made_key in self._tagged.pop(tag, ()):
+                self._l1.delete(made_key)
+
+    def _sync(self):
+        if time.monotonic() - self._synced_at < self._sync_interval:
+            return
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            self._synced_at = time.monotonic()
+            for kind, name, lag in self._subscriber.receive():
+                self.stats['bus', 'events'] += 1
+                self.stats['bus', 'lag_ms'] += round(lag * 1000)
+                if kind == invalidation.TAG:
+                    self._l1_drop_tags([name])
+                elif name == invalidation.CLEAR_ALL:
+                    self._l1.clear()
+                    self._tagged.clear()
+                else:
+                    self._l1.delete(name)
+            self.flush_stats()
+        except DatabaseError:
+            pass
+        finally:
+            self._sync_lock.release()
+
+    def flush_stats(self):
+        """Добавляет накопленные счётчики процесса к общим в L2."""
+        for (tier, result), count in self.stats.items():
+            if not count:
+                continue
+            self.stats[tier, result] -= count
+            key = STATS_KEY.format(tier, result)
+            if not self._l2.add(key, count, None):
+                try:
+                    self._l2.incr(key, count)
+                except ValueError:
+                    self._l2.set(key, count, None)
+
+    def shared_stats(self):
+        """Счётчики всех процессов: по уровням и по шине инвалидаций."""
+        keys = {STATS_KEY.format(*stat): stat for stat in self.stats}
+        found = self._l2.get_many(list(keys))
+        return {stat: found.get(key, 0) for key, stat in keys.items()}
+
+    @staticmethod
+    def _unwrap(value):
+        return value.value if isinstance(value, Tagged) else value
+
+    @traced
+    def get(self, key, default=None, version=None):
+        if self._is_shared(key):
+            return self._l2.get(key, default, version)
+        self._sync()
+        made_key = self.make_key(key, version)
+        value = self._l1.get(made_key, _MISSING)
+        if value is not _MISSING:
+            self._count('l1', 'hits')
+        else:
+            self._count('l1', 'misses')
+            value = self._l2.get(key, _MISSING, version)
+            if value is _MISSING:
+                self._count('l2', 'misses')
+                return default
+            self._count('l2', 'hits')
+            self._l1_set(made_key, value, self._l1_timeout)
+        return self._unwrap(value)
+
+    @traced
+    def get_many(self, keys, version=None):
+        """Промахи L1 читаются из L2 одним get_many."""
+        self._sync()
+        found = {}
+        l2_keys = []
+        for key in keys:
+            if self._is_shared(key):
+                l2_keys.append(key)
+                continue
+            value = self._l1.get(self.make_key(key, version), _MISSING)
+            if value is _MISSING:
+                self._count('l1', 'misses')
+                l2_keys.append(key)
+            else:
+                self._count('l1', 'hits')
+                found[key] = value
+        if l2_keys:
+            from_l2 = self._l2.get_many(l2_keys, version)
+            for key in l2_keys:
+                shared = self._is_shared(key)
+                if key not in from_l2:
+                    if not shared:
+                        self._count('l2', 'misses')
+                    continue
+                found[key] = from_l2[key]
+                if not shared:
+                    self._count('l2', 'hits')
+                    self._l1_set(self.make_key(key, version), from_l2[key],
+                                 self._l1_timeout)
+        return {key: self._unwrap(value) for key, value in found.items()}
+
+    @traced
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None,
+            tags=()):
+        if tags:
+            value = Tagged(value, tuple(tags))
+        self._l2.set(key, value, timeout, version)
+        if self._is_shared(key):
+            return
+        self._l1_set(self.make_key(key, version), value,
+                     self._l1_timeout_for(timeout))
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self._l2.set_many(data, timeout, version)
+        l1_timeout = self._l1_timeout_for(timeout)
+        for key, value in data.items():
+            if not self._is_shared(key) and key not in failed:
+                self._l1_set(self.make_key(key, version), value, l1_timeout)
+        return failed
+
+    @traced
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._l2.add(key, value, timeout, version)
+
+    def add_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        """add для каждого ключа; в L1 значения не попадают, как у add."""
+        if hasattr(self._l2, 'add_many'):
+            self._l2.add_many(data, timeout, version)
+            return
+        for key, value in data.items():
+            self._l2.add(key, value, timeout, version)
+
+    @traced
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._l2.touch(key, timeout, version)
+
+    @traced
+    def delete(self, key, version=None):
+        self._l2.delete(key, version)
+        if self._is_shared(key):
+            return
+        made_key = self.make_key(key, version)
+        self._l1.delete(made_key)
+        self._publish(made_key)
+
+    @traced
+    def delete_many(self, keys, version=None):
+        """Удаляет ключи; события о них пишутся одним INSERT."""
+        keys = list(keys)
+        self._l2.delete_many(keys, version)
+        made_keys = [self.make_key(key, version) for key in keys
+                     if not self._is_shared(key)]
+        for made_key in made_keys:
+            self._l1.delete(made_key)
+        self._publish(*made_keys)
+
+    @traced
+    def incr(self, key, delta=1, version=None):
+        value = self._l2.incr(key, delta, version)
+        if not self._is_shared(key):
+            made_key = self.make_key(key, version)
+            self._l1.delete(made_key)
+            self._publish(made_key)
+        return value
+
+    def invalidate_tags(self, *tags):
+        """Сбрасывает значения с этими тегами из L1 всех процессов."""
+        self._l1_drop_tags(tags)
+        self._publish(*tags, kind=invalidation.TAG)
+
+    def clear(self):
+        self._l2.clear()
+        self._l1.clear()
+        self._tagged.clear()
+        self._publish(invalidation.CLEAR_ALL)
@@ -0,0 +1,85 @@
+"""Шина инвалидаций кеша, общая для всех процессов.
+
+Процесс, изменивший ключ или тег, пишет событие в таблицу журнала;
+остальные процессы через `Subscriber` периодически читают новые записи
+и сбрасывают свои локальные копии. Журнал живёт в основной БД, поэтому
+не нужен отдельный брокер, а задержка доставки не больше интервала
+опроса плюс время одного запроса к БД.
+"""
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import CacheInvalidation
+
+KEY = CacheInvalidation.KEY
+TAG = CacheInvalidation.TAG
+CLEAR_ALL = '*'
+# сколько последних записей журнала хранить
+LOG_KEEP = 10000
+
+
+def publish(key, kind=KEY):
+    """Пишет событие в журнал и возвращает его номер."""
+    entry = CacheInvalidation.objects.create(kind=kind, key=key)
+    if entry.pk % LOG_KEEP == 0:
+        CacheInvalidation.objects.filter(pk__lte=entry.pk - LOG_KEEP).delete()
+    return entry.pk
+
+
+def publish_many(keys, kind=KEY):
+    """Пишет события одним INSERT; номера есть не на всех БД."""
+    entries = CacheInvalidation.objects.bulk_create(
+        CacheInvalidation(kind=kind, key=key) for key in keys)
+    return [entry.pk for entry in entries if entry.pk is not None]
+
+
+def last_seq():
+    return CacheInvalidation.objects.aggregate(seq=Max('pk'))['seq'] or 0
+
+
+def poll(after):
+    """События журнала, появившиеся после номера after."""
+    return list(CacheInvalidation.objects.filter(pk__gt=after).order_by(
+        'pk').values_list('pk', 'kind', 'key', 'created'))
+
+
+class Subscriber:
+    """Читатель журнала в одном процессе.
+
+    Пропускает собственные события процесса, чтобы не сбрасывать только
+    что записанные им же значения.
+    """
+
+    def __init__(self):
+        self.seq = None
+        self._own_seqs = set()
+
+    def publish(self, key, kind=KEY):
+        self._own_seqs.add(publish(key, kind))
+
+    def publish_many(self, keys, kind=KEY):
+        self._own_seqs.update(publish_many(keys, kind))
+
+    def receive(self):
+        """Новые чужие события.
+
+        Возвращает тройки (вид, ключ или тег, задержка доставки в секундах
+        от записи события до получения).
+        """
+        if self.seq is None:
+            self.seq = last_seq()
+            return []
+        entries = poll(self.seq)
+        if not entries:
+            # записи журнала могли откатиться вместе с транзакцией
+            self.seq = min(self.seq, last_seq())
+            return []
+        now = timezone.now()
+        events = []
+        for seq, kind, key, created in entries:
+            self.seq = seq
+            if seq in self._own_seqs:
+                self._own_seqs.discard(seq)
+                continue
+            events.append((kind, key, (now - created).total_seconds()))
+        return events
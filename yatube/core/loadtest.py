@@ -0,0 +1,213 @@
+"""Нагрузочный прогон по HTTP с перцентилями задержек по маршрутам.
+
+Потоки-клиенты в течение заданного времени отправляют запросы
+к серверу: каждый запрос с вероятностью anonymous_share идёт от анонима
+(только маршруты без входа), иначе — от случайного вошедшего
+пользователя. Маршрут выбирается по весам. Отчёт — словарь, который
+сохраняется в JSON и сравнивается с прошлым прогоном `compare()`.
+
+`serve()` поднимает сервер разработки Django в потоке того же процесса;
+он делит GIL с клиентами, поэтому для точных чисел лучше указывать
+адрес отдельно запущенного сервера.
+"""
+import http.client
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http import HTTPStatus
+from importlib import import_module
+from itertools import accumulate
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth import (BACKEND_SESSION_KEY, HASH_SESSION_KEY,
+                                 SESSION_KEY)
+from django.core.servers.basehttp import (ThreadedWSGIServer,
+                                          WSGIRequestHandler)
+from django.core.wsgi import get_wsgi_application
+from django.shortcuts import resolve_url
+from django.utils.crypto import get_random_string
+
+from .stats import percentile
+
+PERCENTILES = {'p50': 0.5, 'p95': 0.95, 'p99': 0.99}
+REQUEST_TIMEOUT = 30
+
+
+class Route:
+    """Маршрут сценария.
+
+    path и data — функции от генератора случайных чисел, возвращающие
+    адрес и данные формы; маршрут с data отправляется POST-запросом.
+    Ответ с кодом, отличным от expected_status, — ошибка; перенаправление
+    на страницу входа — тоже, даже если код совпал.
+    """
+
+    def __init__(self, name, weight, path, data=None, login_required=False,
+                 expected_status=HTTPStatus.OK):
+        self.name = name
+        self.weight = weight
+        self.path = path
+        self.data = data
+        self.login_required = login_required
+        self.expected_status = expected_status
+
+    @property
+    def method(self):
+        return 'GET' if self.data is None else 'POST'
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@contextmanager
+def serve(host='127.0.0.1', port=0):
+    """Сервер разработки в фоновом потоке; отдаёт его адрес."""
+    server = ThreadedWSGIServer((host, port), QuietRequestHandler)
+    server.set_app(get_wsgi_application())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://{host}:{server.server_port}'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def login_session(user):
+    """Ключ сессии вошедшего пользователя, как после входа по паролю."""
+    engine = import_module(settings.SESSION_ENGINE)
+    session = engine.SessionStore()
+    session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+    return session.session_key
+
+
+class Worker(threading.Thread):
+    """Клиент: шлёт запросы до конца прогона и копит замеры."""
+
+    def __init__(self, base_url, routes, sessions, anonymous_share,
+                 seed, warmup_until, stop_at):
+        super().__init__(daemon=True)
+        address = urlsplit(base_url)
+        self.host, self.port = address.hostname, address.port
+        self.prefix = address.path.rstrip('/')
+        self.anonymous = [route for route in routes
+                          if not route.login_required]
+        self.routes = routes
+        self.sessions = sessions
+        self.anonymous_share = anonymous_share if sessions else 1
+        self.rng = random.Random(seed)
+        self.warmup_until = warmup_until
+        self.stop_at = stop_at
+        self.csrf_token = get_random_string(64)
+        self.login_path = resolve_url(settings.LOGIN_URL)
+        self.results = []
+
+    def choose(self, routes):
+        weights = list(accumulate(route.weight for route in routes))
+        return self.rng.choices(routes, cum_weights=weights)[0]
+
+    def request(self, route, session_key):
+        cookies = {settings.CSRF_COOKIE_NAME: self.csrf_token}
+        if session_key:
+            cookies[settings.SESSION_COOKIE_NAME] = session_key
+        headers = {'Cookie': '; '.join(
+            f'{name}={value}' for name, value in cookies.items())}
+        body = None
+        if route.data is not None:
+            body = urlencode(route.data(self.rng))
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            headers['X-CSRFToken'] = self.csrf_token
+        connection = http.client.HTTPConnection(
+            self.host, self.port, timeout=REQUEST_TIMEOUT)
+        try:
+            connection.request(route.method,
+                               self.prefix + route.path(self.rng),
+                               body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            location = urlsplit(response.getheader('Location', '')).path
+            return (response.status == route.expected_status
+                    and location != self.login_path)
+        except (OSError, http.client.HTTPException):
+            return False
+        finally:
+            connection.close()
+
+    def run(self):
+        while time.monotonic() < self.stop_at:
+            if self.rng.random() < self.anonymous_share:
+                route, session_key = self.choose(self.anonymous), None
+            else:
+                route = self.choose(self.routes)
+                session_key = self.rng.choice(self.sessions)
+            started = time.monotonic()
+            ok = self.request(route, session_key)
+            if started >= self.warmup_until:
+                self.results.append(
+                    (route.name, time.monotonic() - started, ok))
+
+
+def summarize(results, duration):
+    """Число запросов, ошибок, пропускная способность и задержки в мс."""
+    timings = [elapsed for _, elapsed, _ in results]
+    summary = {
+        'requests': len(results),
+        'errors': sum(not ok for _, _, ok in results),
+        'throughput': len(results) / duration,
+    }
+    for label, share in PERCENTILES.items():
+        summary[label] = percentile(timings, share) * 1000 if timings else 0
+    return summary
+
+
+def run(base_url, routes, sessions=(), anonymous_share=0.7, concurrency=8,
+        duration=30, warmup=3, seed=0):
+    """Прогон нагрузки; замеры первых warmup секунд отбрасываются."""
+    started = time.monotonic()
+    workers = [
+        Worker(base_url, routes, list(sessions), anonymous_share,
+               seed + number, started + warmup, started + warmup + duration)
+        for number in range(concurrency)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    results = [result for worker in workers for result in worker.results]
+    return {
+        'url': base_url,
+        'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'duration': duration,
+        'concurrency': concurrency,
+        'anonymous_share': anonymous_share,
+        'total': summarize(results, duration),
+        'routes': {
+            route.name: summarize(
+                [result for result in results if result[0] == route.name],
+                duration)
+            for route in routes
+        },
+    }
+
+
+def compare(report, baseline, metrics=('throughput', 'p50', 'p95', 'p99')):
+    """Строки (маршрут, метрика, было, стало, изменение в долях)."""
+    rows = []
+    routes = {'total': report['total'], **report['routes']}
+    before_routes = {'total': baseline['total'], **baseline['routes']}
+    for name, after in routes.items():
+        before = before_routes.get(name)
+        if before is None:
+            continue
+        for metric in metrics:
+            old, new = before[metric], after[metric]
+            change = (new - old) / old if old else 0
+            rows.append((name, metric, old, new, change))
+    return rows
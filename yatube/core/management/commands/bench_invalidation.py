@@ -0,0 +1,110 @@
+import multiprocessing
+import time
+
+from core import invalidation
+from core.cache_backends import TieredCache
+from core.stats import percentile
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+BENCH_KEY = 'bench:invalidation:{}'
+
+
+def listen(events, interval, timeout, results):
+    """Процесс-слушатель: опрашивает шину и отдаёт задержки доставки."""
+    subscriber = invalidation.Subscriber()
+    subscriber.receive()
+    results.put('ready')
+    lags = []
+    deadline = time.monotonic() + timeout
+    while len(lags) < events and time.monotonic() < deadline:
+        time.sleep(interval)
+        lags.extend(
+            lag for _, key, lag in subscriber.receive()
+            if key.startswith(BENCH_KEY.format('')))
+    connections.close_all()
+    results.put(lags)
+
+
+class Command(BaseCommand):
+    help = ('Замеряет накладные расходы шины инвалидаций на запись в кеш '
+            'и задержку доставки событий в другие процессы. Нужна '
+            'файловая БД: события пишутся в журнал core.CacheInvalidation.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--writes', type=int, default=1000,
+            help='Сколько записей в кеш сделать для замера '
+                 'накладных расходов.')
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Сколько процессов-слушателей запустить.')
+        parser.add_argument(
+            '--events', type=int, default=200,
+            help='Сколько событий отправить слушателям.')
+        parser.add_argument(
+            '--interval', type=float, default=None,
+            help='Интервал опроса шины, по умолчанию SYNC_INTERVAL кеша.')
+        parser.add_argument(
+            '--spacing', type=float, default=0.01,
+            help='Пауза между событиями, секунды.')
+
+    def handle(self, *args, **options):
+        cache = caches['default']
+        if not isinstance(cache, TieredCache):
+            raise CommandError('Кеш по умолчанию не TieredCache.')
+        self.measure_overhead(cache, options['writes'])
+        interval = options['interval']
+        if interval is None:
+            interval = cache._sync_interval
+        self.measure_lag(options['workers'], options['events'], interval,
+                         options['spacing'])
+
+    def measure_overhead(self, cache, writes):
+        shared = caches[cache._l2_alias]
+        timings = {}
+        backends = (('общий кеш', shared), ('двухуровневый', cache))
+        for label, backend in backends:
+            started = time.perf_counter()
+            for number in range(writes):
+                backend.set(BENCH_KEY.format(number), number)
+            timings[label] = (time.perf_counter() - started) / writes
+        for number in range(writes):
+            shared.delete(BENCH_KEY.format(number))
+        for label, timing in timings.items():
+            self.stdout.write(f'запись, {label}: {timing * 1000:.3f} мс')
+        overhead = timings['двухуровневый'] - timings['общий кеш']
+        self.stdout.write(f'накладные расходы шины: {overhead * 1000:.3f} мс')
+
+    def measure_lag(self, workers, events, interval, spacing):
+        # дочерние процессы не должны делить соединения с родителем
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        timeout = events * spacing + interval * 4 + 10
+        processes = [
+            context.Process(
+                target=listen, args=(events, interval, timeout, results))
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        for _ in processes:
+            results.get(timeout=timeout)
+        for number in range(events):
+            invalidation.publish(BENCH_KEY.format(number))
+            time.sleep(spacing)
+        lags = []
+        for _ in processes:
+            lags.extend(results.get(timeout=timeout))
+        for process in processes:
+            process.join()
+        self.stdout.write(
+            f'доставлено {len(lags)} из {events * workers} событий, '
+            f'интервал опроса {interval * 1000:.0f} мс')
+        if lags:
+            self.stdout.write(
+                f'задержка p50 {percentile(lags, 0.5) * 1000:.1f} мс, '
+                f'p95 {percentile(lags, 0.95) * 1000:.1f} мс, '
+                f'максимум {max(lags) * 1000:.1f} мс')
@@ -0,0 +1,27 @@
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+
+from core.cache_backends import TIERS, TieredCache
+
+
+class Command(BaseCommand):
+    help = ('Показывает попадания и промахи кеша по уровням и задержку '
+            'доставки событий шины инвалидаций, собранные всеми процессами.')
+
+    def handle(self, *args, **options):
+        cache = caches['default']
+        if not isinstance(cache, TieredCache):
+            raise CommandError('Кеш по умолчанию не TieredCache.')
+        stats = cache.shared_stats()
+        for tier in TIERS:
+            hits = stats[tier, 'hits']
+            misses = stats[tier, 'misses']
+            total = hits + misses
+            ratio = hits / total if total else 0
+            self.stdout.write(
+                f'{tier}: попаданий {hits}, промахов {misses}, '
+                f'доля попаданий {ratio:.1%}')
+        events = stats['bus', 'events']
+        lag = stats['bus', 'lag_ms'] / events if events else 0
+        self.stdout.write(
+            f'шина: получено событий {events}, средняя задержка {lag:.0f} мс')
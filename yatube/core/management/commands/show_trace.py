@@ -0,0 +1,62 @@
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from .slow_queries import log_files
+
+
+class Command(BaseCommand):
+    help = ('Выводит дерево интервалов трассы из журнала трасс: '
+            'по идентификатору, самую долгую или последнюю.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('trace_id', nargs='?',
+                            help='Идентификатор трассы (X-Trace-Id).')
+        parser.add_argument(
+            '--log', default=settings.TRACING_LOG,
+            help='Файл журнала; ротированные копии читаются тоже.')
+        parser.add_argument(
+            '--slowest', action='store_true',
+            help='Самая долгая трасса вместо последней.')
+
+    def handle(self, *args, **options):
+        files = log_files(options['log'], settings.TRACING_LOG_BACKUPS)
+        if not files:
+            raise CommandError(f'Журнал {options["log"]} не найден.')
+        found = None
+        for name in files:
+            with open(name, encoding='utf-8') as log:
+                for line in log:
+                    trace = json.loads(line)
+                    if options['trace_id']:
+                        if trace['trace_id'] == options['trace_id']:
+                            found = trace
+                    elif (not options['slowest'] or found is None
+                          or self.duration(trace) > self.duration(found)):
+                        found = trace
+        if found is None:
+            raise CommandError(f'Трасса {options["trace_id"]} не найдена.')
+        self.stdout.write(self.style.WARNING(
+            f'{found["trace_id"]}: {found["method"]} {found["path"]} '
+            f'({found["view"]}, {found["status"]}), '
+            f'{self.duration(found):.1f} мс'))
+        children = defaultdict(list)
+        for span in found['spans']:
+            children[span['parent']].append(span)
+        self.write_tree(children, None, 0)
+
+    @staticmethod
+    def duration(trace):
+        return trace['spans'][0]['duration_ms']
+
+    def write_tree(self, children, parent, depth):
+        for span in children[parent]:
+            attributes = ' '.join(
+                f'{name}={value}'
+                for name, value in span['attributes'].items())
+            self.stdout.write(
+                f'{span["start_ms"]:>9.1f} {span["duration_ms"]:>8.1f} мс '
+                f'{"  " * depth}{span["name"]} {attributes}'.rstrip())
+            self.write_tree(children, span['id'], depth + 1)
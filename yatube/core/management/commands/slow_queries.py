@@ -0,0 +1,59 @@
+import json
+import os
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def log_files(path, backups):
+    """Файл журнала и его ротированные копии, от старых к новым."""
+    names = [f'{path}.{number}' for number in range(backups, 0, -1)]
+    return [name for name in [*names, path] if os.path.exists(name)]
+
+
+class Command(BaseCommand):
+    help = ('Сводка журнала медленных запросов: отпечатки запросов '
+            'по суммарному времени, с числом повторов, средним '
+            'и наибольшим временем, основными view и последним планом.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--log', default=settings.SLOW_QUERY_LOG,
+            help='Файл журнала; ротированные копии читаются тоже.')
+        parser.add_argument('--top', type=int, default=10,
+                            help='Сколько отпечатков вывести.')
+
+    def handle(self, *args, **options):
+        files = log_files(options['log'], settings.SLOW_QUERY_LOG_BACKUPS)
+        if not files:
+            raise CommandError(f'Журнал {options["log"]} не найден.')
+        groups = {}
+        for name in files:
+            with open(name, encoding='utf-8') as log:
+                for line in log:
+                    entry = json.loads(line)
+                    group = groups.setdefault(entry['fingerprint_id'], {
+                        'fingerprint': entry['fingerprint'],
+                        'count': 0, 'total': 0, 'max': 0,
+                        'views': Counter(),
+                    })
+                    group['count'] += 1
+                    group['total'] += entry['duration_ms']
+                    group['max'] = max(group['max'], entry['duration_ms'])
+                    group['views'][entry['view'] or '-'] += 1
+                    group['plan'] = entry['plan']
+        top = sorted(groups.items(), key=lambda item: -item[1]['total'])
+        for fingerprint_id, group in top[:options['top']]:
+            views = ', '.join(
+                f'{view} ({count})'
+                for view, count in group['views'].most_common(3))
+            self.stdout.write(self.style.WARNING(
+                f'{fingerprint_id}: всего {group["total"]:.0f} мс, '
+                f'запросов {group["count"]}, '
+                f'среднее {group["total"] / group["count"]:.1f} мс, '
+                f'наибольшее {group["max"]:.1f} мс'))
+            self.stdout.write(f'  view: {views}')
+            self.stdout.write(f'  {group["fingerprint"]}')
+            for detail in group['plan'] or ():
+                self.stdout.write(f'    {detail}')
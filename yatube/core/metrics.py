@@ -0,0 +1,196 @@
+"""Метрики запросов по именам view в формате Prometheus.
+
+`RequestMetricsMiddleware` для каждого запроса записывает в реестр
+процесса время ответа, число и время запросов к БД, попадания и промахи
+кеша и время отрисовки шаблона. Реестр копит гистограммы и счётчики
+с начала работы процесса и раз в METRICS_FLUSH_INTERVAL секунд
+сохраняет их целиком в свою строку `MetricsSnapshot`. Каждый процесс
+пишет только свою строку, поэтому процессы не мешают друг другу,
+а `/metrics` складывает строки всех процессов.
+"""
+import json
+import os
+import socket
+import time
+import uuid
+from threading import Lock
+
+from .models import MetricsSnapshot
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# границы корзин гистограмм, секунды, как у клиентов Prometheus
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+REQUEST_DURATION = 'yatube_request_duration_seconds'
+SQL_DURATION = 'yatube_sql_duration_seconds'
+TEMPLATE_DURATION = 'yatube_template_render_seconds'
+SQL_QUERIES = 'yatube_sql_queries_total'
+CACHE_HITS = 'yatube_cache_hits_total'
+CACHE_MISSES = 'yatube_cache_misses_total'
+HISTOGRAMS = {
+    REQUEST_DURATION: 'Время ответа на запрос, секунды.',
+    SQL_DURATION: 'Время запросов к БД за один запрос, секунды.',
+    TEMPLATE_DURATION: 'Время отрисовки шаблона ответа, секунды.',
+}
+COUNTERS = {
+    SQL_QUERIES: 'Число запросов к БД.',
+    CACHE_HITS: 'Попадания в кеш.',
+    CACHE_MISSES: 'Промахи кеша.',
+}
+# имя для запросов, адрес которых не соответствует ни одной view
+UNRESOLVED = '<unresolved>'
+
+
+def _empty_histogram():
+    return {'buckets': [0] * (len(BUCKETS) + 1), 'sum': 0, 'count': 0}
+
+
+class Registry:
+    """Гистограммы и счётчики процесса с метками по имени view.
+
+    После fork реестр начинается заново под новым именем процесса,
+    чтобы дочерние процессы не перезаписывали строку родителя.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._flush_lock = Lock()
+        self._pid = None
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self.process = (f'{socket.gethostname()}:{self._pid}:'
+                        f'{uuid.uuid4().hex[:8]}')
+        self.histograms = {name: {} for name in HISTOGRAMS}
+        self.counters = {name: {} for name in COUNTERS}
+        self._flushed_at = time.monotonic()
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            self._reset()
+
+    def observe(self, name, view, value):
+        with self._lock:
+            self._check_fork()
+            histogram = self.histograms[name].setdefault(
+                view, _empty_histogram())
+            index = next((number for number, bound in enumerate(BUCKETS)
+                          if value <= bound), len(BUCKETS))
+            histogram['buckets'][index] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def inc(self, name, view, amount=1):
+        with self._lock:
+            self._check_fork()
+            counters = self.counters[name]
+            counters[view] = counters.get(view, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            self._check_fork()
+            return json.loads(json.dumps(
+                {'histograms': self.histograms, 'counters': self.counters}))
+
+    def flush(self):
+        """Сохраняет накопленное процессом в его строку."""
+        data = json.dumps(self.snapshot())
+        self._flushed_at = time.monotonic()
+        MetricsSnapshot.objects.update_or_create(
+            process=self.process, defaults={'data': data})
+
+    def maybe_flush(self, interval):
+        """Сохраняет, если с прошлого раза прошло interval секунд."""
+        if time.monotonic() - self._flushed_at < interval:
+            return
+        if not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            self.flush()
+        finally:
+            self._flush_lock.release()
+
+
+registry = Registry()
+
+
+def record(view, duration, sql_count, sql_duration, cache_hits,
+           cache_misses, template_duration=None):
+    registry.observe(REQUEST_DURATION, view, duration)
+    registry.observe(SQL_DURATION, view, sql_duration)
+    if template_duration is not None:
+        registry.observe(TEMPLATE_DURATION, view, template_duration)
+    registry.inc(SQL_QUERIES, view, sql_count)
+    registry.inc(CACHE_HITS, view, cache_hits)
+    registry.inc(CACHE_MISSES, view, cache_misses)
+
+
+def server_timing(duration, sql_count, sql_duration, cache_hits,
+                  cache_misses, template_duration=None):
+    """Значение заголовка Server-Timing, длительности в миллисекундах."""
+    parts = [
+        f'total;dur={duration * 1000:.1f}',
+        f'db;dur={sql_duration * 1000:.1f};desc="{sql_count} queries"',
+        f'cache;desc="{cache_hits} hits, {cache_misses} misses"',
+    ]
+    if template_duration is not None:
+        parts.append(f'template;dur={template_duration * 1000:.1f}')
+    return ', '.join(parts)
+
+
+def merge(snapshots):
+    """Сумма снимков нескольких процессов."""
+    merged = {'histograms': {name: {} for name in HISTOGRAMS},
+              'counters': {name: {} for name in COUNTERS}}
+    for snapshot in snapshots:
+        for name, views in snapshot.get('histograms', {}).items():
+            for view, histogram in views.items():
+                total = merged['histograms'].setdefault(name, {}).setdefault(
+                    view, _empty_histogram())
+                total['buckets'] = [
+                    a + b for a, b in zip(total['buckets'],
+                                          histogram['buckets'])]
+                total['sum'] += histogram['sum']
+                total['count'] += histogram['count']
+        for name, views in snapshot.get('counters', {}).items():
+            totals = merged['counters'].setdefault(name, {})
+            for view, value in views.items():
+                totals[view] = totals.get(view, 0) + value
+    return merged
+
+
+def collect():
+    """Метрики всех процессов, включая несохранённые данные текущего."""
+    registry.flush()
+    return merge(json.loads(data) for data in
+                 MetricsSnapshot.objects.values_list('data', flat=True))
+
+
+def _label(view, **extra):
+    labels = {'view': view, **extra}
+    return ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', r'\\').replace(
+            '"', r'\"').replace('\n', r'\n'))
+        for name, value in labels.items())
+
+
+def exposition(merged):
+    """Текстовый формат Prometheus 0.0.4."""
+    lines = []
+    for name, help_text in HISTOGRAMS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for view, histogram in sorted(merged['histograms'][name].items()):
+            cumulative = 0
+            for bound, count in zip((*BUCKETS, '+Inf'),
+                                    histogram['buckets']):
+                cumulative += count
+                lines.append(
+                    f'{name}_bucket{{{_label(view, le=bound)}}} {cumulative}')
+            lines.append(f'{name}_sum{{{_label(view)}}} {histogram["sum"]}')
+            lines.append(
+                f'{name}_count{{{_label(view)}}} {histogram["count"]}')
+    for name, help_text in COUNTERS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for view, value in sorted(merged['counters'][name].items()):
+            lines.append(f'{name}{{{_label(view)}}} {value}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,277 @@
+import cProfile
+import logging
+import random
+import time
+import uuid
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from django.utils.cache import has_vary_header
+from django.utils.encoding import iri_to_uri
+
+from . import metrics, profiling, slow_queries, tracing
+from .cache import LOCK_TIMEOUT, POLL_INTERVAL
+from .query_budget import QueryBudgetExceeded, QueryCounter, view_budget
+
+logger = logging.getLogger(__name__)
+
+COALESCE_KEY = 'coalesce:{}'
+# сколько живёт ответ, сохранённый для ждущих запросов
+RESULT_TIMEOUT = 5
+
+
+class RequestCoalescingMiddleware:
+    """Объединяет одинаковые одновременные GET-запросы анонимов.
+
+    Первый запрос к адресу берёт блокировку в кеше и вызывает view.
+    Запросы к тому же адресу, пришедшие, пока он работает, ждут его
+    ответ и отдают копию, не доходя до view. Ответы с cookie,
+    с CSRF-токеном, с Vary: Cookie и со статусом, отличным от 200,
+    ждущим не передаются: cookie CSRF и сессии добавляют внешние
+    middleware уже после публикации.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method != 'GET' or request.user.is_authenticated:
+            return self.get_response(request)
+        lock_key = COALESCE_KEY.format(iri_to_uri(request.get_full_path()))
+        token = uuid.uuid4().hex
+        if cache.add(lock_key, token, LOCK_TIMEOUT):
+            try:
+                response = self.get_response(request)
+                self.publish(token, request, response)
+            finally:
+                cache.delete(lock_key)
+            return response
+        leader = cache.get(lock_key)
+        if leader is not None:
+            response = self.wait(lock_key, leader)
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    @staticmethod
+    def publish(token, request, response):
+        """Сохраняет ответ, если его ждут другие запросы."""
+        if (cache.get(COALESCE_KEY.format(f'{token}:waiting')) is None
+                or response.status_code != 200 or response.streaming
+                or response.cookies
+                or request.META.get('CSRF_COOKIE_USED')
+                or has_vary_header(response, 'Cookie')):
+            return
+        cache.set(COALESCE_KEY.format(f'{token}:result'),
+                  (response.content, list(response.items())),
+                  RESULT_TIMEOUT)
+
+    @staticmethod
+    def wait(lock_key, token):
+        """Ждёт ответ первого запроса; None, если он не дождался."""
+        cache.set(COALESCE_KEY.format(f'{token}:waiting'), True,
+                  LOCK_TIMEOUT)
+        result_key = COALESCE_KEY.format(f'{token}:result')
+        deadline = time.time() + LOCK_TIMEOUT
+        while time.time() < deadline:
+            # ответ публикуется до снятия блокировки, поэтому проверяем
+            # блокировку раньше, чем ответ
+            leader_alive = cache.get(lock_key) == token
+            result = cache.get(result_key)
+            if result is not None:
+                content, headers = result
+                response = HttpResponse(content)
+                for header, value in headers:
+                    response[header] = value
+                return response
+            if not leader_alive:
+                return None
+            time.sleep(POLL_INTERVAL)
+        return None
+
+
+class QueryBudgetMiddleware:
+    """Проверяет, что view уложилась в свой бюджет запросов к БД.
+
+    Считаются все запросы, выполненные ниже этого middleware,
+    включая загрузку сессии и пользователя; запросы к кешу сверяются
+    с отдельным бюджетом, см. core.query_budget.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.query_budget = None
+        with QueryCounter(settings.QUERY_BUDGET_CACHE_TABLES) as counter:
+            response = self.get_response(request)
+        budget = request.query_budget
+        cache_budget = settings.QUERY_BUDGET_CACHE
+        if budget is None or (counter.count <= budget
+                              and counter.cache_count <= cache_budget):
+            return response
+        message = (f'{request.method} {request.path}: '
+                   f'{counter.count} запросов при бюджете {budget}, '
+                   f'{counter.cache_count} запросов к кешу '
+                   f'при бюджете {cache_budget}')
+        if settings.QUERY_BUDGET_STRICT:
+            queries = (counter.queries if counter.count > budget
+                       else counter.cache_queries)
+            raise QueryBudgetExceeded('\n'.join([message, *queries]))
+        logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = view_budget(view_func)
+
+
+class RequestMetricsMiddleware:
+    """Записывает метрики запроса по имени view, см. core.metrics.
+
+    Стоит первым, чтобы время ответа включало все middleware. Время
+    отрисовки шаблона измеряется только у TemplateResponse и включает
+    запросы к БД, выполненные во время отрисовки. Сводка по запросу
+    добавляется в заголовок Server-Timing. Имя view передаётся
+    и журналу медленных запросов core.slow_queries.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.template_duration = None
+        started = time.perf_counter()
+        tracking = (cache.track() if hasattr(cache, 'track')
+                    else nullcontext({}))
+        try:
+            with QueryCounter() as queries, tracking as cache_stats:
+                response = self.get_response(request)
+        finally:
+            slow_queries.set_view(None)
+        duration = time.perf_counter() - started
+        hits = cache_stats.get(('l1', 'hits'), 0) + cache_stats.get(
+            ('l2', 'hits'), 0)
+        misses = cache_stats.get(('l2', 'misses'), 0)
+        sample = (duration, queries.count, queries.duration, hits, misses,
+                  request.template_duration)
+        metrics.record(self.view_name(request), *sample)
+        if settings.METRICS_SERVER_TIMING:
+            response['Server-Timing'] = metrics.server_timing(*sample)
+        metrics.registry.maybe_flush(settings.METRICS_FLUSH_INTERVAL)
+        return response
+
+    @staticmethod
+    def view_name(request):
+        # ответ, отданный до разбора адреса (например, объединённый
+        # запрос), тоже записывается под именем своей view
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            try:
+                match = resolve(request.path_info)
+            except Resolver404:
+                return metrics.UNRESOLVED
+        return match.view_name
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        slow_queries.set_view(request.resolver_match.view_name)
+
+    def process_template_response(self, request, response):
+        # middleware стоит первым, поэтому вызывается последним,
+        # сразу перед отрисовкой
+        started = time.perf_counter()
+
+        def rendered(response):
+            request.template_duration = time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+
+class ProfilingMiddleware:
+    """Профилирует запрос через cProfile, см. core.profiling.
+
+    Стоит последним, после DebugToolbarMiddleware, поэтому в профиль
+    попадают view и отрисовка TemplateResponse, а не остальные
+    middleware. Без заголовка
+    от сотрудника и вне выборки запрос не профилируется.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reason = profiling.trigger(request)
+        if reason is None:
+            return self.get_response(request)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # профилировщик уже запущен, например, в другом потоке
+            return self.get_response(request)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        profiling.save(profiler, request, response,
+                       time.perf_counter() - started, reason)
+        return response
+
+
+class TracingMiddleware:
+    """Записывает трассу запроса, см. core.tracing.
+
+    Стоит сразу после AuthenticationMiddleware: заголовок трассировки
+    учитывается только от сотрудника, остальным он ничего не стоит.
+    Сессия и аутентификация в трассу не попадают. Интервал middleware
+    длится до вызова view, интервал view — до возврата ответа или,
+    у TemplateResponse, до начала отрисовки.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        requested = (request.META.get(settings.TRACING_HEADER)
+                     and request.user.is_staff)
+        sampled = random.random() < settings.TRACING_SAMPLE_RATE
+        if not (requested or sampled):
+            return self.get_response(request)
+        trace = tracing.start()
+        root = trace.open('request', {})
+        request.trace_spans = [trace.open('middleware', {})]
+        try:
+            response = self.get_response(request)
+        except Exception as error:
+            trace.close(root, error)
+            raise
+        finally:
+            tracing.finish()
+        for span in request.trace_spans:
+            if span['duration_ms'] is None:
+                trace.close(span)
+        trace.close(root)
+        tracing.export(
+            trace, method=request.method, path=request.get_full_path(),
+            view=RequestMetricsMiddleware.view_name(request),
+            status=response.status_code)
+        response['X-Trace-Id'] = trace.id
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        trace = tracing.current()
+        if trace is None:
+            return
+        trace.close(request.trace_spans[-1])
+        request.trace_spans.append(trace.open(
+            'view', {'view': request.resolver_match.view_name}))
+
+    def process_template_response(self, request, response):
+        trace = tracing.current()
+        if trace is not None and request.trace_spans:
+            trace.close(request.trace_spans[-1])
+        return response
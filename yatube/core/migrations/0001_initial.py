@@ -0,0 +1,25 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheInvalidation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=250, verbose_name='Ключ')),
+            ],
+            options={
+                'verbose_name': 'инвалидация кеша',
+                'verbose_name_plural': 'инвалидации кеша',
+            },
+        ),
+    ]
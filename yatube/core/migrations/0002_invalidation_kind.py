@@ -0,0 +1,25 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cacheinvalidation',
+            name='kind',
+            field=models.CharField(choices=[('key', 'Ключ'), ('tag', 'Тег')], default='key', max_length=3, verbose_name='Вид'),
+        ),
+        migrations.AddField(
+            model_name='cacheinvalidation',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата создания'),
+            preserve_default=False,
+        ),
+    ]
@@ -19,3 +19,73 @@ class CreatedModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class CacheInvalidation(models.Model):
+    """Журнал изменений ключей и тегов кеша для сброса локальных копий."""
+    KEY = 'key'
+    TAG = 'tag'
+    KIND_CHOICES = (
+        (KEY, 'Ключ'),
+        (TAG, 'Тег'),
+    )
+    kind = models.CharField(
+        'Вид', max_length=3, choices=KIND_CHOICES, default=KEY)
+    key = models.CharField('Ключ', max_length=250)
+    created = models.DateTimeField('Дата создания', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'инвалидация кеша'
+        verbose_name_plural = 'инвалидации кеша'
+
+    def __str__(self):
+        return self.key
+
+
+class MetricsSnapshot(models.Model):
+    """Метрики запросов одного процесса, см. core.metrics."""
+    process = models.CharField('Процесс', max_length=200, unique=True)
+    data = models.TextField('Метрики в JSON')
+    updated = models.DateTimeField('Дата обновления', auto_now=True)
+
+    class Meta:
+        verbose_name = 'снимок метрик'
+        verbose_name_plural = 'снимки метрик'
+
+    def __str__(self):
+        return self.process
+
+
+class RequestProfile(models.Model):
+    """Профиль cProfile одного запроса, см. core.profiling."""
+    HEADER = 'header'
+    SAMPLE = 'sample'
+    TRIGGER_CHOICES = (
+        (HEADER, 'Заголовок'),
+        (SAMPLE, 'Выборка'),
+    )
+    created = models.DateTimeField('Дата создания', auto_now_add=True)
+    method = models.CharField('Метод', max_length=10)
+    path = models.CharField('Адрес', max_length=500)
+    view_name = models.CharField('View', max_length=200, blank=True)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='request_profiles',
+        verbose_name='Пользователь',
+    )
+    status_code = models.PositiveSmallIntegerField('Код ответа')
+    duration_ms = models.FloatField('Время ответа, мс')
+    trigger = models.CharField(
+        'Причина', max_length=6, choices=TRIGGER_CHOICES)
+    stats = models.BinaryField('Данные pstats')
+
+    class Meta:
+        ordering = ('-created',)
+        verbose_name = 'профиль запроса'
+        verbose_name_plural = 'профили запросов'
+
+    def __str__(self):
+        return f'{self.method} {self.path}'
@@ -0,0 +1,197 @@
+import heapq
+from itertools import groupby
+
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.db.models import Q
+from django.http import Http404
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+CURSOR_KWARG = 'cursor'
+FORWARD = 'n'
+BACKWARD = 'p'
+KEY_FIELDS = ('created', 'pk')
+ORDERING = ('-created', '-pk')
+
+
+def encode_cursor(direction, created, pk):
+    """Упаковывает ключ (created, id) записи в непрозрачный токен."""
+    raw = f'{direction}{created.isoformat()}|{pk}'
+    return urlsafe_base64_encode(raw.encode())
+
+
+def decode_cursor(token):
+    """Распаковывает токен в направление и ключ (created, id)."""
+    try:
+        raw = force_str(urlsafe_base64_decode(token))
+        direction, raw = raw[0], raw[1:]
+        created, pk = raw.split('|')
+        created, pk = parse_datetime(created), int(pk)
+    except (ValueError, IndexError, UnicodeDecodeError):
+        raise InvalidPage('Некорректный курсор')
+    if direction not in (FORWARD, BACKWARD) or created is None:
+        raise InvalidPage('Некорректный курсор')
+    return direction, created, pk
+
+
+def _older_keys(queryset, created_field, pk_field, key, limit):
+    """Ключи записей, которые в ленте идут после ключа (created, id)."""
+    if key is not None:
+        created, pk = key
+        queryset = queryset.filter(**{
+            f'{created_field}__lte': created,
+        }).filter(Q(**{f'{created_field}__lt': created})
+                  | Q(**{f'{pk_field}__lt': pk}))
+    return queryset.order_by(f'-{created_field}', f'-{pk_field}').values_list(
+        created_field, pk_field)[:limit]
+
+
+def _newer_keys(queryset, created_field, pk_field, key, limit):
+    """Ключи записей, которые в ленте идут до ключа (created, id)."""
+    created, pk = key
+    return queryset.filter(**{
+        f'{created_field}__gte': created,
+    }).filter(
+        Q(**{f'{created_field}__gt': created})
+        | Q(**{f'{pk_field}__gt': pk})
+    ).order_by(created_field, pk_field).values_list(
+        created_field, pk_field)[:limit]
+
+
+def _merge(key_lists, reverse):
+    """Сливает отсортированные списки ключей, убирая повторы."""
+    merged = heapq.merge(*key_lists, reverse=reverse)
+    return [key for key, _ in groupby(merged)]
+
+
+class CursorPage(Page):
+    """Страница курсорного режима.
+
+    Переходы задаются курсорами `previous_cursor` и `next_cursor`,
+    номера у страницы нет: `number`, `next_page_number()` и другие
+    методы номерного режима выбрасывают InvalidPage.
+    """
+
+    def __init__(self, object_list, paginator, cursor, previous_cursor,
+                 next_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.cursor = cursor
+        self.previous_cursor = previous_cursor
+        self.next_cursor = next_cursor
+
+    def __repr__(self):
+        return f'<Cursor page {self.cursor or "first"}>'
+
+    def _no_number(self, *args):
+        raise InvalidPage('У курсорной страницы нет номера')
+
+    number = property(_no_number)
+    next_page_number = previous_page_number = _no_number
+    start_index = end_index = _no_number
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator(Paginator):
+    """Пагинатор по ключу (created, id).
+
+    Обычный номерной режим (`page()`) сохранён для ссылок вида `?page=N`.
+    Курсорный режим (`cursor_page()`) не использует OFFSET и COUNT(*):
+    ключи страницы любой глубины читаются диапазоном по индексу из
+    каждого источника, после чего записи выбираются по первичному ключу.
+
+    Источник — тройка (queryset, поле даты, поле id записи). По умолчанию
+    источник один: сам `object_list`. Несколько источников сливаются
+    по ключу, как ленты в `heapq.merge`.
+    """
+
+    def __init__(self, object_list, per_page, sources=None, **kwargs):
+        super().__init__(object_list.order_by(*ORDERING), per_page, **kwargs)
+        self.sources = sources or [(object_list, *KEY_FIELDS)]
+
+    def _keys(self, fetch, key, reverse):
+        return _merge([
+            list(fetch(queryset, created_field, pk_field, key,
+                       self.per_page + 1))
+            for queryset, created_field, pk_field in self.sources
+        ], reverse=reverse)
+
+    def cursor_page(self, token=None):
+        """Возвращает страницу, на которую указывает курсор.
+
+        У страницы есть атрибуты `cursor`, `next_cursor`
+        и `previous_cursor`; отсутствующий переход равен None.
+        """
+        direction, key = FORWARD, None
+        if token:
+            direction, *key = decode_cursor(token)
+        if direction == BACKWARD:
+            keys = self._keys(_newer_keys, key, reverse=False)
+            if len(keys) > self.per_page:
+                keys = keys[self.per_page - 1::-1]
+                has_previous = has_next = True
+            else:
+                # до начала ленты меньше страницы: показываем первую
+                direction, key = FORWARD, None
+        if direction == FORWARD:
+            keys = self._keys(_older_keys, key, reverse=True)
+            has_previous = key is not None
+            has_next = len(keys) > self.per_page
+            keys = keys[:self.per_page]
+        object_list = self.object_list.filter(
+            pk__in=[pk for _, pk in keys])
+        return CursorPage(
+            object_list, self, token,
+            previous_cursor=(encode_cursor(BACKWARD, *keys[0])
+                             if has_previous and keys else None),
+            next_cursor=(encode_cursor(FORWARD, *keys[-1])
+                         if has_next else None))
+
+
+class CursorPaginationMixin:
+    """Курсорная пагинация для ListView.
+
+    Без параметра `page` страница выбирается по курсору из `?cursor=`,
+    с ним — по номеру, как в обычном ListView.
+    """
+    paginator_class = CursorPaginator
+
+    def is_cursor_mode(self):
+        return self.page_kwarg not in self.request.GET
+
+    def get_cursor_sources(self, queryset):
+        """Источники ключей для курсорного режима."""
+        return None
+
+    def get_paginator(self, queryset, per_page, **kwargs):
+        return super().get_paginator(
+            queryset, per_page,
+            sources=self.get_cursor_sources(queryset), **kwargs)
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.is_cursor_mode():
+            return super().paginate_queryset(queryset, page_size)
+        paginator = self.get_paginator(queryset, page_size)
+        try:
+            page = paginator.cursor_page(
+                self.request.GET.get(CURSOR_KWARG))
+        except InvalidPage as error:
+            raise Http404(str(error))
+        is_paginated = bool(page.next_cursor or page.previous_cursor)
+        return paginator, page, page.object_list, is_paginated
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # ключ страницы для кеша фрагментов в обоих режимах
+        page = context.get('page_obj')
+        if isinstance(page, CursorPage):
+            context['page_key'] = f'cursor:{page.cursor or ""}'
+        elif page is not None:
+            context['page_key'] = f'page:{page.number}'
+        return context
@@ -0,0 +1,124 @@
+"""Выборочное профилирование запросов через cProfile.
+
+`ProfilingMiddleware` профилирует view вместе с отрисовкой шаблона,
+если сотрудник прислал заголовок PROFILE_HEADER или запрос попал
+в долю PROFILE_SAMPLE_RATE. Профиль сохраняется в `RequestProfile`
+в формате marshal, как у `pstats.Stats.dump_stats()`, вместе с данными
+запроса. В админке профиль можно посмотреть и скачать как .prof
+или как свёрнутые стеки для flamegraph.pl и speedscope.
+"""
+import io
+import marshal
+import os
+import pstats
+import random
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+from .models import RequestProfile
+
+# ветви дешевле этой доли общего времени в стеки не попадают
+MIN_STACK_SHARE = 0.001
+
+
+def trigger(request):
+    """Причина профилировать запрос или None."""
+    if (request.META.get(settings.PROFILE_HEADER)
+            and request.user.is_staff):
+        return RequestProfile.HEADER
+    if random.random() < settings.PROFILE_SAMPLE_RATE:
+        return RequestProfile.SAMPLE
+    return None
+
+
+def save(profiler, request, response, duration, reason):
+    """Сохраняет профиль с данными запроса; старые профили удаляются."""
+    profiler.create_stats()
+    profile = RequestProfile.objects.create(
+        method=request.method,
+        path=request.get_full_path()[:500],
+        view_name=request.resolver_match.view_name
+        if request.resolver_match else '',
+        user=request.user if request.user.is_authenticated else None,
+        status_code=response.status_code,
+        duration_ms=duration * 1000,
+        trigger=reason,
+        stats=marshal.dumps(profiler.stats),
+    )
+    if profile.pk % settings.PROFILE_KEEP == 0:
+        RequestProfile.objects.filter(
+            pk__lte=profile.pk - settings.PROFILE_KEEP).delete()
+    return profile
+
+
+class _Loaded:
+    """Сохранённые данные профиля в виде, который принимает pstats.Stats."""
+
+    def __init__(self, data):
+        self.stats = marshal.loads(data)
+
+    def create_stats(self):
+        pass
+
+
+def load(profile):
+    return pstats.Stats(_Loaded(bytes(profile.stats)))
+
+
+def top_functions(stats, limit=30):
+    """Таблица pstats самых дорогих функций по накопленному времени."""
+    stats.stream = io.StringIO()
+    stats.sort_stats('cumulative').print_stats(limit)
+    return stats.stream.getvalue()
+
+
+def _label(function):
+    filename, line, name = function
+    if filename == '~':
+        return name
+    return f'{name} ({os.path.basename(filename)}:{line})'
+
+
+def folded_stacks(stats):
+    """Стеки в свёрнутом формате: `корень;...;функция микросекунды`.
+
+    cProfile хранит только пары вызывающий — вызываемый, поэтому стеки
+    восстанавливаются обходом графа от первой вызванной функции: время
+    функции делится между её вызовами пропорционально времени вызова
+    из родителя. Рекурсивные вызовы (например, обёртки middleware,
+    у которых один код) уже учтены выше по стеку и не повторяются.
+    """
+    callees = defaultdict(dict)
+    roots = set()
+    for function, (_, _, _, _, callers) in stats.stats.items():
+        for caller, edge in callers.items():
+            callees[caller][function] = edge[3]
+        if not callers:
+            roots.add(function)
+    # вызов, с которого начался профиль, длиннее всех остальных,
+    # но у рекурсивной функции есть и вызывающие внутри профиля
+    entry = max(stats.stats, key=lambda function: stats.stats[function][3])
+    roots.add(entry)
+    minimum = stats.stats[entry][3] * MIN_STACK_SHARE
+    folded = Counter()
+
+    def walk(path, spent):
+        function = path[-1]
+        cumulative = stats.stats[function][3]
+        share = spent / cumulative if cumulative else 0
+        in_children = 0
+        for callee, edge_time in callees[function].items():
+            child_spent = edge_time * share
+            in_children += child_spent
+            if callee not in path and child_spent >= minimum:
+                walk(path + (callee,), child_spent)
+        own = spent - in_children
+        if own > 0:
+            folded[';'.join(map(_label, path))] += own
+
+    for root in roots:
+        walk((root,), stats.stats[root][3])
+    return ''.join(f'{stack} {round(spent * 1e6)}\n'
+                   for stack, spent in folded.most_common()
+                   if round(spent * 1e6))
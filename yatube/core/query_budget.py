@@ -0,0 +1,72 @@
+"""Бюджет SQL-запросов на view.
+
+View объявляет бюджет атрибутом класса `query_budget` — сколько запросов
+к БД можно выполнить за один запрос к странице, включая отрисовку
+шаблона. `QueryBudgetMiddleware` считает запросы и при превышении
+пишет предупреждение в лог, а при QUERY_BUDGET_STRICT = True выбрасывает
+`QueryBudgetExceeded`, чтобы N+1 ронял тесты.
+
+Запросы к таблицам из QUERY_BUDGET_CACHE_TABLES (общий кеш, журнал
+инвалидаций) считаются отдельно и сверяются с общим для всех view
+бюджетом QUERY_BUDGET_CACHE: их число зависит от состояния кеша,
+а не от кода view, и больше всего их при холодном кеше. Команды
+управления транзакциями не считаются.
+"""
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+
+TRANSACTION_STATEMENTS = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT',
+                          'RELEASE')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def view_budget(view_func):
+    """Бюджет view-функции или класса; None, если он не объявлен."""
+    view = getattr(view_func, 'view_class', view_func)
+    return getattr(view, 'query_budget', None)
+
+
+class QueryCounter:
+    """Считает запросы ко всем БД внутри блока with и их время.
+
+    Запросы к таблицам cache_tables попадают в cache_count и
+    cache_queries, остальные — в count и queries.
+    """
+
+    def __init__(self, cache_tables=()):
+        self.cache_tables = tuple(cache_tables)
+        self.count = 0
+        self.cache_count = 0
+        self.duration = 0
+        self.queries = []
+        self.cache_queries = []
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith(TRANSACTION_STATEMENTS):
+            return execute(sql, params, many, context)
+        if any(table in sql for table in self.cache_tables):
+            self.cache_count += 1
+            self.cache_queries.append(sql)
+        else:
+            self.count += 1
+            self.queries.append(sql)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
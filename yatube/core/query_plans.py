@@ -0,0 +1,96 @@
+"""Планы запросов SQLite (EXPLAIN QUERY PLAN) для проверки индексов.
+
+`PlanRecorder` записывает SELECT-запросы, выполненные внутри блока with,
+и потом получает их планы. Полное сканирование таблицы — строка плана
+`SCAN <таблица>` без индекса; сортировка во временном B-дереве —
+`USE TEMP B-TREE FOR ORDER BY`. `plan_problems()` собирает такие строки
+для снимков планов, которые сравниваются в тестах.
+"""
+import re
+
+from django.db import connection
+
+TEMP_SORT = 'USE TEMP B-TREE'
+
+
+def explain(sql, params=(), using=connection):
+    """Строки плана запроса."""
+    with using.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def normalize_sql(sql):
+    """Запрос без длины списков IN, чтобы снимки не зависели от данных."""
+    return re.sub(r'\(%s(?:, %s)+\)', '(%s, ...)', sql)
+
+
+def normalize_plan(plan):
+    """План в формате новых версий SQLite: SCAN t вместо SCAN TABLE t."""
+    return [re.sub(r'^(SCAN|SEARCH) TABLE ', r'\1 ', detail)
+            for detail in plan]
+
+
+def reads_table(sql, table):
+    return re.search(rf'\b(FROM|JOIN)\s+"?{table}"?\W', sql) is not None
+
+
+def full_scans(plan):
+    """Таблицы, которые план читает целиком, без индекса."""
+    scans = []
+    for detail in plan:
+        match = re.match(r'SCAN (?:TABLE )?(\w+)', detail)
+        if match and 'INDEX' not in detail:
+            scans.append(match.group(1))
+    return scans
+
+
+def temp_sorts(plan):
+    return [detail for detail in plan if detail.startswith(TEMP_SORT)]
+
+
+def plan_problems(plans, tables):
+    """Полные сканирования и временные сортировки в запросах к tables.
+
+    Строка проблемы — строка плана и таблицы запроса в скобках.
+    """
+    problems = []
+    for sql, plan in plans:
+        read = [table for table in tables if reads_table(sql, table)]
+        if not read:
+            continue
+        for detail in normalize_plan(plan):
+            if full_scans([detail]) or temp_sorts([detail]):
+                problems.append(f'{detail} ({", ".join(read)})')
+    return problems
+
+
+class PlanRecorder:
+    """Записывает SELECT-запросы соединения и отдаёт их планы."""
+
+    def __init__(self, using=connection):
+        self.connection = using
+        self.queries = []
+        self._wrapper = None
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith('SELECT'):
+            self.queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = self.connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+    def plans(self, tables=None):
+        """Пары (запрос, план); при tables — только читающих эти таблицы."""
+        return [
+            (sql, explain(sql, params, self.connection))
+            for sql, params in self.queries
+            if tables is None
+            or any(reads_table(sql, table) for table in tables)
+        ]
@@ -0,0 +1,105 @@
+"""Журнал медленных запросов к БД.
+
+Обёртка `log_slow_query` ставится на каждое соединение с БД при его
+создании (см. CoreConfig.ready) и пишет в логгер core.slow_queries
+запросы дольше SLOW_QUERY_THRESHOLD_MS миллисекунд. Запись — строка
+JSON: view, отпечаток запроса (SQL без значений и длины списков IN),
+параметры или их типы при SLOW_QUERY_REDACT_PARAMS и план
+EXPLAIN QUERY PLAN. В settings логгер пишет в файл SLOW_QUERY_LOG
+с ротацией; сводку по отпечаткам выводит команда slow_queries.
+"""
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+
+from .query_plans import explain, normalize_sql
+
+logger = logging.getLogger(__name__)
+
+_state = threading.local()
+
+
+def set_view(name):
+    """Имя view для записей текущего потока; None — вне запроса."""
+    _state.view = name
+
+
+def fingerprint(sql):
+    """SQL без значений, длины списков IN и лишних пробелов."""
+    sql = normalize_sql(sql)
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(?:\.\d+)?\b', '?', sql)
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+def fingerprint_id(fingerprint):
+    return hashlib.sha1(fingerprint.encode()).hexdigest()[:12]
+
+
+def _params(params, many):
+    if many:
+        return f'<{len(params)} наборов>'
+    if params is None:
+        return None
+    if settings.SLOW_QUERY_REDACT_PARAMS:
+        return [type(param).__name__ for param in params]
+    return [param if isinstance(param, (int, float, bool, type(None)))
+            else str(param) for param in params]
+
+
+def _plan(sql, params, many, connection):
+    if many or connection.vendor != 'sqlite':
+        return None
+    try:
+        return explain(sql, params, connection)
+    except DatabaseError:
+        return None
+
+
+def log_slow_query(execute, sql, params, many, context):
+    threshold = settings.SLOW_QUERY_THRESHOLD_MS
+    if threshold is None or getattr(_state, 'explaining', False):
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = (time.perf_counter() - started) * 1000
+        if duration >= threshold:
+            _state.explaining = True
+            try:
+                _write(sql, params, many, context['connection'], duration)
+            finally:
+                _state.explaining = False
+
+
+def _write(sql, params, many, connection, duration):
+    normalized = fingerprint(sql)
+    logger.warning(json.dumps({
+        'time': timezone.now().isoformat(),
+        'duration_ms': round(duration, 3),
+        'view': getattr(_state, 'view', None),
+        'database': connection.alias,
+        'fingerprint_id': fingerprint_id(normalized),
+        'fingerprint': normalized,
+        'sql': sql,
+        'params': _params(params, many),
+        'plan': _plan(sql, params, many, connection),
+    }, ensure_ascii=False, default=str))
+
+
+def install(sender, connection, **kwargs):
+    """Ставит обёртку на новое соединение (сигнал connection_created).
+
+    Обёртка встаёт первой: временные обёртки execute_wrapper(), внутри
+    которых могло открыться соединение, при выходе снимают последнюю.
+    """
+    if log_slow_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, log_slow_query)
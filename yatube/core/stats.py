@@ -0,0 +1,22 @@
+import math
+
+
+def percentile(timings, share):
+    """Значение, ниже которого лежит доля share замеров."""
+    ordered = sorted(timings)
+    return ordered[round(share * (len(ordered) - 1))]
+
+
+def growth_exponent(sizes, timings):
+    """Показатель k в timings ∝ sizes ** k, подобранный МНК в log-log.
+
+    k ≈ 0 — время не зависит от размера, k ≈ 1 — растёт линейно.
+    """
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(timing) for timing in timings]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    spread = sum((x - mean_x) ** 2 for x in xs)
+    if not spread:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y)
+               for x, y in zip(xs, ys)) / spread
@@ -0,0 +1,24 @@
+import os
+
+from django.core.files.storage import FileSystemStorage
+
+from .uploads import file_hash
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файлы под именем из хеша содержимого.
+
+    Файл из upload_to='posts/' сохраняется как posts/ab/abcd….jpg.
+    Одинаковые файлы хранятся один раз: если файл с таким хешем уже
+    есть, запись пропускается, и модели ссылаются на один файл, так что
+    и миниатюры sorl для него создаются один раз.
+    """
+
+    def _save(self, name, content):
+        digest = getattr(content, 'content_hash', None) or file_hash(content)
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        name = os.path.join(directory, digest[:2], digest + extension)
+        if self.exists(name):
+            return name
+        return super()._save(name, content)
@@ -0,0 +1,44 @@
+from core.cache import get_or_set
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+
+register = template.Library()
+
+
+class FragmentCacheNode(template.Node):
+    def __init__(self, nodelist, timeout_var, fragment_name, vary_on):
+        self.nodelist = nodelist
+        self.timeout_var = timeout_var
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        try:
+            timeout = int(self.timeout_var.resolve(context))
+        except (template.VariableDoesNotExist, TypeError, ValueError):
+            raise template.TemplateSyntaxError(
+                f'Некорректный timeout у фрагмента {self.fragment_name}')
+        key = make_template_fragment_key(
+            self.fragment_name, [var.resolve(context) for var in self.vary_on])
+        return get_or_set(key, lambda: self.nodelist.render(context), timeout,
+                          tags=context.get('cache_scopes', ()))
+
+
+@register.tag('cache')
+def do_cache(parser, token):
+    """Замена `{% cache %}` с защитой от одновременного пересчёта.
+
+    Синтаксис тот же: `{% cache timeout name [vary_on ...] %}`.
+    """
+    nodelist = parser.parse(('endcache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(
+            f'Тег {tokens[0]} требует как минимум два аргумента')
+    return FragmentCacheNode(
+        nodelist,
+        parser.compile_filter(tokens[1]),
+        tokens[2],
+        [parser.compile_filter(token) for token in tokens[3:]],
+    )
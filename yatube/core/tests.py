@@ -1,7 +1,32 @@
+import json
+import tempfile
+import time
 from http import HTTPStatus
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.template import RequestContext, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-from django.test import TestCase
+from . import invalidation, metrics, profiling, slow_queries, tracing
+from .cache import LOCK_KEY, get_or_set
+from .cache_backends import TieredCache
+from .middleware import COALESCE_KEY, RequestCoalescingMiddleware
+from .models import MetricsSnapshot, RequestProfile
+from .query_budget import QueryCounter
+
+User = get_user_model()
+
+KEY = 'fragment'
 
 
 class ViewTestClass(TestCase):
@@ -10,3 +35,426 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class StampedeProtectionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_fresh_value_is_not_rebuilt(self):
+        """Свежее значение берётся из кеша без пересчёта"""
+        get_or_set(KEY, lambda: 'old', 60)
+        self.assertEqual(get_or_set(KEY, lambda: 'new', 60), 'old')
+
+    def test_expired_value_is_rebuilt(self):
+        """Истёкшее значение пересчитывается"""
+        cache.set(KEY, ('old', 0, time.time() - 1), 60)
+        self.assertEqual(get_or_set(KEY, lambda: 'new', 60), 'new')
+        self.assertIsNone(cache.get(LOCK_KEY.format(KEY)))
+
+    def test_stale_value_served_while_rebuilding(self):
+        """Пока другой запрос пересчитывает значение, отдаётся старое"""
+        cache.set(KEY, ('old', 0, time.time() - 1), 60)
+        cache.set(LOCK_KEY.format(KEY), True)
+        self.assertEqual(get_or_set(KEY, lambda: 'new', 60), 'old')
+
+
+class RequestCoalescingTests(TestCase):
+    PATH = '/'
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+        request = RequestFactory().get(self.PATH)
+        request.user = AnonymousUser()
+        self.request = request
+
+    def view(self, request):
+        self.calls += 1
+        return HttpResponse('from view')
+
+    def test_waiting_request_gets_leader_response(self):
+        """Одинаковый запрос получает ответ первого, не вызывая view"""
+        token = 'leader'
+        cache.set(COALESCE_KEY.format(self.PATH), token)
+        cache.set(COALESCE_KEY.format(f'{token}:result'),
+                  (b'from leader', [('Content-Type', 'text/html')]))
+        response = RequestCoalescingMiddleware(self.view)(self.request)
+        self.assertEqual(response.content, b'from leader')
+        self.assertEqual(self.calls, 0)
+
+    def test_request_without_leader_reaches_view(self):
+        """Без одновременного запроса ответ строит view"""
+        response = RequestCoalescingMiddleware(self.view)(self.request)
+        self.assertEqual(response.content, b'from view')
+        self.assertEqual(self.calls, 1)
+        self.assertIsNone(cache.get(COALESCE_KEY.format(self.PATH)))
+
+    def coalesced_result(self, content):
+        """Результат, опубликованный для ждущего запроса, или None."""
+        def view(request):
+            token = cache.get(COALESCE_KEY.format(self.PATH))
+            cache.set(COALESCE_KEY.format(f'{token}:waiting'), True)
+            self.token = token
+            return HttpResponse(
+                Template(content).render(RequestContext(request)))
+
+        RequestCoalescingMiddleware(view)(self.request)
+        return cache.get(COALESCE_KEY.format(f'{self.token}:result'))
+
+    def test_leader_response_is_published(self):
+        self.assertIsNotNone(self.coalesced_result('страница'))
+
+    def test_response_with_csrf_token_is_not_published(self):
+        """Страница с CSRF-токеном не отдаётся ждущим без своей cookie"""
+        self.assertIsNone(self.coalesced_result(
+            '<form>{% csrf_token %}</form>'))
+
+
+class TieredCacheTests(TestCase):
+    def setUp(self):
+        caches['shared'].clear()
+        # два экземпляра с общим L2 изображают два процесса
+        options = {'L1_TIMEOUT': 60, 'SYNC_INTERVAL': 0,
+                   'SHARED_PREFIXES': ('lock:',)}
+        self.worker = TieredCache('shared', {'OPTIONS': options})
+        self.another_worker = TieredCache('shared', {'OPTIONS': options})
+        for worker in (self.worker, self.another_worker):
+            worker.get(KEY)
+            worker.stats = dict.fromkeys(worker.stats, 0)
+
+    def test_value_is_served_from_l1(self):
+        """Повторное чтение не доходит до общего кеша"""
+        self.another_worker.set(KEY, 'value')
+        self.assertEqual(self.worker.get(KEY), 'value')
+        caches['shared'].delete(KEY)
+        self.assertEqual(self.worker.get(KEY), 'value')
+
+    def test_invalidation_reaches_other_workers(self):
+        """Удаление ключа в одном процессе сбрасывает L1 других"""
+        self.worker.set(KEY, 'old')
+        self.assertEqual(self.another_worker.get(KEY), 'old')
+        self.worker.delete(KEY)
+        self.assertIsNone(self.another_worker.get(KEY))
+        self.worker.set_many({KEY: 'new', 'second': 2})
+        self.assertEqual(self.another_worker.get(KEY), 'new')
+        self.worker.delete_many([KEY, 'second'])
+        self.assertEqual(self.another_worker.get_many([KEY, 'second']), {})
+
+    def test_only_invalidation_is_published(self):
+        """Запись значений не пишет журнал, удаление пачки — один INSERT"""
+        with CaptureQueriesContext(connection) as queries:
+            self.worker.set(KEY, 'value')
+            self.worker.set_many({'first': 1, 'second': 2})
+        inserts = [query['sql'] for query in queries.captured_queries
+                   if 'INSERT INTO "core_cacheinvalidation"' in query['sql']]
+        self.assertEqual(inserts, [])
+        with CaptureQueriesContext(connection) as queries:
+            self.worker.delete_many([KEY, 'first', 'second'])
+        inserts = [query['sql'] for query in queries.captured_queries
+                   if 'INSERT INTO "core_cacheinvalidation"' in query['sql']]
+        self.assertEqual(len(inserts), 1)
+
+    def test_get_many_reads_misses_at_once(self):
+        """Промахи L1 читаются из общего кеша одним запросом"""
+        shared = caches['shared']
+        shared.set_many({'first': 1, 'second': 2})
+        self.worker.get('first')
+        with mock.patch.object(
+                shared, 'get_many', wraps=shared.get_many) as get_many:
+            self.assertEqual(
+                self.worker.get_many(['first', 'second', 'third']),
+                {'first': 1, 'second': 2})
+        get_many.assert_called_once_with(['second', 'third'], None)
+
+    def test_shared_prefixes_bypass_l1(self):
+        """Ключи блокировок читаются только из общего кеша"""
+        lock_key = LOCK_KEY.format(KEY)
+        self.assertTrue(self.worker.add(lock_key, True))
+        self.assertFalse(self.another_worker.add(lock_key, True))
+        self.another_worker.delete(lock_key)
+        self.assertIsNone(self.worker.get(lock_key))
+
+    def test_stats_are_shared_per_tier(self):
+        """Счётчики процессов складываются в общем кеше по уровням"""
+        self.worker.delete(KEY)
+        self.worker.set(KEY, 'value')
+        self.worker.get(KEY)
+        self.another_worker.get(KEY)
+        self.worker.flush_stats()
+        self.another_worker.flush_stats()
+        stats = self.worker.shared_stats()
+        self.assertEqual(stats['bus', 'events'], 1)
+        self.assertEqual(stats['l1', 'hits'], 1)
+        self.assertEqual(stats['l2', 'hits'], 1)
+        self.assertEqual(stats['l1', 'misses'], 1)
+        self.assertEqual(stats['l2', 'misses'], 0)
+
+    def test_tag_invalidation_reaches_other_workers(self):
+        """Сброс тега выбрасывает помеченные значения из L1 всех процессов"""
+        self.worker.set(KEY, 'value', tags=('feed',))
+        self.assertEqual(self.another_worker.get(KEY), 'value')
+        caches['shared'].set(KEY, 'new')
+        self.worker.invalidate_tags('feed')
+        self.assertEqual(self.another_worker.get(KEY), 'new')
+
+
+class SubscriberTests(TestCase):
+    def test_receives_foreign_events_only(self):
+        """Подписчик получает чужие события и пропускает свои"""
+        subscriber = invalidation.Subscriber()
+        subscriber.receive()
+        subscriber.publish('own')
+        invalidation.publish('foreign')
+        events = subscriber.receive()
+        self.assertEqual([(kind, key) for kind, key, _ in events],
+                         [(invalidation.KEY, 'foreign')])
+        self.assertGreaterEqual(events[0][2], 0)
+        self.assertEqual(subscriber.receive(), [])
+
+
+class QueryCounterTests(TestCase):
+    def test_cache_statements_are_counted_apart(self):
+        """Запросы к общему кешу считаются отдельно, транзакции — нет"""
+        with QueryCounter(['cache_table']) as counter:
+            caches['shared'].set(KEY, 'value')
+            with transaction.atomic():
+                get_user_model().objects.exists()
+        self.assertEqual(counter.count, 1)
+        self.assertEqual(counter.cache_count, 3)
+
+    def test_set_many_writes_in_batches(self):
+        """Пачка ключей пишется в общий кеш по INSERT на сотню ключей"""
+        shared = caches['shared']
+        shared.set('first', 0)
+        values = {f'key-{number}': number for number in range(150)}
+        values['first'] = 1
+        with QueryCounter(['cache_table']) as counter:
+            self.assertEqual(shared.set_many(values), [])
+        # подсчёт строк и по DELETE и INSERT на каждые 100 ключей
+        self.assertEqual(counter.cache_count, 5)
+        self.assertEqual(shared.get_many(list(values)), values)
+        shared.add_many({'first': 2, 'second': 2})
+        self.assertEqual(shared.get_many(['first', 'second']),
+                         {'first': 1, 'second': 2})
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def scrape(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        return response.content.decode()
+
+    def test_server_timing_header(self):
+        """Ответ содержит время, запросы к БД, кеш и отрисовку шаблона"""
+        response = self.client.get(reverse('posts:index'))
+        self.assertRegex(
+            response['Server-Timing'],
+            r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries", '
+            r'cache;desc="\d+ hits, \d+ misses", template;dur=[\d.]+$')
+
+    def test_metrics_are_labelled_by_view(self):
+        """/metrics отдаёт гистограммы и счётчики по имени view"""
+        self.client.get(reverse('posts:index'))
+        exposition = self.scrape()
+        for line in (
+            '# TYPE yatube_request_duration_seconds histogram',
+            'yatube_request_duration_seconds_bucket'
+            '{view="posts:index",le="+Inf"}',
+            'yatube_template_render_seconds_count{view="posts:index"}',
+            'yatube_sql_queries_total{view="posts:index"}',
+            'yatube_cache_misses_total{view="posts:index"}',
+        ):
+            with self.subTest(line=line):
+                self.assertIn(line, exposition)
+
+    def test_processes_are_merged(self):
+        """Метрики других процессов складываются с метриками текущего"""
+        self.scrape()
+        other = metrics.merge([])
+        other['counters'][metrics.SQL_QUERIES]['posts:index'] = 1000
+        MetricsSnapshot.objects.create(process='other',
+                                       data=json.dumps(other))
+        current = metrics.registry.counters[metrics.SQL_QUERIES].get(
+            'posts:index', 0)
+        self.assertIn(
+            f'yatube_sql_queries_total{{view="posts:index"}} '
+            f'{current + 1000}\n', self.scrape())
+
+    def test_metrics_forbidden_outside_allowed_ips(self):
+        """/metrics недоступен с чужих адресов"""
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+
+
+class SlowQueryLogTests(TestCase):
+    def slow_queries(self, logs):
+        return [json.loads(message.split(':', 2)[2])
+                for message in logs.output]
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_slow_queries_are_logged_with_plan(self):
+        """Запрос дольше порога пишется с view, отпечатком и планом"""
+        with self.assertLogs('core.slow_queries', 'WARNING') as logs:
+            self.client.get(reverse('posts:index'))
+        entries = [entry for entry in self.slow_queries(logs)
+                   if '"posts_post"' in entry['sql']]
+        self.assertTrue(entries)
+        entry = entries[0]
+        self.assertEqual(entry['view'], 'posts:index')
+        self.assertEqual(entry['fingerprint_id'],
+                         slow_queries.fingerprint_id(entry['fingerprint']))
+        self.assertTrue(entry['plan'])
+        self.assertTrue(all(isinstance(param, str)
+                            for param in entry['params']))
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=10 ** 6)
+    def test_fast_queries_are_not_logged(self):
+        with mock.patch.object(slow_queries.logger, 'warning') as warning:
+            self.client.get(reverse('posts:index'))
+        warning.assert_not_called()
+
+    def test_fingerprint_hides_values(self):
+        """Отпечаток не зависит от значений и длины списков IN"""
+        self.assertEqual(
+            slow_queries.fingerprint(
+                "SELECT * FROM t WHERE a = 1 AND b = 'x'  AND c IN (%s, %s)"),
+            'SELECT * FROM t WHERE a = ? AND b = ? AND c IN (%s, ...)')
+
+    def test_summary_orders_by_total_time(self):
+        """Сводка выводит отпечатки по убыванию суммарного времени"""
+        entries = [('fast', 'SELECT 1', 5)] * 3 + [('slow', 'SELECT 2', 40)]
+        with tempfile.TemporaryDirectory() as directory:
+            log = Path(directory, 'slow.jsonl')
+            log.write_text(''.join(
+                json.dumps({'fingerprint_id': fingerprint_id,
+                            'fingerprint': sql, 'duration_ms': duration,
+                            'view': 'posts:index', 'plan': ['SCAN t']}) + '\n'
+                for fingerprint_id, sql, duration in entries))
+            out = StringIO()
+            call_command('slow_queries', log=str(log), stdout=out)
+        self.assertRegex(
+            out.getvalue(),
+            r'(?s)slow: всего 40 мс, запросов 1.*fast: всего 15 мс, '
+            r'запросов 3, среднее 5.0 мс')
+
+
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_superuser(
+            'staff', 'staff@example.com', 'password')
+        cls.user = User.objects.create_user(username='reader')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_staff_header_saves_profile(self):
+        """Заголовок от сотрудника сохраняет профиль с данными запроса"""
+        self.client.force_login(self.staff)
+        self.client.get(reverse('posts:index'), HTTP_X_PROFILE='1')
+        profile = RequestProfile.objects.get()
+        self.assertEqual(profile.view_name, 'posts:index')
+        self.assertEqual(profile.user, self.staff)
+        self.assertEqual(profile.trigger, RequestProfile.HEADER)
+        self.assertEqual(profile.status_code, HTTPStatus.OK)
+        self.assertIn('render', profiling.top_functions(
+            profiling.load(profile)))
+
+    def test_header_ignored_for_non_staff(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('posts:index'), HTTP_X_PROFILE='1')
+        self.assertFalse(RequestProfile.objects.exists())
+
+    @override_settings(PROFILE_SAMPLE_RATE=1)
+    def test_sampled_requests_are_profiled(self):
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(RequestProfile.objects.get().trigger,
+                         RequestProfile.SAMPLE)
+
+    def test_admin_downloads_folded_stacks(self):
+        """В админке профиль скачивается свёрнутыми стеками"""
+        self.client.force_login(self.staff)
+        self.client.get(reverse('posts:index'), HTTP_X_PROFILE='1')
+        profile = RequestProfile.objects.get()
+        page = self.client.get(reverse(
+            'admin:core_requestprofile_change', args=[profile.pk]))
+        self.assertContains(page, 'Самые дорогие функции')
+        response = self.client.get(reverse(
+            'admin:core_requestprofile_stacks', args=[profile.pk]))
+        self.assertIn('attachment', response['Content-Disposition'])
+        lines = response.content.decode().splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            self.assertRegex(line, r'^[^;]+(;[^;]+)* \d+$')
+        self.assertTrue(any('render' in line for line in lines))
+
+
+class TracingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_superuser(
+            'staff', 'staff@example.com', 'password')
+
+    def setUp(self):
+        cache.clear()
+
+    def traces(self, logs):
+        return [json.loads(record.getMessage()) for record in logs.records]
+
+    @override_settings(TRACING_SAMPLE_RATE=1)
+    def test_trace_nests_spans(self):
+        """Трасса содержит middleware, view, запросы, шаблоны и кеш"""
+        with self.assertLogs('core.tracing', 'INFO') as logs:
+            response = self.client.get(reverse('posts:index'))
+        trace, = self.traces(logs)
+        self.assertEqual(response['X-Trace-Id'], trace['trace_id'])
+        self.assertEqual(trace['view'], 'posts:index')
+        spans = {span['id']: span for span in trace['spans']}
+        root = spans[1]
+        self.assertEqual(root['name'], 'request')
+        names = {span['name'] for span in trace['spans']}
+        self.assertTrue({'middleware', 'view', 'query', 'template',
+                         'cache.get'} <= names)
+        for span in trace['spans'][1:]:
+            parent = spans[span['parent']]
+            self.assertGreaterEqual(span['start_ms'], parent['start_ms'])
+            self.assertLessEqual(span['start_ms'] + span['duration_ms'],
+                                 parent['start_ms'] + parent['duration_ms'])
+        templates = [span['attributes']['template']
+                     for span in trace['spans'] if span['name'] == 'template']
+        self.assertIn('posts/index.html', templates)
+
+    def test_not_traced_by_default(self):
+        with mock.patch.object(tracing.logger, 'info') as info:
+            response = self.client.get(reverse('posts:index'))
+        info.assert_not_called()
+        self.assertNotIn('X-Trace-Id', response)
+        self.assertIs(tracing.span('query'), tracing.span('template'))
+
+    def test_header_traces_only_staff(self):
+        """Заголовок трассировки учитывается только от сотрудника"""
+        with mock.patch.object(tracing, 'start') as start:
+            response = self.client.get(reverse('posts:index'),
+                                       HTTP_X_TRACE='1')
+        start.assert_not_called()
+        self.assertNotIn('X-Trace-Id', response)
+        self.client.force_login(self.staff)
+        with self.assertLogs('core.tracing', 'INFO') as logs:
+            self.client.get(reverse('posts:index'), HTTP_X_TRACE='1')
+        self.assertEqual(len(self.traces(logs)), 1)
+
+    @override_settings(TRACING_SAMPLE_RATE=1)
+    def test_show_trace_prints_tree(self):
+        with self.assertLogs('core.tracing', 'INFO') as logs:
+            self.client.get(reverse('posts:index'))
+        with tempfile.TemporaryDirectory() as directory:
+            log = Path(directory, 'traces.jsonl')
+            log.write_text(logs.records[0].getMessage() + '\n')
+            out = StringIO()
+            call_command('show_trace', log=str(log), stdout=out)
+        self.assertRegex(out.getvalue(),
+                         r'(?m)^ +[\d.]+ +[\d.]+ мс   view view=posts:index$')
@@ -0,0 +1,144 @@
+"""Трассировка запросов: дерево вложенных интервалов (span).
+
+`TracingMiddleware` начинает трассу для доли TRACING_SAMPLE_RATE
+запросов и для запросов сотрудников с заголовком TRACING_HEADER.
+В трассу попадают middleware, view, запросы к БД, отрисовка шаблонов
+и include, обращения к кешу и поиск миниатюр. Готовая трасса — строка
+JSON в логгере core.tracing; в settings он пишет в файл TRACING_LOG
+с ротацией, дерево трассы выводит команда show_trace.
+
+Без трассы `span()` только читает атрибут потока и возвращает
+общий пустой контекст, поэтому выключенная трассировка почти
+ничего не стоит.
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+from django.template.base import Template
+from django.utils import timezone
+
+from .slow_queries import fingerprint
+
+logger = logging.getLogger(__name__)
+
+_state = threading.local()
+_NOT_TRACED = nullcontext()
+
+
+class Trace:
+    """Интервалы одного запроса; открытые интервалы лежат в стеке."""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.started = time.perf_counter()
+        self.spans = []
+        self.stack = []
+
+    def _offset(self, moment):
+        return round((moment - self.started) * 1000, 3)
+
+    def open(self, name, attributes, started=None):
+        span = {
+            'id': len(self.spans) + 1,
+            'parent': self.stack[-1]['id'] if self.stack else None,
+            'name': name,
+            'start_ms': self._offset(started or time.perf_counter()),
+            'duration_ms': None,
+            'attributes': attributes,
+        }
+        self.spans.append(span)
+        self.stack.append(span)
+        return span
+
+    def close(self, span, error=None):
+        span['duration_ms'] = round(
+            self._offset(time.perf_counter()) - span['start_ms'], 3)
+        if error is not None:
+            span['attributes']['error'] = type(error).__name__
+        if span in self.stack:
+            self.stack.remove(span)
+
+    @contextmanager
+    def span(self, name, attributes):
+        span = self.open(name, attributes)
+        try:
+            yield span
+        except Exception as error:
+            self.close(span, error)
+            raise
+        self.close(span)
+
+
+def current():
+    """Трасса текущего потока или None."""
+    return getattr(_state, 'trace', None)
+
+
+def start():
+    _state.trace = Trace()
+    return _state.trace
+
+
+def finish():
+    trace = current()
+    _state.trace = None
+    return trace
+
+
+def span(name, **attributes):
+    """Контекст интервала; вне трассы — пустой контекст."""
+    trace = getattr(_state, 'trace', None)
+    if trace is None:
+        return _NOT_TRACED
+    return trace.span(name, attributes)
+
+
+def export(trace, **attributes):
+    """Пишет завершённую трассу одной строкой JSON."""
+    logger.info(json.dumps({
+        'trace_id': trace.id,
+        'time': timezone.now().isoformat(),
+        **attributes,
+        'spans': trace.spans,
+    }, ensure_ascii=False, default=str))
+
+
+def trace_query(execute, sql, params, many, context):
+    """Обёртка execute: интервал на каждый запрос к БД."""
+    if getattr(_state, 'trace', None) is None:
+        return execute(sql, params, many, context)
+    with span('query', sql=fingerprint(sql),
+              database=context['connection'].alias, many=many):
+        return execute(sql, params, many, context)
+
+
+def install(sender, connection, **kwargs):
+    """Ставит обёртку на новое соединение, как core.slow_queries."""
+    if trace_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, trace_query)
+
+
+def _traced_render(render):
+    @wraps(render)
+    def wrapper(self, context):
+        if getattr(_state, 'trace', None) is None:
+            return render(self, context)
+        with span('template', template=self.name):
+            return render(self, context)
+    wrapper.traced = True
+    return wrapper
+
+
+def install_template_hook():
+    """Интервал на отрисовку каждого шаблона, включая include.
+
+    Template.render вызывается и для шаблона ответа, и для каждого
+    {% include %}, поэтому обёртка ставится на него один раз.
+    """
+    if not getattr(Template.render, 'traced', False):
+        Template.render = _traced_render(Template.render)
@@ -0,0 +1,37 @@
+"""Потоковый приём загружаемых файлов с хешированием содержимого.
+
+`HashingUploadHandler` пишет файл на диск по частям, как
+TemporaryFileUploadHandler, и по ходу считает его хеш. Хеш сохраняется
+в атрибуте `content_hash` загруженного файла, поэтому хранилище
+`core.storage.ContentAddressedStorage` не читает файл ещё раз.
+"""
+import hashlib
+
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+HASH_ALGORITHM = 'sha256'
+
+
+def file_hash(file):
+    """Хеш содержимого файла, прочитанного по частям."""
+    digest = hashlib.new(HASH_ALGORITHM)
+    for chunk in file.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+class HashingUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загружаемый файл во временный файл и считает его хеш."""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.digest = hashlib.new(HASH_ALGORITHM)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.content_hash = self.digest.hexdigest()
+        return file
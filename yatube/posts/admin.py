@@ -1,5 +1,7 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import SEARCH_VAR
 
+from . import search
 from .models import Follow, Group, Post, Comment
 
 
@@ -14,6 +16,21 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('created',)
     empty_value_display = '-пусто-'
 
+    def get_ordering(self, request):
+        # без выбранной колонки результаты поиска идут по релевантности
+        query = request.GET.get(SEARCH_VAR, '')
+        if search.available() and search.match_expression(query):
+            return search.ORDERING
+        return super().get_ordering(request)
+
+    def get_search_results(self, request, queryset, search_term):
+        # поиск по полнотекстовому индексу вместо LIKE '%...%' по text;
+        # порядок остаётся тем, что выбрал changelist
+        if not search_term:
+            return queryset, False
+        results = search.search(search_term, queryset)
+        return results.order_by(*queryset.query.order_by), False
+
 
 class CommentAdmin(admin.ModelAdmin):
     list_display = ('pk',
@@ -0,0 +1,111 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются выражениями F(), поэтому параллельные запросы
+не теряют обновлений. Расхождения, если они всё же возникли,
+исправляет команда reconcile_counters.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Group, Post, UserCounters
+
+User = get_user_model()
+
+USER_COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def _count(model, field):
+    """Подзапрос с числом строк model, ссылающихся на внешнюю запись."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(total=Count('pk')).values('total')), 0)
+
+
+def actual_user_counts(user_id):
+    return {
+        name: model.objects.filter(**{field: user_id}).count()
+        for name, (model, field) in USER_COUNTERS.items()
+    }
+
+
+def for_user(user_id):
+    """Счётчики пользователя; недостающая строка заполняется по факту."""
+    try:
+        return UserCounters.objects.get(user_id=user_id)
+    except UserCounters.DoesNotExist:
+        counters, _ = UserCounters.objects.get_or_create(
+            user_id=user_id, defaults=actual_user_counts(user_id))
+        return counters
+
+
+def _bump(queryset, name, delta):
+    """Меняет счётчик на delta, не опуская его ниже нуля."""
+    if delta < 0:
+        queryset = queryset.filter(**{f'{name}__gte': -delta})
+    return queryset.update(**{name: F(name) + delta})
+
+
+def bump_user(user_id, name, delta):
+    updated = _bump(UserCounters.objects.filter(user_id=user_id), name, delta)
+    if not updated and delta > 0:
+        # строки ещё нет: она создаётся уже с учётом этого изменения
+        for_user(user_id)
+
+
+def bump_group(group_id, delta):
+    if group_id is not None:
+        _bump(Group.objects.filter(pk=group_id), 'posts_count', delta)
+
+
+def bump_post(post_id, delta):
+    _bump(Post.objects.filter(pk=post_id), 'comments_count', delta)
+
+
+def _reconcile(queryset, name, expression):
+    """Исправляет поле name там, где оно расходится с expression."""
+    drifted = list(queryset.annotate(actual=expression).exclude(
+        **{name: F('actual')}).values_list('pk', flat=True))
+    if drifted:
+        queryset.model.objects.filter(pk__in=drifted).update(
+            **{name: expression})
+    return len(drifted)
+
+
+def _chunks(queryset, chunk_size):
+    """Разбивает queryset на диапазоны первичного ключа."""
+    pks = queryset.order_by('pk').values_list('pk', flat=True)
+    last = 0
+    while True:
+        bounds = list(pks.filter(pk__gt=last)[:chunk_size])
+        if not bounds:
+            return
+        yield queryset.filter(pk__gte=bounds[0], pk__lte=bounds[-1])
+        last = bounds[-1]
+
+
+def reconcile(chunk_size):
+    """Пересчитывает все счётчики порциями; возвращает число исправлений."""
+    for chunk in _chunks(User.objects.all(), chunk_size):
+        UserCounters.objects.bulk_create(
+            [UserCounters(user_id=pk) for pk in chunk.filter(
+                counters__isnull=True).values_list('pk', flat=True)],
+            ignore_conflicts=True)
+    targets = [
+        (UserCounters.objects.all(), name, _count(model, field))
+        for name, (model, field) in USER_COUNTERS.items()
+    ] + [
+        (Group.objects.all(), 'posts_count', _count(Post, 'group')),
+        (Post.objects.all(), 'comments_count', _count(Comment, 'post')),
+    ]
+    fixed = {}
+    for queryset, name, expression in targets:
+        label = f'{queryset.model._meta.model_name}.{name}'
+        fixed[label] = 0
+        for chunk in _chunks(queryset, chunk_size):
+            fixed[label] += _reconcile(chunk, name, expression)
+    return fixed
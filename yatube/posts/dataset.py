@@ -0,0 +1,213 @@
+"""Генератор синтетических данных для замеров производительности.
+
+Пользователи, группы, посты, комментарии и подписки пишутся пачками
+через bulk_create, в обход сигналов. Распределения степенные: число
+подписчиков автора, активность авторов и число комментариев у поста
+убывают по закону Ципфа с заданными показателями, поэтому у малой доли
+авторов большая часть подписчиков, как в настоящей сети. Тексты
+собираются из пула предложений Faker, созданного один раз. При одном
+и том же seed данные одинаковы.
+
+Денормализованные данные (счётчики, ленты подписок, поисковый индекс)
+после загрузки пересчитываются функцией `rebuild_derived()`.
+"""
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+from faker import Faker
+
+from . import counters, search, timeline
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+BATCH_SIZE = 5000
+SENTENCE_POOL_SIZE = 5000
+USERNAME_PREFIX = 'seed'
+
+
+def zipf_weights(size, exponent):
+    """Накопленные веса рангов 1..size, ∝ 1 / rank ** exponent."""
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, size + 1)))
+
+
+@contextmanager
+def explicit_created(*models):
+    """Даёт bulk_create записать свою дату created вместо текущей."""
+    fields = [model._meta.get_field('created') for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class DatasetGenerator:
+    """Создаёт набор данных; каждый шаг возвращает число строк."""
+
+    def __init__(self, seed=0, days=365, batch_size=BATCH_SIZE,
+                 follower_exponent=1.0, activity_exponent=1.0,
+                 comment_exponent=1.0, follows_per_user=20):
+        self.rng = random.Random(seed)
+        self.faker = Faker('ru_RU')
+        self.faker.seed_instance(seed)
+        self.batch_size = batch_size
+        self.follower_exponent = follower_exponent
+        self.activity_exponent = activity_exponent
+        self.comment_exponent = comment_exponent
+        self.follows_per_user = follows_per_user
+        self.finish = timezone.now()
+        self.start = self.finish - timedelta(days=days)
+        self.sentences = [self.faker.sentence(nb_words=10)
+                          for _ in range(SENTENCE_POOL_SIZE)]
+        self.user_ids = []
+        self.group_ids = []
+        self.post_ids = []
+        self.post_step = timedelta(0)
+
+    def _bulk(self, model, objects, **kwargs):
+        batch = []
+        total = 0
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                model.objects.bulk_create(batch, **kwargs)
+                total += len(batch)
+                batch = []
+        model.objects.bulk_create(batch, **kwargs)
+        return total + len(batch)
+
+    def _text(self, sentences):
+        return ' '.join(self.rng.choices(self.sentences, k=sentences))
+
+    def _new_ids(self, model, after):
+        return list(model.objects.filter(pk__gt=after).order_by(
+            'pk').values_list('pk', flat=True))
+
+    def _last_id(self, model):
+        return model.objects.order_by('-pk').values_list(
+            'pk', flat=True).first() or 0
+
+    def users(self, total):
+        last_id = self._last_id(User)
+        password = make_password(None)
+        prefix = f'{USERNAME_PREFIX}{last_id}'
+        created = self._bulk(User, (
+            User(username=f'{prefix}-{number}', password=password,
+                 first_name=self.faker.first_name(),
+                 last_name=self.faker.last_name(),
+                 date_joined=self.start)
+            for number in range(total)))
+        self.user_ids = self._new_ids(User, last_id)
+        return created
+
+    def groups(self, total):
+        last_id = self._last_id(Group)
+        created = self._bulk(Group, (
+            Group(title=self.faker.catch_phrase()[:200],
+                  slug=f'{USERNAME_PREFIX}{last_id}-{number}',
+                  description=self._text(2))
+            for number in range(total)))
+        self.group_ids = self._new_ids(Group, last_id)
+        return created
+
+    def posts(self, total, group_share=0.5):
+        """Посты по времени от start до finish; первые авторы активнее.
+
+        Доля group_share постов попадает в группы, тоже неравномерно.
+        """
+        last_id = self._last_id(Post)
+        authors = zipf_weights(len(self.user_ids), self.activity_exponent)
+        groups = zipf_weights(len(self.group_ids), self.activity_exponent)
+        # посты идут по порядку id, от start до finish
+        self.post_step = (self.finish - self.start) / max(total, 1)
+
+        def build(number):
+            group_id = None
+            if self.group_ids and self.rng.random() < group_share:
+                group_id = self.rng.choices(
+                    self.group_ids, cum_weights=groups)[0]
+            return Post(
+                author_id=self.rng.choices(
+                    self.user_ids, cum_weights=authors)[0],
+                group_id=group_id,
+                text=self._text(self.rng.randint(1, 5)),
+                created=self.start + self.post_step * number)
+
+        with explicit_created(Post):
+            created = self._bulk(Post, (build(number)
+                                        for number in range(total)))
+        self.post_ids = self._new_ids(Post, last_id)
+        return created
+
+    def comments(self, total):
+        """Комментарии; у популярных постов их больше.
+
+        Комментарий приходит в случайный момент между публикацией поста
+        и концом периода.
+        """
+        if not self.post_ids:
+            return 0
+        ranked = self.rng.sample(
+            range(len(self.post_ids)), len(self.post_ids))
+        weights = zipf_weights(len(ranked), self.comment_exponent)
+
+        def build():
+            index = self.rng.choices(ranked, cum_weights=weights)[0]
+            posted = self.start + self.post_step * index
+            return Comment(
+                post_id=self.post_ids[index],
+                author_id=self.rng.choice(self.user_ids),
+                text=self._text(1)[:150],
+                created=posted + (self.finish - posted) * self.rng.random())
+
+        with explicit_created(Comment):
+            return self._bulk(Comment, (build() for _ in range(total)))
+
+    def follows(self):
+        """Подписки: у автора с рангом r подписчиков ∝ 1 / r ** exponent.
+
+        Число подписок пользователя — экспоненциальное со средним
+        follows_per_user.
+        """
+        authors = self.rng.sample(self.user_ids, len(self.user_ids))
+        weights = zipf_weights(len(authors), self.follower_exponent)
+        mean = min(self.follows_per_user, len(authors) - 1)
+
+        def build():
+            for user_id in self.user_ids:
+                wanted = min(round(self.rng.expovariate(1 / mean)),
+                             len(authors) - 1) if mean > 0 else 0
+                chosen = set()
+                while len(chosen) < wanted:
+                    chosen.update(self.rng.choices(
+                        authors, cum_weights=weights, k=wanted - len(chosen)))
+                    chosen.discard(user_id)
+                for author_id in chosen:
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        return self._bulk(Follow, build(), ignore_conflicts=True)
+
+
+def rebuild_derived(chunk_size=1000):
+    """Пересчитывает счётчики, ленты подписок и поисковый индекс."""
+    timings = {}
+    started = time.perf_counter()
+    counters.reconcile(chunk_size)
+    timings['счётчики'] = time.perf_counter() - started
+    started = time.perf_counter()
+    timeline.rebuild_all()
+    timings['ленты'] = time.perf_counter() - started
+    started = time.perf_counter()
+    search.rebuild()
+    timings['поиск'] = time.perf_counter() - started
+    return timings
@@ -1,13 +1,50 @@
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
 
 from .models import Comment, Post
 
 
+def check_pixels(data):
+    """Отклоняет изображение, если пикселей в нём больше MAX_IMAGE_PIXELS.
+
+    Размеры читаются из заголовка, сами пиксели не распаковываются.
+    """
+    if hasattr(data, 'temporary_file_path'):
+        source = data.temporary_file_path()
+    else:
+        source = data
+    try:
+        with Image.open(source) as image:
+            width, height = image.size
+    except (OSError, Image.DecompressionBombError):
+        raise forms.ValidationError(
+            forms.ImageField.default_error_messages['invalid_image'],
+            code='invalid_image')
+    finally:
+        if hasattr(data, 'seek'):
+            data.seek(0)
+    if width * height > settings.MAX_IMAGE_PIXELS:
+        raise forms.ValidationError(
+            'Изображение слишком большое: %(width)s×%(height)s',
+            code='too_many_pixels',
+            params={'width': width, 'height': height})
+
+
 class PostForm(forms.ModelForm):
     class Meta:
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        # ImageField уже проверил файл; у сохранённой картинки
+        # размеры не проверяются
+        if isinstance(image, UploadedFile):
+            check_pixels(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
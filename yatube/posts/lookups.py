@@ -0,0 +1,43 @@
+"""Группы и пользователи по адресу страницы, через кеш.
+
+Группа по slug и пользователь по username читаются почти на каждой
+странице лент, поэтому хранятся в кеше и попадают в L1 каждого
+процесса (см. core.cache_backends.TieredCache). Сигналы из
+posts.signals удаляют ключи при изменении и удалении записей, а
+TieredCache рассылает удаление в L1 остальных процессов.
+"""
+from django.core.cache import cache
+from django.shortcuts import get_object_or_404
+
+from .models import Group, User
+
+GROUP_KEY = 'lookup:group:{}'
+USER_KEY = 'lookup:user:{}'
+LOOKUP_TIMEOUT = 60 * 60
+
+
+def _cached(key, model, **lookup):
+    instance = cache.get(key)
+    if instance is None:
+        instance = get_object_or_404(model, **lookup)
+        cache.set(key, instance, LOOKUP_TIMEOUT)
+    return instance
+
+
+def group_by_slug(slug):
+    """Группа по slug или Http404."""
+    return _cached(GROUP_KEY.format(slug), Group, slug=slug)
+
+
+def user_by_username(username):
+    """Пользователь по username или Http404."""
+    return _cached(USER_KEY.format(username), User, username=username)
+
+
+def forget_group(*slugs):
+    cache.delete_many([GROUP_KEY.format(slug) for slug in slugs if slug])
+
+
+def forget_user(*usernames):
+    cache.delete_many([USER_KEY.format(username)
+                       for username in usernames if username])
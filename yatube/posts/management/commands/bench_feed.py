@@ -0,0 +1,85 @@
+import time
+
+from core.stats import percentile
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+
+from posts import timeline
+from posts.models import Follow, Post, PulledAuthor
+from posts.views import FollowIndex
+
+User = get_user_model()
+
+BATCH_SIZE = 5000
+POST_TEXT = 'Пост для замера ленты'
+
+
+class Command(BaseCommand):
+    help = ('Замеряет стоимость публикации поста и время чтения ленты '
+            'подписок для автора с заданным числом подписчиков '
+            'в режимах раскладки по лентам (push) и подмешивания (pull). '
+            'Все данные создаются в транзакции и откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--followers', type=int, nargs='+',
+            default=[1000, 100000, 1000000],
+            help='Число подписчиков автора для каждого замера.')
+        parser.add_argument(
+            '--reads', type=int, default=50,
+            help='Сколько раз читать ленту в каждом режиме.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"подписчиков":>12} {"режим":>5} {"публикация, мс":>15} '
+            f'{"чтение p50, мс":>15} {"чтение p95, мс":>15}')
+        for followers in options['followers']:
+            with transaction.atomic():
+                self.measure(followers, options['reads'])
+                transaction.set_rollback(True)
+
+    def create_followers(self, author, followers):
+        password = make_password(None)
+        prefix = f'bench-{author.pk}'
+        for start in range(0, followers, BATCH_SIZE):
+            stop = min(start + BATCH_SIZE, followers)
+            User.objects.bulk_create(
+                User(username=f'{prefix}-{number}', password=password)
+                for number in range(start, stop))
+        users = User.objects.filter(
+            username__startswith=f'{prefix}-').values_list('pk', flat=True)
+        batch = []
+        for user_id in users.iterator():
+            batch.append(Follow(user_id=user_id, author=author))
+            if len(batch) >= BATCH_SIZE:
+                Follow.objects.bulk_create(batch)
+                batch = []
+        Follow.objects.bulk_create(batch)
+        return users.first()
+
+    def measure(self, followers, reads):
+        author = User.objects.create_user(username=f'bench-author-{followers}')
+        reader_id = self.create_followers(author, followers)
+        request = RequestFactory().get(reverse('posts:follow_index'))
+        request.user = User.objects.get(pk=reader_id)
+        view = FollowIndex.as_view()
+        for mode, threshold in (('push', followers + 1), ('pull', 1)):
+            with override_settings(TIMELINE_PULL_THRESHOLD=threshold):
+                if not timeline.update_pull_mode(author.pk):
+                    PulledAuthor.objects.filter(author=author).delete()
+                started = time.perf_counter()
+                Post.objects.create(author=author, text=POST_TEXT)
+                publish = time.perf_counter() - started
+                timings = []
+                for _ in range(reads):
+                    started = time.perf_counter()
+                    view(request).render()
+                    timings.append(time.perf_counter() - started)
+            p50, p95 = percentile(timings, 0.5), percentile(timings, 0.95)
+            self.stdout.write(
+                f'{followers:>12} {mode:>5} {publish * 1000:>15.1f} '
+                f'{p50 * 1000:>15.2f} {p95 * 1000:>15.2f}')
@@ -0,0 +1,148 @@
+import json
+import time
+
+from core.stats import growth_exponent, percentile
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client
+from django.urls import reverse
+
+from posts.dataset import DatasetGenerator, rebuild_derived
+from posts.models import Comment, Group, Post, UserCounters
+
+User = get_user_model()
+
+ADMIN_USERNAME = 'bench-scaling-admin'
+
+
+def logged_in(user):
+    client = Client()
+    client.force_login(user)
+    return client
+
+
+def pages(admin):
+    """Страницы для замера: имя, клиент и адрес по текущим данным.
+
+    Берутся самые крупные автор, группа и пост и пользователь с самым
+    большим числом подписок, чтобы рост их данных вместе с таблицей
+    тоже попадал в замер.
+    """
+    author = UserCounters.objects.order_by('-posts_count').first()
+    reader = UserCounters.objects.order_by('-following_count').first()
+    group = Group.objects.order_by('-posts_count').first()
+    post = Post.objects.order_by('-comments_count').first()
+    word = post.text.split()[0]
+    anonymous, admin = Client(), logged_in(admin)
+    return [
+        ('index', anonymous, reverse('posts:index')),
+        ('group_list', anonymous,
+         reverse('posts:group_list', args=[group.slug])),
+        ('profile', anonymous,
+         reverse('posts:profile', args=[author.user.username])),
+        ('post_detail', anonymous,
+         reverse('posts:post_detail', args=[post.pk])),
+        ('search', anonymous, f'{reverse("posts:search")}?q={word}'),
+        ('follow_index', logged_in(reader.user),
+         reverse('posts:follow_index')),
+        ('admin_posts', admin, reverse('admin:posts_post_changelist')),
+        ('admin_comments', admin,
+         reverse('admin:posts_comment_changelist')),
+        ('admin_follows', admin, reverse('admin:posts_follow_changelist')),
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Замеряет время страниц при росте таблицы постов до заданных '
+            'размеров, подбирает показатель роста k (время ∝ постов ** k) '
+            'и отмечает страницы, время которых растёт с таблицей, хотя '
+            'размер страницы постоянный. Страницы отрисовываются '
+            'с пустым кешем. Все данные создаются в транзакции '
+            'и откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+',
+            default=[10000, 100000, 1000000, 5000000],
+            help='Размеры таблицы постов для замеров.')
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument(
+            '--comments-per-post', type=float, default=1,
+            help='Сколько комментариев добавлять на каждый новый пост.')
+        parser.add_argument(
+            '--reads', type=int, default=10,
+            help='Сколько раз отрисовать каждую страницу.')
+        parser.add_argument(
+            '--threshold', type=float, default=0.25,
+            help='Показатель роста, выше которого страница отмечается.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Файл для результатов в JSON.')
+
+    def handle(self, *args, **options):
+        sizes = sorted(options['sizes'])
+        if sizes[0] < Post.objects.count():
+            raise CommandError('Постов в БД уже больше наименьшего размера.')
+        with transaction.atomic():
+            timings = self.measure_sizes(sizes, options)
+            transaction.set_rollback(True)
+        cache.clear()
+        results = {
+            name: {
+                'p50_ms': dict(zip(sizes, values)),
+                'exponent': growth_exponent(sizes, values),
+            }
+            for name, values in timings.items()
+        }
+        self.write_results(sizes, results, options['threshold'])
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+
+    def measure_sizes(self, sizes, options):
+        generator = DatasetGenerator(seed=options['seed'])
+        generator.users(options['users'])
+        generator.groups(options['groups'])
+        generator.follows()
+        admin = User.objects.create_superuser(
+            ADMIN_USERNAME, f'{ADMIN_USERNAME}@example.com', None)
+        timings = {}
+        for size in sizes:
+            started = time.perf_counter()
+            added = size - Post.objects.count()
+            generator.posts(added)
+            generator.comments(round(added * options['comments_per_post']))
+            rebuild_derived()
+            self.stdout.write(
+                f'постов: {size}, комментариев: {Comment.objects.count()}, '
+                f'подготовка: {time.perf_counter() - started:.1f} с')
+            for name, client, url in pages(admin):
+                timings.setdefault(name, []).append(
+                    self.timed(client, url, options['reads']))
+        return timings
+
+    def timed(self, client, url, reads):
+        results = []
+        for _ in range(reads):
+            cache.clear()
+            started = time.perf_counter()
+            response = client.get(url)
+            results.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise CommandError(
+                    f'{url}: ответ {response.status_code}')
+        return percentile(results, 0.5) * 1000
+
+    def write_results(self, sizes, results, threshold):
+        header = ''.join(f'{size:>11}' for size in sizes)
+        self.stdout.write(f'{"страница, p50 мс":>16}{header}{"k":>7}')
+        for name, result in results.items():
+            row = ''.join(f'{value:>11.1f}'
+                          for value in result['p50_ms'].values())
+            line = f'{name:>16}{row}{result["exponent"]:>7.2f}'
+            if result['exponent'] > threshold:
+                line = self.style.WARNING(
+                    f'{line}  растёт с размером таблицы')
+            self.stdout.write(line)
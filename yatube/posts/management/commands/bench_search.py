@@ -0,0 +1,92 @@
+import random
+import time
+from itertools import accumulate
+
+from core.stats import percentile
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts import search
+from posts.models import Post
+
+User = get_user_model()
+
+BATCH_SIZE = 5000
+SYLLABLES = ('ба', 'ве', 'го', 'ду', 'же', 'зо', 'ки', 'ла', 'ми', 'но',
+             'пу', 'ре', 'си', 'то', 'фа', 'хе', 'цы', 'ча', 'шу', 'ян')
+VOCABULARY_SIZE = 20000
+WORDS_PER_POST = 30
+# места слов в частотном словаре для запросов: частое, среднее, редкое
+QUERY_RANKS = (10, 500, 15000)
+
+
+def vocabulary(size):
+    """Слова из трёх-четырёх слогов; первое — самое частое."""
+    words = set()
+    rng = random.Random(0)
+    while len(words) < size:
+        words.add(''.join(rng.choices(SYLLABLES, k=rng.choice((3, 4)))))
+    return sorted(words)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает поиск по полнотекстовому индексу со сканированием '
+            "LIKE '%...%' на синтетических постах с частотами слов по "
+            'закону Ципфа. Все данные создаются в транзакции и откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts', type=int, default=1000000,
+            help='Сколько постов создать.')
+        parser.add_argument(
+            '--reads', type=int, default=20,
+            help='Сколько раз выполнять каждый запрос.')
+
+    def handle(self, *args, **options):
+        if not search.available():
+            raise CommandError('Полнотекстовый индекс есть только в SQLite.')
+        words = vocabulary(VOCABULARY_SIZE)
+        with transaction.atomic():
+            self.create_posts(words, options['posts'])
+            started = time.perf_counter()
+            search.rebuild()
+            self.stdout.write(
+                f'постов: {options["posts"]}, построение индекса: '
+                f'{time.perf_counter() - started:.1f} с')
+            self.stdout.write(
+                f'{"слово":>14} {"найдено":>9} {"индекс p50, мс":>15} '
+                f'{"LIKE p50, мс":>13} {"ускорение":>10}')
+            for rank in QUERY_RANKS:
+                self.measure(words[rank], options['reads'])
+            transaction.set_rollback(True)
+
+    def create_posts(self, words, total):
+        author = User.objects.create_user(username='bench-search-author')
+        rng = random.Random(1)
+        weights = list(accumulate(
+            1 / rank for rank in range(1, len(words) + 1)))
+        for start in range(0, total, BATCH_SIZE):
+            stop = min(start + BATCH_SIZE, total)
+            Post.objects.bulk_create(
+                Post(author=author, text=' '.join(
+                    rng.choices(words, cum_weights=weights, k=WORDS_PER_POST)))
+                for _ in range(start, stop))
+
+    def timed(self, queryset, reads):
+        timings = []
+        for _ in range(reads):
+            started = time.perf_counter()
+            queryset.count()
+            list(queryset[:10])
+            timings.append(time.perf_counter() - started)
+        return percentile(timings, 0.5)
+
+    def measure(self, word, reads):
+        indexed = search.search(word)
+        scan = Post.objects.filter(text__icontains=word)
+        found = indexed.count()
+        fts, like = self.timed(indexed, reads), self.timed(scan, reads)
+        self.stdout.write(
+            f'{word:>14} {found:>9} {fts * 1000:>15.1f} '
+            f'{like * 1000:>13.1f} {like / fts:>9.1f}x')
@@ -0,0 +1,140 @@
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+from core.stats import percentile
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.template.loader import get_template
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+from sorl.thumbnail.images import ImageFile
+
+from posts import thumbnails
+from posts.forms import CommentForm
+from posts.models import Comment, Group, Post
+
+User = get_user_model()
+
+POSTS_PER_PAGE = 10
+COMMENTS = 20
+PAGES = 100
+POST_TEXT = 'Текст поста для замера отрисовки шаблонов. ' * 5
+COMMENT_TEXT = 'Комментарий для замера отрисовки шаблонов'
+CREATED = datetime(2024, 1, 1, tzinfo=timezone.utc)
+# кеш не участвует: карточки и фрагменты отрисовываются каждый раз
+NO_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    'shared': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+
+
+def database_blocked(execute, sql, params, many, context):
+    raise CommandError(f'Запрос к БД при отрисовке шаблона: {sql}')
+
+
+def make_thumbnail(post):
+    """Готовые варианты миниатюры, как после thumbnails.prefetch()."""
+    variants = {}
+    for image_format, width in thumbnails.VARIANTS:
+        thumbnail = ImageFile(
+            f'cache/bench/{post.pk}-{width}.{image_format.lower()}')
+        thumbnail.set_size(
+            (width, round(width * thumbnails.THUMBNAIL_RATIO)))
+        variants[image_format, width] = thumbnail
+    setattr(post, thumbnails.THUMBNAIL_ATTR,
+            thumbnails.ResponsiveThumbnail(variants))
+
+
+def fixtures():
+    """Объекты в памяти: пользователь, посты страницы и комментарии."""
+    user = User(pk=1, username='reader', first_name='Читатель')
+    author = User(pk=2, username='author', first_name='Автор',
+                  last_name='Постов')
+    group = Group(pk=1, title='Группа', slug='group')
+    posts = []
+    for number in range(POSTS_PER_PAGE):
+        post = Post(pk=number + 1, text=POST_TEXT, author=author,
+                    group=group if number % 2 else None,
+                    created=CREATED - timedelta(hours=number))
+        if number % 3 == 0:
+            post.image.name = f'posts/bench/{number}.jpg'
+            make_thumbnail(post)
+        posts.append(post)
+    comments = [
+        Comment(pk=number + 1, post=posts[0], author=user,
+                text=COMMENT_TEXT, created=CREATED)
+        for number in range(COMMENTS)
+    ]
+    return user, posts, comments
+
+
+def cases():
+    """Шаблоны и контексты: (имя, шаблон, контекст, запрос)."""
+    user, posts, comments = fixtures()
+    request = RequestFactory().get(reverse('posts:index'))
+    request.user = user
+    paginator = Paginator(posts * PAGES, POSTS_PER_PAGE)
+    page = paginator.page(PAGES // 2)
+    page_context = {'page_obj': page, 'is_paginated': True,
+                    'paginator': paginator, 'page_query': ''}
+    return [
+        ('post.html', 'posts/includes/post.html', {'post': posts[1]}, None),
+        ('post.html с изображением', 'posts/includes/post.html',
+         {'post': posts[0]}, None),
+        ('paginator.html', 'posts/includes/paginator.html', page_context,
+         None),
+        ('comments.html', 'posts/includes/comments.html',
+         {'post': posts[0], 'comments': comments, 'form': CommentForm(),
+          'user': user}, request),
+        ('index.html', 'posts/index.html',
+         {**page_context, 'posts': posts, 'title': 'Главная',
+          'cache_timeout': 0, 'cache_version': 0}, request),
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Замеряет отрисовку шаблонов постов с постоянными контекстами '
+            'в памяти: время одной отрисовки и пик выделенной памяти. '
+            'БД и кеш не используются, запросы к БД считаются ошибкой.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--renders', type=int, default=1000,
+            help='Сколько раз отрисовать каждый шаблон.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"шаблон":>26} {"p50, мкс":>9} {"p95, мкс":>9} '
+            f'{"пик памяти, КиБ":>16}')
+        with override_settings(CACHES=NO_CACHE), \
+                connections['default'].execute_wrapper(database_blocked):
+            for name, template_name, context, request in cases():
+                template = get_template(template_name)
+                p50, p95 = self.timed(
+                    template, context, request, options['renders'])
+                peak = self.peak_memory(template, context, request)
+                self.stdout.write(
+                    f'{name:>26} {p50 * 1e6:>9.0f} {p95 * 1e6:>9.0f} '
+                    f'{peak / 1024:>16.1f}')
+
+    def timed(self, template, context, request, renders):
+        template.render(context, request)
+        timings = []
+        for _ in range(renders):
+            started = time.perf_counter()
+            template.render(context, request)
+            timings.append(time.perf_counter() - started)
+        return percentile(timings, 0.5), percentile(timings, 0.95)
+
+    def peak_memory(self, template, context, request):
+        """Пик памяти, выделенной за одну отрисовку, в байтах."""
+        tracemalloc.start()
+        try:
+            baseline = tracemalloc.get_traced_memory()[0]
+            template.render(context, request)
+            return tracemalloc.get_traced_memory()[1] - baseline
+        finally:
+            tracemalloc.stop()
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+
+from posts import thumbnails
+from posts.models import Post
+from posts.views import QTY_OF_POSTS_ON_PAGE
+
+# миниатюра, которую карточки выводили до адаптивных вариантов
+LEGACY_THUMBNAIL = ('960x339', {'padding': True, 'upscale': True})
+
+
+def chosen_width(viewport, dpr):
+    """Ширина варианта, которую браузер выберет по srcset и sizes."""
+    slot = min(viewport, thumbnails.THUMBNAIL_WIDTHS[-1]) * dpr
+    for width in thumbnails.THUMBNAIL_WIDTHS:
+        if width >= slot:
+            return width
+    return thumbnails.THUMBNAIL_WIDTHS[-1]
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает объём изображений первой страницы ленты: одна '
+            'миниатюра 960x339 в JPEG до и адаптивные варианты WebP после, '
+            'для разных ширин экрана. Недостающие миниатюры создаются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--viewports', type=int, nargs='+', default=[360, 768, 1280],
+            help='Ширины экрана, px.')
+        parser.add_argument(
+            '--dpr', type=float, nargs='+', default=[1, 2],
+            help='Плотности пикселей экрана.')
+        parser.add_argument(
+            '--above-fold', type=int, default=2,
+            help='Сколько карточек видно без прокрутки; остальные '
+                 'изображения загружаются лениво.')
+
+    def handle(self, *args, **options):
+        posts = [post for post in Post.objects.all()[:QTY_OF_POSTS_ON_PAGE]
+                 if post.image]
+        if not posts:
+            self.stdout.write('На первой странице ленты нет изображений')
+            return
+        backend = ThumbnailBackend()
+
+        def size(post, geometry_string, options):
+            thumbnail = backend.get_thumbnail(
+                post.image, geometry_string, **options)
+            return default.storage.size(thumbnail.name)
+
+        before = [size(post, *LEGACY_THUMBNAIL) for post in posts]
+        self.stdout.write(
+            f'изображений на странице: {len(posts)}, '
+            f'видно без прокрутки: {options["above_fold"]}')
+        self.stdout.write(
+            f'{"экран":>6} {"dpr":>4} {"вариант":>8} {"до, КБ":>9} '
+            f'{"после, КБ":>10} {"сразу, КБ":>10} {"экономия":>9}')
+        for viewport in options['viewports']:
+            for dpr in options['dpr']:
+                width = chosen_width(viewport, dpr)
+                after = [size(post, *thumbnails.VARIANTS['WEBP', width])
+                         for post in posts]
+                initial = sum(after[:options['above_fold']])
+                saved = 1 - initial / sum(before)
+                self.stdout.write(
+                    f'{viewport:>6} {dpr:>4g} {width:>8} '
+                    f'{sum(before) / 1024:>9.1f} {sum(after) / 1024:>10.1f} '
+                    f'{initial / 1024:>10.1f} {saved:>9.0%}')
@@ -0,0 +1,138 @@
+import json
+import time
+from contextlib import nullcontext
+from http import HTTPStatus
+
+from core import loadtest
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from posts.models import Group, Post
+
+User = get_user_model()
+
+# сколько групп, авторов и постов выбрать для адресов сценария
+SAMPLE_SIZE = 1000
+COMMENT_TEXT = 'Комментарий нагрузочного прогона'
+POST_TEXT = 'Пост нагрузочного прогона'
+
+
+def sample(queryset, field):
+    return list(queryset.order_by('?').values_list(
+        field, flat=True)[:SAMPLE_SIZE])
+
+
+def scenario():
+    """Маршруты posts и их доли в нагрузке."""
+    slugs = sample(Group.objects.all(), 'slug')
+    usernames = sample(
+        User.objects.filter(counters__posts_count__gt=0), 'username')
+    post_ids = sample(Post.objects.all(), 'pk')
+    if not (slugs and post_ids):
+        raise CommandError(
+            'В БД нет групп или постов: заполните её командой seed_dataset.')
+    if not usernames:
+        raise CommandError(
+            'Ни у одного автора нет постов в счётчиках: заполните БД '
+            'командой seed_dataset или пересчитайте счётчики командой '
+            'reconcile_counters.')
+    return [
+        loadtest.Route('index', 30, lambda rng: reverse('posts:index')),
+        loadtest.Route(
+            'group_list', 15, lambda rng: reverse(
+                'posts:group_list', args=[rng.choice(slugs)])),
+        loadtest.Route(
+            'profile', 15, lambda rng: reverse(
+                'posts:profile', args=[rng.choice(usernames)])),
+        loadtest.Route(
+            'post_detail', 20, lambda rng: reverse(
+                'posts:post_detail', args=[rng.choice(post_ids)])),
+        loadtest.Route(
+            'follow_index', 15, lambda rng: reverse('posts:follow_index'),
+            login_required=True),
+        loadtest.Route(
+            'add_comment', 4, lambda rng: reverse(
+                'posts:add_comment', args=[rng.choice(post_ids)]),
+            data=lambda rng: {'text': COMMENT_TEXT}, login_required=True,
+            expected_status=HTTPStatus.FOUND),
+        loadtest.Route(
+            'post_create', 1, lambda rng: reverse('posts:post_create'),
+            data=lambda rng: {'text': POST_TEXT}, login_required=True,
+            expected_status=HTTPStatus.FOUND),
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Нагружает маршруты posts по HTTP смесью запросов анонимов '
+            'и вошедших пользователей и выводит пропускную способность '
+            'и перцентили задержек по маршрутам. Отчёт сохраняется в JSON; '
+            'с --baseline он сравнивается с прошлым прогоном. Комментарии '
+            'и посты прогона остаются в БД.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            help='Адрес запущенного сервера. По умолчанию сервер '
+                 'разработки поднимается в этом процессе.')
+        parser.add_argument('--duration', type=float, default=30,
+                            help='Длительность замера, секунды.')
+        parser.add_argument('--warmup', type=float, default=3,
+                            help='Разогрев без замеров, секунды.')
+        parser.add_argument('--concurrency', type=int, default=8,
+                            help='Число одновременных клиентов.')
+        parser.add_argument(
+            '--anonymous-share', type=float, default=0.7,
+            help='Доля запросов от анонимов.')
+        parser.add_argument(
+            '--users', type=int, default=50,
+            help='Сколько пользователей входят на сайт.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--output', default=time.strftime('load_test_%Y%m%d_%H%M%S.json'),
+            help='Файл для отчёта в JSON.')
+        parser.add_argument(
+            '--baseline', help='Отчёт прошлого прогона для сравнения.')
+
+    def handle(self, *args, **options):
+        routes = scenario()
+        users = User.objects.filter(follower__isnull=False).distinct()
+        sessions = [loadtest.login_session(user)
+                    for user in users[:options['users']]]
+        server = (nullcontext(options['url']) if options['url']
+                  else loadtest.serve())
+        with server as url:
+            report = loadtest.run(
+                url, routes, sessions,
+                anonymous_share=options['anonymous_share'],
+                concurrency=options['concurrency'],
+                duration=options['duration'], warmup=options['warmup'],
+                seed=options['seed'])
+        self.write_report(report)
+        with open(options['output'], 'w') as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
+        self.stdout.write(f'Отчёт сохранён в {options["output"]}')
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                self.write_comparison(loadtest.compare(
+                    report, json.load(baseline)))
+
+    def write_report(self, report):
+        self.stdout.write(
+            f'{"маршрут":>13} {"запросов":>9} {"ошибок":>7} {"rps":>8} '
+            f'{"p50, мс":>8} {"p95, мс":>8} {"p99, мс":>8}')
+        rows = {**report['routes'], 'total': report['total']}
+        for name, row in rows.items():
+            self.stdout.write(
+                f'{name:>13} {row["requests"]:>9} {row["errors"]:>7} '
+                f'{row["throughput"]:>8.1f} {row["p50"]:>8.1f} '
+                f'{row["p95"]:>8.1f} {row["p99"]:>8.1f}')
+
+    def write_comparison(self, rows):
+        self.stdout.write(
+            f'{"маршрут":>13} {"метрика":>10} {"было":>9} {"стало":>9} '
+            f'{"изменение":>10}')
+        for name, metric, old, new, change in rows:
+            self.stdout.write(
+                f'{name:>13} {metric:>10} {old:>9.1f} {new:>9.1f} '
+                f'{change:>+10.1%}')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает полнотекстовый индекс постов и комментариев, '
+            'например после загрузки данных в обход сигналов.')
+
+    def handle(self, *args, **options):
+        if not search.available():
+            raise CommandError('Полнотекстовый индекс есть только в SQLite.')
+        search.rebuild()
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс пересобран'))
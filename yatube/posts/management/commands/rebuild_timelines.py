@@ -0,0 +1,41 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+from posts.models import Follow
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Заполняет материализованные ленты подписок по текущим '
+            'подпискам и обрезает их до TIMELINE_LENGTH записей. '
+            'При полной пересборке заново определяет авторов, чьи посты '
+            'подмешиваются при чтении.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'usernames', nargs='*',
+            help='Пользователи, чьи ленты нужно пересобрать '
+                 '(по умолчанию все, у кого есть подписки).')
+        parser.add_argument(
+            '--trim-only', action='store_true',
+            help='Только обрезать ленты, не пересобирая их.')
+
+    def handle(self, *args, **options):
+        if not options['trim_only'] and not options['usernames']:
+            timeline.rebuild_all()
+            self.stdout.write(self.style.SUCCESS('Ленты пересобраны'))
+            return
+        users = Follow.objects.values_list('user_id', flat=True).distinct()
+        if options['usernames']:
+            users = User.objects.filter(
+                username__in=options['usernames']).values_list(
+                'pk', flat=True)
+        action = timeline.trim if options['trim_only'] else timeline.rebuild
+        processed = 0
+        for user_id in users.order_by().iterator():
+            action(user_id)
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано лент: {processed}'))
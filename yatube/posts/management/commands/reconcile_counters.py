@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает денормализованные счётчики постов, комментариев '
+            'и подписок порциями и исправляет расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Сколько строк проверять за один запрос.')
+
+    def handle(self, *args, **options):
+        fixed = counters.reconcile(options['chunk_size'])
+        for label, total in fixed.items():
+            self.stdout.write(f'{label}: исправлено {total}')
+        self.stdout.write(self.style.SUCCESS('Счётчики сверены'))
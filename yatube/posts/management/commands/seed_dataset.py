@@ -0,0 +1,68 @@
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.dataset import DatasetGenerator, rebuild_derived
+
+
+class Command(BaseCommand):
+    help = ('Заполняет БД синтетическими данными для замеров: пользователи, '
+            'группы, посты, комментарии и подписки со степенными '
+            'распределениями. При одном и том же --seed данные одинаковы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--groups', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=1000000)
+        parser.add_argument('--comments', type=int, default=2000000)
+        parser.add_argument(
+            '--follows-per-user', type=float, default=20,
+            help='Среднее число подписок пользователя.')
+        parser.add_argument(
+            '--follower-exponent', type=float, default=1.0,
+            help='Показатель закона Ципфа для числа подписчиков авторов.')
+        parser.add_argument(
+            '--activity-exponent', type=float, default=1.0,
+            help='Показатель закона Ципфа для числа постов авторов '
+                 'и постов в группах.')
+        parser.add_argument(
+            '--comment-exponent', type=float, default=1.0,
+            help='Показатель закона Ципфа для числа комментариев у постов.')
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько последних дней распределить посты.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--skip-derived', action='store_true',
+            help='Не пересчитывать счётчики, ленты и поисковый индекс.')
+
+    def handle(self, *args, **options):
+        generator = DatasetGenerator(
+            seed=options['seed'], days=options['days'],
+            batch_size=options['batch_size'],
+            follower_exponent=options['follower_exponent'],
+            activity_exponent=options['activity_exponent'],
+            comment_exponent=options['comment_exponent'],
+            follows_per_user=options['follows_per_user'])
+        steps = (
+            ('пользователи', generator.users, options['users']),
+            ('группы', generator.groups, options['groups']),
+            ('посты', generator.posts, options['posts']),
+            ('комментарии', generator.comments, options['comments']),
+            ('подписки', generator.follows),
+        )
+        for label, step, *args in steps:
+            started = time.perf_counter()
+            with transaction.atomic():
+                created = step(*args)
+            self.stdout.write(
+                f'{label}: {created} за {time.perf_counter() - started:.1f} с')
+        if not options['skip_derived']:
+            for label, timing in rebuild_derived().items():
+                self.stdout.write(f'пересчёт, {label}: {timing:.1f} с')
+        # кешированные страницы собраны по старым данным
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS('Данные созданы'))
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+CREATE_INDEX = (
+    'CREATE VIRTUAL TABLE posts_search USING fts5('
+    "text, comments, tokenize = 'unicode61 remove_diacritics 2')"
+)
+SET_RANK = (
+    "INSERT INTO posts_search(posts_search, rank) "
+    "VALUES ('rank', 'bm25(10.0, 1.0)')"
+)
+FILL_INDEX = (
+    'INSERT INTO posts_search(rowid, text, comments) '
+    'SELECT p.id, p.text, COALESCE(('
+    "SELECT group_concat(c.text, ' ') FROM posts_comment c "
+    "WHERE c.post_id = p.id), '') FROM posts_post p"
+)
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in (CREATE_INDEX, SET_RANK, FILL_INDEX):
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_post_image_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,58 @@
+from django.db import migrations, transaction
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# сколько подписчиков обрабатывать в одной транзакции
+CHUNK_SIZE = 1000
+
+
+def _count(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('user')}).order_by().values(
+            field).annotate(total=Count('pk')).values('total')), 0)
+
+
+def dedupe_follows(apps, schema_editor):
+    """Удаляет повторные подписки порциями, оставляя самую раннюю.
+
+    Каждая порция — своя транзакция, поэтому таблица не блокируется
+    целиком. Счётчики подписок затронутых пользователей пересчитываются.
+    """
+    Follow = apps.get_model('posts', 'Follow')
+    UserCounters = apps.get_model('posts', 'UserCounters')
+    db_alias = schema_editor.connection.alias
+    follows = Follow.objects.using(db_alias)
+    last_user_id = 0
+    while True:
+        users = list(follows.filter(user_id__gt=last_user_id).order_by(
+            'user_id').values_list('user_id', flat=True).distinct()[
+            :CHUNK_SIZE])
+        if not users:
+            break
+        last_user_id = users[-1]
+        with transaction.atomic(using=db_alias):
+            chunk = follows.filter(user_id__in=users)
+            keep = chunk.order_by().values('user', 'author').annotate(
+                first=Min('pk')).values('first')
+            duplicates = chunk.exclude(pk__in=keep)
+            affected = set()
+            for pair in duplicates.values_list('user', 'author'):
+                affected.update(pair)
+            if affected:
+                duplicates.delete()
+                UserCounters.objects.using(db_alias).filter(
+                    user__in=affected).update(
+                    following_count=_count(Follow, 'user'),
+                    followers_count=_count(Follow, 'author'))
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('posts', '0017_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_follows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+import posts.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('post', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='posts.Post')),
+                ('document', posts.models.SearchDocumentField(db_column='posts_search')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'posts_search',
+                'managed': False,
+            },
+        ),
+    ]
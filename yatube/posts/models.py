@@ -1,4 +1,5 @@
 from core.models import CreatedModel
+from core.storage import ContentAddressedStorage
 from django.contrib.auth import get_user_model
 from django.db import models
 
@@ -6,11 +7,23 @@ User = get_user_model()
 
 QTY_OF_SYMBOLS = 15
 
+# области кеша фрагментов, см. core.cache
+FEED_SCOPE = 'posts'
+GROUP_SCOPE = 'group:{}'
+AUTHOR_SCOPE = 'author:{}'
+FOLLOW_SCOPE = 'follow:{}'
+# области кеша карточек постов, см. posts.templatetags.post_cards
+CARD_POST_SCOPE = 'card:post:{}'
+CARD_AUTHOR_SCOPE = 'card:author:{}'
+CARD_GROUP_SCOPE = 'card:group:{}'
+
 
 class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=80, unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField(
+        'Число постов', default=0, editable=False)
 
     class Meta:
         verbose_name = 'группа'
@@ -35,13 +48,25 @@ class Post(CreatedModel):
         verbose_name='Картинка',
         help_text='Загрузите картинку',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True,
     )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев', default=0, editable=False)
 
     class Meta:
         ordering = ['-created']
         verbose_name = 'пост'
         verbose_name_plural = 'посты'
+        # ленты читаются диапазоном по ключу (created, id), см. CursorPaginator
+        indexes = [
+            models.Index(fields=['-created', '-id'],
+                         name='post_created_idx'),
+            models.Index(fields=['author', '-created', '-id'],
+                         name='post_author_created_idx'),
+            models.Index(fields=['group', '-created', '-id'],
+                         name='post_group_created_idx'),
+        ]
 
     def __str__(self):
         return self.text[:QTY_OF_SYMBOLS]
@@ -62,6 +87,10 @@ class Comment(CreatedModel):
         ordering = ['-created']
         verbose_name = 'комментарий'
         verbose_name_plural = 'комментарии'
+        indexes = [
+            models.Index(fields=['post', '-created'],
+                         name='comment_post_created_idx'),
+        ]
 
     def __str__(self):
         return self.text[:QTY_OF_SYMBOLS]
@@ -84,6 +113,140 @@ class Follow(models.Model):
     class Meta:
         verbose_name = 'подписка'
         verbose_name_plural = 'подписки'
+        # покрывает подзапрос авторов ленты подписок
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='follow_unique_user_author'),
+        ]
 
     def __str__(self):
         return f'Подписка {self.user.username} на {self.author.username}'
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя.
+
+    Ключ (created, post) копируется из поста, чтобы страница ленты
+    читалась одним диапазоном индекса (user, -created, -post).
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Пользователь',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    created = models.DateTimeField('Дата создания')
+
+    class Meta:
+        ordering = ['-created', '-post']
+        verbose_name = 'запись ленты'
+        verbose_name_plural = 'записи ленты'
+        indexes = [
+            models.Index(fields=['user', '-created', '-post'],
+                         name='timeline_user_created_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='timeline_user_author_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='timeline_unique_user_post'),
+        ]
+
+    def __str__(self):
+        return f'Лента {self.user_id}: пост {self.post_id}'
+
+
+class PulledAuthor(models.Model):
+    """Автор с большим числом подписчиков.
+
+    Его посты не раскладываются по лентам при публикации,
+    а подмешиваются в ленту подписчика при чтении.
+    """
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='pulled_feed',
+        verbose_name='Автор',
+    )
+
+    class Meta:
+        verbose_name = 'автор с подмешиваемой лентой'
+        verbose_name_plural = 'авторы с подмешиваемой лентой'
+
+    def __str__(self):
+        return str(self.author)
+
+
+class UserCounters(models.Model):
+    """Счётчики пользователя, которые обновляются вместе с данными.
+
+    Строка создаётся при первом увеличении счётчика или первом чтении
+    и заполняется фактическими значениями.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Число подписок', default=0)
+
+    class Meta:
+        verbose_name = 'счётчики пользователя'
+        verbose_name_plural = 'счётчики пользователей'
+
+    def __str__(self):
+        return f'Счётчики {self.user_id}'
+
+
+class SearchDocumentField(models.TextField):
+    """Скрытый столбец FTS5 с именем таблицы, по нему ищет MATCH."""
+
+
+@SearchDocumentField.register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class SearchEntry(models.Model):
+    """Строка полнотекстового индекса posts_search, см. posts.search.
+
+    Таблицу создаёт и наполняет не ORM, а миграция 0017 и сигналы;
+    модель нужна, чтобы присоединять индекс к постам в запросах.
+    Поле rank заполнено только в запросе с MATCH.
+    """
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column='rowid',
+        related_name='search_entry',
+    )
+    document = SearchDocumentField(db_column='posts_search')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'posts_search'
@@ -0,0 +1,91 @@
+"""Полнотекстовый поиск по постам и комментариям.
+
+Индекс — виртуальная таблица SQLite FTS5 `posts_search`, по строке
+на пост (rowid — id поста): текст поста и склеенные комментарии к нему.
+Сигналы Post и Comment обновляют строку после сохранения и удаления;
+после массовой загрузки в обход сигналов (bulk_create) индекс
+пересобирается командой rebuild_search_index. В запросах индекс
+присоединяется к постам через неуправляемую модель SearchEntry.
+
+Результаты упорядочены по релевантности bm25, совпадение в тексте поста
+весит больше совпадения в комментариях. На СУБД без FTS5 поиск сводится
+к сканированию icontains.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Post
+
+SEARCH_TABLE = 'posts_search'
+# веса столбцов text и comments для bm25
+RANK = 'bm25(10.0, 1.0)'
+# порядок результатов поиска
+ORDERING = ('search_entry__rank', '-created', '-pk')
+
+_INDEX_POSTS = (
+    f'INSERT INTO {SEARCH_TABLE}(rowid, text, comments) '
+    'SELECT p.id, p.text, COALESCE(('
+    "SELECT group_concat(c.text, ' ') FROM posts_comment c "
+    "WHERE c.post_id = p.id), '') FROM posts_post p"
+)
+_TERM = re.compile(r'\w+')
+
+
+def available():
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(query):
+    """Запрос пользователя в выражение MATCH: все слова, по префиксу.
+
+    Слова берутся в кавычки, поэтому операторы и спецсимволы FTS5
+    в запросе ищутся как обычный текст.
+    """
+    return ' '.join(f'"{term}"*' for term in _TERM.findall(query.lower()))
+
+
+def search(query, queryset=None):
+    """Посты, подходящие под запрос, от самых релевантных."""
+    if queryset is None:
+        queryset = Post.objects.all()
+    expression = match_expression(query)
+    if not expression:
+        return queryset.none()
+    if not available():
+        return queryset.filter(
+            Q(text__icontains=query) | Q(comments__text__icontains=query)
+        ).distinct()
+    # rank заполнен только в той строке индекса, что нашлась по MATCH
+    return queryset.filter(
+        search_entry__document__match=expression).order_by(*ORDERING)
+
+
+def index_post(post_id):
+    """Переписывает строку индекса поста по текущим данным."""
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [post_id])
+        cursor.execute(f'{_INDEX_POSTS} WHERE p.id = %s', [post_id])
+
+
+def remove_post(post_id):
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [post_id])
+
+
+def rebuild():
+    """Строит индекс заново по всем постам."""
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        cursor.execute(_INDEX_POSTS)
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')")
@@ -0,0 +1,177 @@
+from core.cache import bump_generation
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import counters, lookups, search, timeline
+from .models import (AUTHOR_SCOPE, CARD_AUTHOR_SCOPE, CARD_GROUP_SCOPE,
+                     CARD_POST_SCOPE, FEED_SCOPE, FOLLOW_SCOPE, GROUP_SCOPE,
+                     Comment, Follow, Group, Post, User)
+
+# поля пользователя, которые выводятся в карточке поста
+CARD_USER_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, **kwargs):
+    instance._saved_group_id = None
+    if instance.pk is not None:
+        instance._saved_group_id = Post.objects.filter(
+            pk=instance.pk).values_list('group_id', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_user(instance.author_id, 'posts_count', 1)
+        counters.bump_group(instance.group_id, 1)
+    elif instance._saved_group_id != instance.group_id:
+        counters.bump_group(instance._saved_group_id, -1)
+        counters.bump_group(instance.group_id, 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, 'posts_count', -1)
+    counters.bump_group(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, **kwargs):
+    scopes = {FEED_SCOPE, AUTHOR_SCOPE.format(instance.author_id)}
+    for group_id in (instance.group_id,
+                     getattr(instance, '_saved_group_id', None)):
+        if group_id is not None:
+            scopes.add(GROUP_SCOPE.format(group_id))
+    bump_generation(*scopes)
+
+
+@receiver(post_save, sender=Post)
+def invalidate_post_card(sender, instance, created, **kwargs):
+    if not created:
+        bump_generation(CARD_POST_SCOPE.format(instance.pk))
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_cards(sender, instance, created, update_fields,
+                            **kwargs):
+    # вход пользователя сохраняет только last_login
+    if created or (update_fields is not None
+                   and CARD_USER_FIELDS.isdisjoint(update_fields)):
+        return
+    # карточки автора есть и на страницах групп, где он писал
+    group_ids = Post.objects.filter(
+        author_id=instance.pk, group__isnull=False).values_list(
+        'group_id', flat=True).order_by().distinct()
+    bump_generation(CARD_AUTHOR_SCOPE.format(instance.pk), FEED_SCOPE,
+                    AUTHOR_SCOPE.format(instance.pk),
+                    *(GROUP_SCOPE.format(pk) for pk in group_ids))
+
+
+@receiver(post_save, sender=Group)
+def invalidate_group_cards(sender, instance, created, **kwargs):
+    if created:
+        return
+    # ссылка на группу есть и в карточках на страницах её авторов
+    author_ids = Post.objects.filter(group_id=instance.pk).values_list(
+        'author_id', flat=True).order_by().distinct()
+    bump_generation(CARD_GROUP_SCOPE.format(instance.pk), FEED_SCOPE,
+                    GROUP_SCOPE.format(instance.pk),
+                    *(AUTHOR_SCOPE.format(pk) for pk in author_ids))
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_slug(sender, instance, **kwargs):
+    instance._saved_slug = None
+    if instance.pk is not None:
+        instance._saved_slug = Group.objects.filter(
+            pk=instance.pk).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def forget_cached_group(sender, instance, **kwargs):
+    lookups.forget_group(instance.slug,
+                         getattr(instance, '_saved_slug', None))
+
+
+@receiver(pre_save, sender=User)
+def remember_username(sender, instance, update_fields, **kwargs):
+    instance._saved_username = None
+    if instance.pk is not None and (update_fields is None
+                                    or 'username' in update_fields):
+        instance._saved_username = User.objects.filter(
+            pk=instance.pk).values_list('username', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, update_fields=None, **kwargs):
+    # вход пользователя сохраняет только last_login
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    lookups.forget_user(instance.username,
+                        getattr(instance, '_saved_username', None))
+
+
+@receiver(post_save, sender=Post)
+def push_post_to_timelines(sender, instance, created, **kwargs):
+    if created:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, **kwargs):
+    search.index_post(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    search.remove_post(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def index_commented_post(sender, instance, **kwargs):
+    search.index_post(instance.post_id)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_post(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.bump_post(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_saved_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_user(instance.user_id, 'following_count', 1)
+        counters.bump_user(instance.author_id, 'followers_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.bump_user(instance.user_id, 'following_count', -1)
+    counters.bump_user(instance.author_id, 'followers_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_feed(sender, instance, **kwargs):
+    bump_generation(FOLLOW_SCOPE.format(instance.user_id))
+
+
+@receiver(post_save, sender=Follow)
+def fill_timeline_on_follow(sender, instance, created, **kwargs):
+    if created:
+        timeline.add_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def trim_timeline_on_unfollow(sender, instance, **kwargs):
+    timeline.remove_author(instance.user_id, instance.author_id)
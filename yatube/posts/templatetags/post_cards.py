@@ -0,0 +1,55 @@
+from itertools import chain
+
+from core.cache import get_generations
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.safestring import mark_safe
+
+from .. import thumbnails
+from ..models import CARD_AUTHOR_SCOPE, CARD_GROUP_SCOPE, CARD_POST_SCOPE
+
+register = template.Library()
+
+CARD_TEMPLATE = 'posts/includes/post.html'
+CARD_KEY = 'post_card:{}:{}:{}'
+
+
+def card_scopes(post):
+    """Области, от которых зависит карточка: пост, автор и группа."""
+    scopes = [CARD_POST_SCOPE.format(post.pk),
+              CARD_AUTHOR_SCOPE.format(post.author_id)]
+    if post.group_id is not None:
+        scopes.append(CARD_GROUP_SCOPE.format(post.group_id))
+    return scopes
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts, hide_author=False):
+    """HTML карточек постов; готовые берутся из кеша одним get_many.
+
+    В ключ карточки входят поколения поста, автора и группы, поэтому
+    их правка делает карточку устаревшей сразу на всех лентах. То, что
+    зависит от страницы, передаётся параметрами тега и тоже входит
+    в ключ: `{% post_cards posts hide_author=True as cards %}`.
+    """
+    posts = list(posts)
+    scopes = [card_scopes(post) for post in posts]
+    generations = iter(get_generations(*chain.from_iterable(scopes)))
+    keys = [
+        CARD_KEY.format(post.pk, int(hide_author), '.'.join(
+            str(next(generations)) for _ in post_scopes))
+        for post, post_scopes in zip(posts, scopes)
+    ]
+    cards = cache.get_many(keys)
+    missing = {}
+    card_template = context.template.engine.get_template(CARD_TEMPLATE)
+    thumbnails.prefetch(
+        post for post, key in zip(posts, keys) if key not in cards)
+    for post, key in zip(posts, keys):
+        if key not in cards:
+            cards[key] = missing[key] = card_template.render(context.new(
+                {'post': post, 'hide_author': hide_author}))
+    if missing:
+        cache.set_many(missing, settings.FRAGMENT_CACHE_TIMEOUT)
+    return [mark_safe(cards[key]) for key in keys]
@@ -0,0 +1,28 @@
+import logging
+
+from django import template
+from sorl.thumbnail.conf import settings as sorl_settings
+
+from .. import thumbnails
+
+register = template.Library()
+
+logger = logging.getLogger(__name__)
+
+
+@register.simple_tag(name='post_thumbnail')
+def post_thumbnail_tag(post):
+    """Миниатюра изображения поста: `{% post_thumbnail post as im %}`.
+
+    Берёт миниатюру, найденную для всей страницы `thumbnails.prefetch()`,
+    а без неё ищет сама. Если исходника нет, миниатюра без размеров
+    не выводится; ошибки, как и тег `{% thumbnail %}`, пишет в лог.
+    """
+    try:
+        thumbnail = thumbnails.post_thumbnail(post)
+        return thumbnail if thumbnail and thumbnail.size else None
+    except Exception:
+        if sorl_settings.THUMBNAIL_DEBUG:
+            raise
+        logger.exception('Не удалось получить миниатюру поста %s', post.pk)
+        return None
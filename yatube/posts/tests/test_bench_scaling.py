@@ -0,0 +1,25 @@
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..models import Post
+
+
+class BenchScalingTests(TestCase):
+    def test_reports_growth_per_page(self):
+        """Замер по размерам выдаёт время и показатель роста страниц"""
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory, 'scaling.json')
+            call_command('bench_scaling', sizes=[20, 60], users=10, groups=2,
+                         reads=1, output=str(output), stdout=StringIO())
+            results = json.loads(output.read_text())
+        self.assertIn('admin_posts', results)
+        for name, result in results.items():
+            with self.subTest(page=name):
+                self.assertEqual(list(result['p50_ms']), ['20', '60'])
+                self.assertIsInstance(result['exponent'], float)
+        self.assertFalse(Post.objects.exists())
@@ -0,0 +1,16 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+TEMPLATES = ('post.html', 'paginator.html', 'comments.html', 'index.html')
+
+
+class BenchTemplatesTests(SimpleTestCase):
+    def test_renders_without_database(self):
+        """Шаблоны отрисовываются с контекстами в памяти, без БД"""
+        out = StringIO()
+        call_command('bench_templates', renders=2, stdout=out)
+        for name in TEMPLATES:
+            with self.subTest(template=name):
+                self.assertRegex(out.getvalue(), rf'{name} +\d+ +\d+ ')
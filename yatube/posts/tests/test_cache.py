@@ -1,8 +1,13 @@
+from http import HTTPStatus
+
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
+from django.db import connection
 from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from .. import lookups
 from ..models import Group, Post
 
 GROUP_TITLE = 'Тестовая группа'
@@ -11,6 +16,7 @@ GROUP_DESCRIPTION = 'Тестовое описание'
 GROUP_ID = 1
 AUTHOR = 'author'
 POST_TEXT = 'Тестовый пост'
+POST_TEXT_EDITED = 'Новый тестовый пост'
 
 User = get_user_model()
 
@@ -32,6 +38,7 @@ class IndexCacheTests(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.authorized_client_author = Client()
         self.authorized_client_author.force_login(self.author)
 
@@ -46,7 +53,8 @@ class IndexCacheTests(TestCase):
         self.assertEqual(post_text, POST_TEXT)
         self.assertEqual(post_author, AUTHOR)
         self.assertEqual(post_group_slug, GROUP_SLUG)
-        self.post.delete()
+        # изменение в обход сигналов не сбрасывает кэш
+        Post.objects.filter(pk=self.post.pk).update(text=POST_TEXT_EDITED)
         response = self.authorized_client_author.get(reverse('posts:index'))
         content2 = response.content
         self.assertEqual(content1, content2)
@@ -54,3 +62,142 @@ class IndexCacheTests(TestCase):
         response = self.authorized_client_author.get(reverse('posts:index'))
         content3 = response.content
         self.assertNotEqual(content1, content3)
+
+    def test_post_changes_invalidate_cached_pages(self):
+        """Создание и удаление поста сразу видны на всех лентах"""
+        pages = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'group_list': GROUP_SLUG}),
+            reverse('posts:profile', kwargs={'username': AUTHOR}),
+        ]
+        for address in pages:
+            self.authorized_client_author.get(address)
+        new_post = Post.objects.create(
+            author=self.author,
+            text=POST_TEXT_EDITED,
+            group=self.group,
+        )
+        for address in pages:
+            with self.subTest(address=address):
+                response = self.authorized_client_author.get(address)
+                self.assertContains(response, POST_TEXT_EDITED)
+        new_post.delete()
+        for address in pages:
+            with self.subTest(address=address):
+                response = self.authorized_client_author.get(address)
+                self.assertNotContains(response, POST_TEXT_EDITED)
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=AUTHOR)
+        cls.group = Group.objects.create(
+            title=GROUP_TITLE,
+            slug=GROUP_SLUG,
+            description=GROUP_DESCRIPTION,
+        )
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text=POST_TEXT,
+            group=cls.group,
+        )
+        cls.index_url = reverse('posts:index')
+        cls.profile_url = reverse('posts:profile', kwargs={'username': AUTHOR})
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cards_are_shared_between_feeds(self):
+        """Карточка, отрисованная для одной ленты, берётся из кеша другой"""
+        self.client.get(self.index_url)
+        Post.objects.filter(pk=self.post.pk).update(text=POST_TEXT_EDITED)
+        response = self.client.get(
+            reverse('posts:group_list', kwargs={'group_list': GROUP_SLUG}))
+        self.assertContains(response, POST_TEXT)
+        self.assertNotContains(response, POST_TEXT_EDITED)
+
+    def test_profile_card_hides_author_link(self):
+        """На странице автора карточка без ссылки на автора"""
+        author_link = reverse('posts:profile', kwargs={'username': AUTHOR})
+        self.assertContains(self.client.get(self.index_url), author_link)
+        response = self.client.get(self.profile_url)
+        self.assertNotContains(response, f'href={author_link}>')
+
+    def test_edits_invalidate_cards(self):
+        """Правка поста, имени автора или группы обновляет карточки"""
+        group_url = reverse('posts:group_list',
+                            kwargs={'group_list': GROUP_SLUG})
+        self.client.get(self.index_url)
+        self.post.text = POST_TEXT_EDITED
+        self.post.save()
+        self.assertContains(self.client.get(self.index_url), POST_TEXT_EDITED)
+        # страницы группы и автора кешируются заново после правки поста
+        for url in (group_url, self.profile_url):
+            self.client.get(url)
+        self.author.first_name = 'Новое'
+        self.author.last_name = 'Имя'
+        self.author.save()
+        for url in (self.index_url, group_url):
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Новое Имя')
+        self.group.slug = 'new-slug'
+        self.group.save()
+        new_group_url = reverse('posts:group_list',
+                                kwargs={'group_list': 'new-slug'})
+        for url in (self.index_url, self.profile_url):
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), new_group_url)
+
+
+class LookupCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username=AUTHOR)
+        cls.group = Group.objects.create(
+            title=GROUP_TITLE,
+            slug=GROUP_SLUG,
+            description=GROUP_DESCRIPTION,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_lookups_are_cached(self):
+        """Группа и пользователь второй раз читаются из кеша"""
+        lookups.group_by_slug(GROUP_SLUG)
+        lookups.user_by_username(AUTHOR)
+        with CaptureQueriesContext(connection) as queries:
+            group = lookups.group_by_slug(GROUP_SLUG)
+            author = lookups.user_by_username(AUTHOR)
+        self.assertEqual((group, author), (self.group, self.author))
+        for query in queries.captured_queries:
+            self.assertNotIn('"posts_group"', query['sql'])
+            self.assertNotIn('"auth_user"', query['sql'])
+
+    def test_renames_reach_cached_lookups(self):
+        """После смены slug и username старые адреса отдают 404"""
+        old_urls = (
+            reverse('posts:group_list', kwargs={'group_list': GROUP_SLUG}),
+            reverse('posts:profile', kwargs={'username': AUTHOR}),
+        )
+        for url in old_urls:
+            self.client.get(url)
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'renamed'
+        group.title = 'Новое название'
+        group.save()
+        author = User.objects.get(pk=self.author.pk)
+        author.username = 'renamed'
+        author.save()
+        for url in old_urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code,
+                                 HTTPStatus.NOT_FOUND)
+        self.assertContains(self.client.get(reverse(
+            'posts:group_list', kwargs={'group_list': 'renamed'})),
+            'Новое название')
+        self.assertEqual(self.client.get(reverse(
+            'posts:profile', kwargs={'username': 'renamed'})).status_code,
+            HTTPStatus.OK)
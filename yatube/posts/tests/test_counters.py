@@ -0,0 +1,85 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..counters import for_user
+from ..models import Comment, Follow, Group, Post, UserCounters
+
+User = get_user_model()
+
+AUTHOR = 'author'
+USER = 'test-user'
+POST_TEXT = 'Тестовый пост'
+COMMENT_TEXT = 'Тестовый комментарий'
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=AUTHOR)
+        cls.user = User.objects.create_user(username=USER)
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug',
+            description='Тестовое описание')
+        cls.another_group = Group.objects.create(
+            title='Другая группа', slug='another-slug',
+            description='Тестовое описание')
+
+    def test_post_counters(self):
+        """Счётчики постов автора и группы меняются вместе с постами"""
+        post = Post.objects.create(
+            author=self.author, text=POST_TEXT, group=self.group)
+        self.assertEqual(for_user(self.author.pk).posts_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        post.group = self.another_group
+        post.save()
+        self.group.refresh_from_db()
+        self.another_group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.another_group.posts_count, 1)
+        post.delete()
+        self.another_group.refresh_from_db()
+        self.assertEqual(for_user(self.author.pk).posts_count, 0)
+        self.assertEqual(self.another_group.posts_count, 0)
+
+    def test_comment_counter(self):
+        """Счётчик комментариев поста меняется вместе с комментариями"""
+        post = Post.objects.create(author=self.author, text=POST_TEXT)
+        comment = Comment.objects.create(
+            author=self.user, post=post, text=COMMENT_TEXT)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_follow_counters(self):
+        """Счётчики подписчиков и подписок меняются вместе с подписками"""
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(for_user(self.author.pk).followers_count, 1)
+        self.assertEqual(for_user(self.user.pk).following_count, 1)
+        follow.delete()
+        self.assertEqual(for_user(self.author.pk).followers_count, 0)
+        self.assertEqual(for_user(self.user.pk).following_count, 0)
+
+    def test_reconcile_command_fixes_drift(self):
+        """Команда reconcile_counters исправляет расхождения"""
+        post = Post.objects.create(
+            author=self.author, text=POST_TEXT, group=self.group)
+        Comment.objects.create(author=self.user, post=post, text=COMMENT_TEXT)
+        Follow.objects.create(user=self.user, author=self.author)
+        UserCounters.objects.update(
+            posts_count=5, followers_count=5, following_count=5)
+        Group.objects.update(posts_count=5)
+        Post.objects.update(comments_count=5)
+        call_command('reconcile_counters', chunk_size=1, stdout=StringIO())
+        author_counters = for_user(self.author.pk)
+        self.assertEqual(author_counters.posts_count, 1)
+        self.assertEqual(author_counters.followers_count, 1)
+        self.assertEqual(for_user(self.user.pk).following_count, 1)
+        self.assertEqual(Group.objects.get(pk=self.group.pk).posts_count, 1)
+        self.assertEqual(Post.objects.get(pk=post.pk).comments_count, 1)
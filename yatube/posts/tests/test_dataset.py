@@ -0,0 +1,68 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import Count, F
+from django.test import TestCase
+from django.utils import timezone
+
+from .. import search
+from ..counters import for_user
+from ..models import Comment, Follow, Group, Post, TimelineEntry
+
+User = get_user_model()
+
+USERS = 20
+GROUPS = 3
+POSTS = 60
+COMMENTS = 40
+
+
+class SeedDatasetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command('seed_dataset', users=USERS, groups=GROUPS, posts=POSTS,
+                     comments=COMMENTS, follows_per_user=3, days=30,
+                     batch_size=7, stdout=StringIO())
+
+    def test_counts(self):
+        """Команда создаёт заданное число строк"""
+        self.assertEqual(User.objects.count(), USERS)
+        self.assertEqual(Group.objects.count(), GROUPS)
+        self.assertEqual(Post.objects.count(), POSTS)
+        self.assertEqual(Comment.objects.count(), COMMENTS)
+        self.assertTrue(Follow.objects.exists())
+
+    def test_dates_spread_over_period(self):
+        """Посты распределены по периоду, комментарии позже постов"""
+        now = timezone.now()
+        dates = list(Post.objects.order_by('pk').values_list(
+            'created', flat=True))
+        self.assertEqual(dates, sorted(dates))
+        self.assertGreater(now - dates[0], timedelta(days=29))
+        self.assertLess(dates[-1], now)
+        self.assertFalse(Comment.objects.filter(
+            created__lt=F('post__created')).exists())
+
+    def test_follows_are_unique_and_not_self(self):
+        """Подписки без повторов и без подписок на себя"""
+        self.assertFalse(Follow.objects.filter(user=F('author')).exists())
+        duplicates = Follow.objects.values('user', 'author').annotate(
+            total=Count('pk')).filter(total__gt=1)
+        self.assertFalse(duplicates.exists())
+
+    def test_derived_data_rebuilt(self):
+        """Счётчики, ленты и поисковый индекс пересчитаны"""
+        author = Post.objects.values('author').annotate(
+            total=Count('pk')).order_by('-total').first()
+        self.assertEqual(for_user(author['author']).posts_count,
+                         author['total'])
+        follow = Follow.objects.first()
+        self.assertEqual(
+            TimelineEntry.objects.filter(user_id=follow.user_id).count(),
+            Post.objects.filter(author__following__user_id=follow.user_id)
+            .count())
+        word = Post.objects.first().text.split()[0]
+        self.assertTrue(search.search(word).exists())
@@ -1,3 +1,4 @@
+import hashlib
 import shutil
 import tempfile
 
@@ -42,6 +43,9 @@ class PostCreateAndEditFormTests(TestCase):
         content=SMALL_GIF,
         content_type='image/gif',
     )
+    # изображения хранятся по хешу содержимого
+    POST_IMAGE_NAME = 'posts/{0:.2}/{0}.gif'.format(
+        hashlib.sha256(SMALL_GIF).hexdigest())
     POST_IMAGE_EDITED = SimpleUploadedFile(
         name='small2.gif',
         content=SMALL_GIF,
@@ -100,7 +104,7 @@ class PostCreateAndEditFormTests(TestCase):
         new_post = Post.objects.get(id=self.NEW_POST_ID)
         self.assertEqual(new_post.text, self.POST_TEXT)
         self.assertEqual(new_post.group.id, self.GROUP_ID)
-        self.assertEqual(new_post.image, f'posts/{self.POST_IMAGE.name}')
+        self.assertEqual(new_post.image, self.POST_IMAGE_NAME)
 
     def test_edit_post_form(self):
         """Валидная форма изменяет запись в Post"""
@@ -122,8 +126,7 @@ class PostCreateAndEditFormTests(TestCase):
         edited_post = Post.objects.get(id=self.POST_ID)
         self.assertEqual(edited_post.text, self.POST_TEXT_EDITED)
         self.assertIsNone(edited_post.group)
-        self.assertEqual(edited_post.image,
-                         f'posts/{self.POST_IMAGE_EDITED.name}')
+        self.assertEqual(edited_post.image, self.POST_IMAGE_NAME)
 
     def test_add_comment_form(self):
         """Валидная форма добавляет комментарий к посту"""
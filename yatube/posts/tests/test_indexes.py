@@ -0,0 +1,66 @@
+from core.query_plans import PlanRecorder, full_scans
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+from ..views import QTY_OF_POSTS_ON_PAGE
+
+User = get_user_model()
+
+TABLES = ('posts_post', 'posts_comment', 'posts_follow')
+
+
+class IndexUsageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        for number in range(QTY_OF_POSTS_ON_PAGE * 2):
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {number}')
+        cls.post = Post.objects.first()
+        Comment.objects.create(
+            post=cls.post, author=cls.user, text='Комментарий')
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_views_read_through_indexes(self):
+        """Запросы страниц не сканируют таблицы и идут по нужным индексам"""
+        urls = {
+            reverse('posts:index'): 'post_created_idx',
+            reverse('posts:index') + '?page=2': 'post_created_idx',
+            reverse('posts:group_list', kwargs={'group_list': 'group'}):
+                'post_group_created_idx',
+            reverse('posts:profile', kwargs={'username': 'author'}):
+                'post_author_created_idx',
+            reverse('posts:post_detail', kwargs={'pk': self.post.pk}):
+                'comment_post_created_idx',
+            reverse('posts:follow_index'): 'timeline_user_created_idx',
+        }
+        for url, index in urls.items():
+            with self.subTest(url=url):
+                cache.clear()
+                with PlanRecorder() as recorder:
+                    self.authorized_client.get(url)
+                plans = recorder.plans(TABLES)
+                for sql, plan in plans:
+                    self.assertEqual(full_scans(plan), [], sql)
+                self.assertTrue(
+                    any(index in ' '.join(plan) for _, plan in plans))
+
+    def test_follow_is_unique(self):
+        """Повторная подписка не создаёт дубль"""
+        url = reverse('posts:profile_follow', kwargs={'username': 'author'})
+        self.authorized_client.get(url)
+        self.assertEqual(Follow.objects.filter(user=self.user).count(), 1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=self.user, author=self.author)
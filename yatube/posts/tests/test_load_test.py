@@ -0,0 +1,74 @@
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from core import loadtest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import LiveServerTestCase
+from django.urls import reverse
+
+from ..models import Follow, Group, Post, UserCounters
+
+User = get_user_model()
+
+ROUTES = {'index', 'group_list', 'profile', 'post_detail', 'follow_index',
+          'add_comment', 'post_create'}
+
+
+class LoadTestCommandTests(LiveServerTestCase):
+    def setUp(self):
+        author = User.objects.create_user(username='author')
+        user = User.objects.create_user(username='test-user')
+        group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug',
+            description='Тестовое описание')
+        Post.objects.create(author=author, text='Тестовый пост', group=group)
+        Follow.objects.create(user=user, author=author)
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def load_test(self, output, **options):
+        out = StringIO()
+        call_command('load_test', url=self.live_server_url, duration=1,
+                     warmup=0, concurrency=1, anonymous_share=0.5,
+                     output=str(output), stdout=out, **options)
+        return out.getvalue()
+
+    def test_report_has_percentiles_per_route(self):
+        """Отчёт содержит задержки по каждому маршруту и без ошибок"""
+        output = Path(self.directory.name, 'report.json')
+        self.load_test(output)
+        report = json.loads(output.read_text())
+        self.assertEqual(set(report['routes']), ROUTES)
+        self.assertGreater(report['total']['requests'], 0)
+        self.assertEqual(report['total']['errors'], 0)
+        for key in ('throughput', 'p50', 'p95', 'p99'):
+            with self.subTest(key=key):
+                self.assertGreater(report['total'][key], 0)
+
+    def test_compare_with_baseline(self):
+        """С --baseline выводится изменение метрик"""
+        baseline = Path(self.directory.name, 'baseline.json')
+        self.load_test(baseline)
+        out = self.load_test(Path(self.directory.name, 'report.json'),
+                             baseline=str(baseline))
+        self.assertRegex(out, r'total +p95 ')
+
+    def test_redirect_to_login_is_an_error(self):
+        """Перенаправление на вход не считается успешным ответом"""
+        route = loadtest.Route(
+            'follow_index', 1, lambda rng: reverse('posts:follow_index'))
+        report = loadtest.run(self.live_server_url, [route], duration=0.5,
+                              warmup=0, concurrency=1)
+        self.assertGreater(report['total']['requests'], 0)
+        self.assertEqual(report['total']['errors'],
+                         report['total']['requests'])
+
+    def test_authors_without_counters_are_reported(self):
+        """Без авторов с постами в счётчиках прогон не начинается"""
+        UserCounters.objects.update(posts_count=0)
+        with self.assertRaisesMessage(CommandError, 'reconcile_counters'):
+            self.load_test(Path(self.directory.name, 'report.json'))
@@ -0,0 +1,59 @@
+from importlib import import_module
+from unittest import mock
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+BEFORE = [('posts', '0017_search_index')]
+AFTER = [('posts', '0019_feed_indexes')]
+
+dedupe = import_module('posts.migrations.0018_dedupe_follows')
+
+
+class DedupeFollowsMigrationTests(TransactionTestCase):
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(BEFORE)
+        apps = executor.loader.project_state(BEFORE).apps
+        User = apps.get_model('auth', 'User')
+        Follow = apps.get_model('posts', 'Follow')
+        UserCounters = apps.get_model('posts', 'UserCounters')
+        self.reader, self.another_reader, self.author = (
+            User.objects.create(username=username)
+            for username in ('reader', 'another-reader', 'author'))
+        for user in (self.reader, self.reader, self.reader,
+                     self.another_reader, self.another_reader):
+            Follow.objects.create(user=user, author=self.author)
+        Follow.objects.create(user=self.author, author=self.reader)
+        # счётчики посчитаны вместе с дублями
+        for user, following, followers in ((self.reader, 3, 1),
+                                           (self.another_reader, 2, 0),
+                                           (self.author, 1, 5)):
+            UserCounters.objects.create(
+                user=user, following_count=following,
+                followers_count=followers)
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_duplicates_are_removed_in_chunks(self):
+        """Миграция оставляет одну подписку на пару и чинит счётчики"""
+        executor = MigrationExecutor(connection)
+        with mock.patch.object(dedupe, 'CHUNK_SIZE', 1):
+            executor.migrate(AFTER)
+        apps = executor.loader.project_state(AFTER).apps
+        Follow = apps.get_model('posts', 'Follow')
+        UserCounters = apps.get_model('posts', 'UserCounters')
+        self.assertEqual(
+            sorted(Follow.objects.values_list('user_id', 'author_id')),
+            sorted([(self.reader.pk, self.author.pk),
+                    (self.another_reader.pk, self.author.pk),
+                    (self.author.pk, self.reader.pk)]))
+        self.assertEqual(
+            set(UserCounters.objects.values_list(
+                'user_id', 'following_count', 'followers_count')),
+            {(self.reader.pk, 1, 1),
+             (self.another_reader.pk, 1, 0),
+             (self.author.pk, 1, 2)})
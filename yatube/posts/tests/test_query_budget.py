@@ -0,0 +1,120 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from core.query_budget import QueryBudgetExceeded
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import thumbnails
+from ..models import Comment, Follow, Group, Post
+from ..views import QTY_OF_POSTS_ON_PAGE, Index
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+User = get_user_model()
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, QUERY_BUDGET_STRICT=True)
+class QueryBudgetTests(TestCase):
+    """Страницы укладываются в бюджет при любом числе постов на странице:
+    у каждого поста свой автор, группа и комментаторы."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        for number in range(QTY_OF_POSTS_ON_PAGE + 1):
+            author = User.objects.create_user(
+                username=f'author-{number}', first_name='Автор')
+            group = Group.objects.create(
+                title=f'Группа {number}', slug=f'group-{number}',
+                description='Описание')
+            post = Post.objects.create(
+                author=author, group=group, text=f'Пост {number}',
+                image=SimpleUploadedFile(
+                    name='small.gif', content=SMALL_GIF,
+                    content_type='image/gif'))
+            Follow.objects.create(user=cls.reader, author=author)
+            Comment.objects.create(post=post, author=author,
+                                   text='Комментарий')
+        cls.author = author
+        cls.post = post
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        # миниатюры создаются в пуле, как в работе, а не в запросе
+        for name, options in (('_use_pool', {'return_value': True}),
+                              ('schedule', {})):
+            patcher = mock.patch.object(thumbnails, name, **options)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def test_pages_are_within_budget(self):
+        """Страницы не выходят за бюджеты при холодном и тёплом кеше"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:index') + '?page=2',
+            reverse('posts:group_list', kwargs={'group_list': 'group-0'}),
+            reverse('posts:profile', kwargs={'username': 'author-0'}),
+            reverse('posts:post_detail', kwargs={'pk': self.post.pk}),
+            reverse('posts:follow_index'),
+            reverse('posts:search') + '?q=пост',
+        )
+        for url in urls:
+            for client in (Client(), self.reader_client):
+                with self.subTest(url=url):
+                    cache.clear()
+                    client.get(url)
+                    client.get(url)
+
+    def test_writes_are_within_budget(self):
+        """Создание и правка поста, комментарий и подписка в бюджете"""
+        post_kwargs = {'pk': self.post.pk}
+        self.author_client.get(reverse('posts:post_edit', kwargs=post_kwargs))
+        self.author_client.post(
+            reverse('posts:post_edit', kwargs=post_kwargs), {'text': 'Правка'})
+        self.author_client.post(
+            reverse('posts:post_create'), {'text': 'Новый пост'})
+        self.reader_client.post(
+            reverse('posts:add_comment', kwargs=post_kwargs),
+            {'text': 'Комментарий'})
+        username = {'username': self.author.username}
+        self.reader_client.get(
+            reverse('posts:profile_unfollow', kwargs=username))
+        self.reader_client.get(
+            reverse('posts:profile_follow', kwargs=username))
+
+    def test_exceeded_budget_fails(self):
+        """Превышение бюджета в строгом режиме — исключение"""
+        with mock.patch.object(Index, 'query_budget', 1):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.reader_client.get(reverse('posts:index'))
+
+    @override_settings(QUERY_BUDGET_CACHE=10)
+    def test_cold_cache_is_counted(self):
+        """Запросы к кешу при холодном кеше сверяются со своим бюджетом"""
+        with self.assertRaisesMessage(QueryBudgetExceeded,
+                                      'запросов к кешу при бюджете 10'):
+            self.reader_client.get(reverse('posts:index'))
@@ -0,0 +1,113 @@
+import json
+import os
+from unittest import mock
+
+from core.query_plans import (PlanRecorder, normalize_plan, normalize_sql,
+                              plan_problems)
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import thumbnails, urls
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# снимки планов; пересоздаются при UPDATE_QUERY_PLANS=1
+SNAPSHOT_PATH = os.path.join(
+    os.path.dirname(__file__), 'snapshots', 'query_plans.json')
+TABLES = ('posts_post', 'posts_comment', 'posts_follow')
+NUMBER_OF_POSTS = 30
+# запросы, которые отправляются POST-ом, и их данные
+POST_DATA = {'add_comment': {'text': 'Комментарий'}}
+QUERY_STRINGS = {'search': '?q=пост'}
+
+
+class QueryPlanSnapshotTests(TestCase):
+    """Планы запросов каждого адреса posts.urls сравниваются со снимком.
+
+    Тесты падают, если появилось новое полное сканирование или временная
+    сортировка в запросе к постам, комментариям или подпискам, а также
+    если изменился текст запроса или его план. Если план изменился
+    намеренно, снимок пересоздаётся командой
+    UPDATE_QUERY_PLANS=1 python manage.py test posts.tests.test_query_plans
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        for number in range(NUMBER_OF_POSTS):
+            post = Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {number}')
+            Comment.objects.create(
+                post=post, author=cls.reader, text=f'Комментарий {number}')
+        cls.post = post
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.url_kwargs = {
+            'group_list': cls.group.slug,
+            'username': cls.author.username,
+            'pk': cls.post.pk,
+        }
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+        patcher = mock.patch.object(thumbnails, 'schedule')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def record(self, pattern):
+        kwargs = {name: self.url_kwargs[name]
+                  for name in pattern.pattern.converters}
+        url = reverse(f'{urls.app_name}:{pattern.name}', kwargs=kwargs)
+        url += QUERY_STRINGS.get(pattern.name, '')
+        cache.clear()
+        with PlanRecorder() as recorder:
+            if pattern.name in POST_DATA:
+                self.client.post(url, POST_DATA[pattern.name])
+            else:
+                self.client.get(url)
+        plans = recorder.plans(TABLES)
+        return {
+            'plans': [{'sql': normalize_sql(sql), 'plan': normalize_plan(plan)}
+                      for sql, plan in plans],
+            'problems': sorted(plan_problems(plans, TABLES)),
+        }
+
+    def snapshot(self):
+        """Текущие планы и снимок; снимок пересоздаётся по переменной."""
+        current = {pattern.name: self.record(pattern)
+                   for pattern in urls.urlpatterns}
+        if os.environ.get('UPDATE_QUERY_PLANS'):
+            with open(SNAPSHOT_PATH, 'w', encoding='utf-8') as snapshot:
+                json.dump(current, snapshot, ensure_ascii=False, indent=2)
+                snapshot.write('\n')
+        with open(SNAPSHOT_PATH, encoding='utf-8') as snapshot:
+            return current, json.load(snapshot)
+
+    def test_no_new_scans_or_temp_sorts(self):
+        """Нет новых полных сканирований и сортировок во временном B-дереве"""
+        current, expected = self.snapshot()
+        for name, recorded in current.items():
+            with self.subTest(url=name):
+                known = list(expected.get(name, {}).get('problems', []))
+                new = []
+                for problem in recorded['problems']:
+                    if problem in known:
+                        known.remove(problem)
+                    else:
+                        new.append(problem)
+                self.assertEqual(new, [], json.dumps(
+                    recorded['plans'], ensure_ascii=False, indent=2))
+
+    def test_plans_match_snapshot(self):
+        """Запросы и их планы совпадают со снимком"""
+        current, expected = self.snapshot()
+        self.assertEqual(sorted(current), sorted(expected))
+        for name, recorded in current.items():
+            with self.subTest(url=name):
+                self.assertEqual(recorded['plans'], expected[name]['plans'])
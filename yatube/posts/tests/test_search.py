@@ -0,0 +1,106 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import search
+from ..models import Comment, Post
+from ..views import QTY_OF_POSTS_ON_PAGE
+
+User = get_user_model()
+
+AUTHOR = 'author'
+
+
+class SearchIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username=AUTHOR)
+        cls.in_text = Post.objects.create(
+            author=cls.author, text='Поездка на Байкал зимой')
+        cls.in_comment = Post.objects.create(
+            author=cls.author, text='Фотографии из отпуска')
+        Comment.objects.create(
+            post=cls.in_comment, author=cls.author, text='Это же Байкал!')
+        cls.other = Post.objects.create(author=cls.author, text='Про котов')
+
+    def test_post_text_ranks_above_comment(self):
+        """Совпадение в тексте поста выше совпадения в комментарии"""
+        self.assertEqual(list(search.search('байкал')),
+                         [self.in_text, self.in_comment])
+
+    def test_admin_keeps_rank_order(self):
+        """Поиск в админке по релевантности, если не выбрана колонка"""
+        admin = User.objects.create_superuser('admin', 'admin@yatube.ru',
+                                              'password')
+        client = Client()
+        client.force_login(admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'байкал'})
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.in_text, self.in_comment])
+        # сортировка по колонке текста в обратном порядке
+        response = client.get(reverse('admin:posts_post_changelist'),
+                              {'q': 'байкал', 'o': '-2'})
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.in_comment, self.in_text])
+
+    def test_prefix_and_special_characters(self):
+        """Слова ищутся по префиксу, синтаксис FTS5 в запросе не ломает"""
+        self.assertEqual(list(search.search('поезд')), [self.in_text])
+        self.assertEqual(list(search.search('"байкал* OR (котов')), [])
+        self.assertFalse(search.search('  !!  ').exists())
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при изменении, удалении и комментариях"""
+        post = Post.objects.get(pk=self.other.pk)
+        post.text = 'Про собак'
+        post.save()
+        self.assertFalse(search.search('котов').exists())
+        self.assertEqual(list(search.search('собак')), [self.other])
+        comment = Comment.objects.create(
+            post=self.other, author=self.author, text='И про ежей')
+        self.assertEqual(list(search.search('ежей')), [self.other])
+        comment.delete()
+        self.assertFalse(search.search('ежей').exists())
+        Post.objects.get(pk=self.in_text.pk).delete()
+        self.assertEqual(list(search.search('байкал')), [self.in_comment])
+
+    def test_rebuild_command(self):
+        """Команда пересобирает индекс после загрузки в обход сигналов"""
+        Post.objects.bulk_create([Post(author=self.author, text='Про ежей')])
+        self.assertFalse(search.search('ежей').exists())
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(search.search('ежей').count(), 1)
+        self.assertEqual(search.search('байкал').count(), 2)
+
+
+class SearchViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username=AUTHOR, is_staff=True, is_superuser=True)
+        for number in range(QTY_OF_POSTS_ON_PAGE + 1):
+            Post.objects.create(author=cls.author, text=f'Байкал {number}')
+
+    def test_search_page_is_paginated(self):
+        """Страница поиска выводит результаты постранично с запросом"""
+        response = self.client.get(reverse('posts:search'), {'q': 'байкал'})
+        self.assertEqual(len(response.context['page_obj']),
+                         QTY_OF_POSTS_ON_PAGE)
+        self.assertContains(response, 'href="?q=%D0%B1%D0%B0%D0%B9%D0%BA'
+                                      '%D0%B0%D0%BB&amp;page=2"')
+        response = self.client.get(
+            reverse('posts:search'), {'q': 'байкал', 'page': 2})
+        self.assertEqual(len(response.context['page_obj']), 1)
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт по индексу"""
+        client = Client()
+        client.force_login(self.author)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'байк'})
+        self.assertEqual(response.context['cl'].result_count,
+                         QTY_OF_POSTS_ON_PAGE + 1)
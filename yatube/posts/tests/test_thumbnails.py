@@ -0,0 +1,156 @@
+import hashlib
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from sorl.thumbnail.conf import settings as sorl_settings
+
+from .. import thumbnails
+from ..models import Post
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+User = get_user_model()
+
+AUTHOR = 'author'
+POST_TEXT = 'Тестовый пост'
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+THUMBNAIL_SIZE = 'width="960" height="339"'
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BackgroundThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=AUTHOR)
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text=POST_TEXT,
+            image=SimpleUploadedFile(
+                name='small.gif', content=SMALL_GIF,
+                content_type='image/gif'),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+
+    def test_placeholder_until_thumbnail_is_ready(self):
+        """Пока миниатюры нет, выводится исходник с размерами миниатюры"""
+        original = f'src="{self.post.image.url}" {THUMBNAIL_SIZE}'
+        with mock.patch.object(thumbnails, '_use_pool', return_value=True):
+            with mock.patch.object(thumbnails, 'schedule') as schedule:
+                response = self.client.get(reverse('posts:index'))
+            schedule.assert_called_once()
+            self.assertContains(response, original)
+            thumbnails.generate(self.post.image.name)
+            response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, original)
+        self.assertContains(response, THUMBNAIL_SIZE)
+
+    def test_card_has_responsive_variants(self):
+        """Карточка выводит варианты по ширинам, WebP и ленивую загрузку"""
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(response, THUMBNAIL_SIZE)
+        for width in thumbnails.THUMBNAIL_WIDTHS:
+            with self.subTest(width=width):
+                self.assertContains(response, f' {width}w', count=2)
+
+    def test_image_bytes_report(self):
+        """Отчёт сравнивает объём изображений ленты до и после"""
+        out = StringIO()
+        call_command('image_bytes_report', viewports=[360], dpr=[1],
+                     stdout=out)
+        self.assertIn('изображений на странице: 1', out.getvalue())
+        self.assertRegex(out.getvalue(), r'360 +1 +480 ')
+
+    def test_upload_schedules_thumbnails(self):
+        """После сохранения изображения миниатюры ставятся в пул"""
+        form_data = {
+            'text': POST_TEXT,
+            'image': SimpleUploadedFile(
+                name='upload.gif', content=SMALL_GIF,
+                content_type='image/gif'),
+        }
+        with mock.patch.object(thumbnails.transaction, 'on_commit',
+                               side_effect=lambda callback: callback()):
+            with mock.patch.object(thumbnails, 'schedule') as schedule:
+                self.authorized_client.post(
+                    reverse('posts:post_create'), data=form_data)
+                self.authorized_client.post(
+                    reverse('posts:post_edit', kwargs={'pk': self.post.pk}),
+                    data={'text': POST_TEXT})
+        digest = hashlib.sha256(SMALL_GIF).hexdigest()
+        schedule.assert_called_once_with(f'posts/{digest[:2]}/{digest}.gif')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BatchedThumbnailLookupTests(TestCase):
+    NUMBER_OF_POSTS = 10
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=AUTHOR)
+        for number in range(cls.NUMBER_OF_POSTS):
+            Post.objects.create(
+                author=cls.author,
+                text=POST_TEXT,
+                image=SimpleUploadedFile(
+                    name=f'small-{number}.gif', content=SMALL_GIF,
+                    content_type='image/gif'),
+            )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    @staticmethod
+    def thumbnail_lookups(calls):
+        prefix = sorl_settings.THUMBNAIL_KEY_PREFIX
+        return [call for call in calls if prefix in str(call[0][0])]
+
+    def test_page_thumbnails_are_looked_up_at_once(self):
+        """Миниатюры страницы ищутся одним запросом к кешу и одним к БД"""
+        self.client.get(reverse('posts:index'))
+        cache.clear()
+        shared = caches['shared']
+        with mock.patch.object(shared, 'get', wraps=shared.get) as get, \
+                mock.patch.object(
+                    shared, 'get_many', wraps=shared.get_many) as get_many, \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'src="/media/cache/',
+                            count=self.NUMBER_OF_POSTS)
+        self.assertEqual(self.thumbnail_lookups(get.call_args_list), [])
+        self.assertEqual(
+            len(self.thumbnail_lookups(get_many.call_args_list)), 1)
+        kvstore_queries = [query for query in queries.captured_queries
+                           if 'thumbnail_kvstore' in query['sql']]
+        self.assertEqual(len(kvstore_queries), 1)
@@ -0,0 +1,86 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Follow, Post, PulledAuthor, TimelineEntry
+from ..timeline import trim
+
+User = get_user_model()
+
+AUTHOR = 'author'
+USER = 'test-user'
+POST_TEXT = 'Тестовый пост'
+
+
+class TimelineTests(TestCase):
+    TIMELINE_LENGTH = 3
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=AUTHOR)
+        cls.user = User.objects.create_user(username=USER)
+        cls.old_post = Post.objects.create(author=cls.author, text=POST_TEXT)
+
+    def timeline_posts(self):
+        return list(TimelineEntry.objects.filter(
+            user=self.user).values_list('post', flat=True))
+
+    def test_follow_fills_timeline_with_existing_posts(self):
+        """Подписка добавляет в ленту уже опубликованные посты автора"""
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(self.timeline_posts(), [self.old_post.pk])
+
+    def test_new_post_is_pushed_to_followers(self):
+        """Новый пост попадает в ленты подписчиков автора"""
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(author=self.author, text=POST_TEXT)
+        self.assertEqual(self.timeline_posts(), [post.pk, self.old_post.pk])
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.author).exists())
+
+    def test_unfollow_removes_author_posts(self):
+        """Отписка убирает посты автора из ленты"""
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        follow.delete()
+        self.assertEqual(self.timeline_posts(), [])
+
+    def test_trim_keeps_newest_entries(self):
+        """Лента обрезается до TIMELINE_LENGTH последних записей"""
+        Follow.objects.create(user=self.user, author=self.author)
+        posts = [Post.objects.create(author=self.author, text=POST_TEXT)
+                 for _ in range(self.TIMELINE_LENGTH)]
+        with override_settings(TIMELINE_LENGTH=self.TIMELINE_LENGTH):
+            trim(self.user.pk)
+        self.assertEqual(self.timeline_posts(),
+                         [post.pk for post in reversed(posts)])
+
+    def test_rebuild_command_restores_timeline(self):
+        """Команда rebuild_timelines заново заполняет ленту"""
+        Follow.objects.create(user=self.user, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self.timeline_posts(), [self.old_post.pk])
+
+    @override_settings(TIMELINE_PULL_THRESHOLD=2)
+    def test_popular_author_posts_are_pulled_on_read(self):
+        """Посты популярного автора подмешиваются в ленту при чтении"""
+        regular_author = User.objects.create_user(username='regular')
+        Follow.objects.create(user=self.user, author=regular_author)
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=regular_author, author=self.author)
+        self.assertTrue(PulledAuthor.objects.filter(
+            author=self.author).exists())
+        regular_post = Post.objects.create(
+            author=regular_author, text=POST_TEXT)
+        pulled_post = Post.objects.create(author=self.author, text=POST_TEXT)
+        self.assertEqual(self.timeline_posts(),
+                         [regular_post.pk, self.old_post.pk])
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']),
+                         [pulled_post, regular_post, self.old_post])
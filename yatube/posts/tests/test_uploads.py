@@ -0,0 +1,94 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django import forms
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from ..forms import PostForm
+from ..models import Post
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+User = get_user_model()
+
+AUTHOR = 'author'
+POST_TEXT = 'Тестовый пост'
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+DIGEST = hashlib.sha256(SMALL_GIF).hexdigest()
+IMAGE_NAME = f'posts/{DIGEST[:2]}/{DIGEST}.gif'
+
+
+def bomb():
+    """PNG в несколько килобайт, распаковывающийся в 49 млн пикселей."""
+    content = BytesIO()
+    Image.new('1', (7000, 7000)).save(content, 'PNG')
+    return content.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=AUTHOR)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+
+    def upload(self, name, content):
+        return self.authorized_client.post(reverse('posts:post_create'), {
+            'text': POST_TEXT,
+            'image': SimpleUploadedFile(
+                name=name, content=content, content_type='image/png'),
+        })
+
+    def test_identical_images_are_stored_once(self):
+        """Одинаковые изображения сохраняются в один файл по хешу"""
+        self.upload('first.gif', SMALL_GIF)
+        self.upload('second.GIF', SMALL_GIF)
+        self.assertEqual(
+            list(Post.objects.values_list('image', flat=True)),
+            [IMAGE_NAME, IMAGE_NAME])
+        directory = os.path.join(TEMP_MEDIA_ROOT, 'posts', DIGEST[:2])
+        self.assertEqual(os.listdir(directory), [f'{DIGEST}.gif'])
+
+    def test_decompression_bomb_is_rejected(self):
+        """Изображение с огромными размерами в заголовке отклоняется"""
+        response = self.upload('bomb.png', bomb())
+        self.assertFormError(
+            response, 'form', 'image',
+            'Изображение слишком большое: 7000×7000')
+        self.assertFalse(Post.objects.exists())
+
+    def test_pixels_are_checked_after_image_field(self):
+        """Размеры проверяются после проверок ImageField"""
+        with mock.patch('posts.forms.check_pixels') as check:
+            form = PostForm(
+                data={'text': POST_TEXT},
+                files={'image': SimpleUploadedFile('text.png', b'text')})
+            self.assertFalse(form.is_valid())
+        check.assert_not_called()
+        self.assertEqual(form.errors['image'][0],
+                         forms.ImageField.default_error_messages[
+                             'invalid_image'])
@@ -1,11 +1,18 @@
+import hashlib
 import shutil
 import tempfile
+from http import HTTPStatus
 
+from core.paginator import CursorPaginator
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.paginator import InvalidPage
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from ..models import Comment, Group, Post
@@ -44,6 +51,9 @@ class PostPagesTests(TestCase):
         content=SMALL_GIF,
         content_type='image/gif',
     )
+    # изображения хранятся по хешу содержимого
+    POST_IMAGE_NAME = 'posts/{0:.2}/{0}.gif'.format(
+        hashlib.sha256(SMALL_GIF).hexdigest())
     COMMENT_TEXT = 'Тестовый комментарий'
 
     @classmethod
@@ -113,7 +123,7 @@ class PostPagesTests(TestCase):
         self.assertEqual(post_text, POST_TEXT)
         self.assertEqual(post_author, AUTHOR)
         self.assertEqual(post_group_slug, GROUP_SLUG)
-        self.assertEqual(post_image, f'posts/{self.POST_IMAGE.name}')
+        self.assertEqual(post_image, self.POST_IMAGE_NAME)
 
     def test_index_page_show_correct_context(self):
         """Шаблон index сформирован с правильным контекстом"""
@@ -197,7 +207,7 @@ class PostPagesTests(TestCase):
         form_fields = {
             'text': [forms.fields.CharField, POST_TEXT],
             'group': [forms.fields.ChoiceField, GROUP_ID],
-            'image': [forms.fields.ImageField, f'posts/{self.POST_IMAGE.name}']
+            'image': [forms.fields.ImageField, self.POST_IMAGE_NAME]
         }
         for value, expected in form_fields.items():
             with self.subTest(value=value):
@@ -271,6 +281,57 @@ class PaginatorViewsTest(TestCase):
                     self.assertEqual(post_author, AUTHOR)
                     self.assertEqual(post_group_slug, GROUP_SLUG)
 
+    def test_cursor_pages_contain_right_records(self):
+        """Проверка курсорной пагинации: переходы вперёд и назад"""
+        expected = list(Post.objects.order_by('-created', '-pk'))
+        for address in self.PAGES_WITH_PAGINATOR:
+            with self.subTest(address=address):
+                cache.clear()
+                first_page = self.guest_client.get(address).context[
+                    'page_obj']
+                self.assertEqual(list(first_page), expected[:10])
+                self.assertIsNone(first_page.previous_cursor)
+                second_page = self.guest_client.get(
+                    address + f'?cursor={first_page.next_cursor}'
+                ).context['page_obj']
+                self.assertEqual(list(second_page), expected[10:])
+                self.assertIsNone(second_page.next_cursor)
+                previous_page = self.guest_client.get(
+                    address + f'?cursor={second_page.previous_cursor}'
+                ).context['page_obj']
+                self.assertEqual(list(previous_page), expected[:10])
+                self.assertIsNone(previous_page.previous_cursor)
+
+    def test_cursor_page_does_not_count_rows(self):
+        """Курсорная страница не выполняет COUNT(*) и OFFSET"""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        first_page = paginator.cursor_page()
+        with CaptureQueriesContext(connection) as queries:
+            paginator.cursor_page(first_page.next_cursor)
+        for query in queries.captured_queries:
+            self.assertNotIn('COUNT(', query['sql'])
+            self.assertNotIn('OFFSET', query['sql'])
+
+    def test_cursor_page_has_no_number(self):
+        """У курсорной страницы нет номера, переходы — по курсорам"""
+        page = CursorPaginator(Post.objects.all(), 10).cursor_page()
+        self.assertTrue(page.has_next())
+        self.assertFalse(page.has_previous())
+        self.assertTrue(page.has_other_pages())
+        for name in ('next_page_number', 'previous_page_number',
+                     'start_index', 'end_index'):
+            with self.subTest(name=name):
+                with self.assertRaises(InvalidPage):
+                    getattr(page, name)()
+        with self.assertRaises(InvalidPage):
+            page.number
+
+    def test_invalid_cursor_returns_404(self):
+        """Некорректный курсор приводит к ошибке 404"""
+        response = self.guest_client.get(
+            reverse('posts:index') + '?cursor=broken')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
 
 class FollowViewsTest(TestCase):
     USER = 'test-user'
@@ -326,6 +387,21 @@ class FollowViewsTest(TestCase):
         posts_count = response.context.get('page_obj').object_list.count()
         self.assertEqual(posts_count, self.NO_POSTS_ON_PAGE)
 
+    def test_cursor_page_reads_posts_by_timeline_keys(self):
+        """Страница ленты подписок выбирает посты по pk, без подзапроса"""
+        self.authorized_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': AUTHOR}))
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(
+                reverse('posts:follow_index'))
+        self.assertContains(response, POST_TEXT)
+        page_queries = [query['sql'] for query in queries.captured_queries
+                        if '"posts_post"."text"' in query['sql']]
+        self.assertTrue(page_queries)
+        for sql in page_queries:
+            self.assertNotIn('posts_follow', sql)
+
     def test_new_post_only_for_follower(self):
         """Новый пост появляется только в ленте фолловеров"""
         response = self.not_follower_client.get(reverse('posts:follow_index'))
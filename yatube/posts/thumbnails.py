@@ -0,0 +1,292 @@
+"""Миниатюры изображений постов создаются в фоне, а не в запросе страницы.
+
+`BackgroundThumbnailBackend` подключается к sorl через THUMBNAIL_BACKEND.
+Готовую миниатюру он, как обычно, берёт из хранилища ключей sorl, а если
+её нет, ставит создание в пул процессов и отдаёт заглушку: исходное
+изображение с размерами миниатюры. `PostCreate` и `PostEdit` ставят
+миниатюры в пул сразу после сохранения изображения. Когда миниатюра
+готова, карточки и ленты с этим постом пересобираются.
+
+Списки постов достают миниатюры всей страницы сразу через `prefetch()`:
+одно обращение к кешу и не больше одного запроса к БД вместо обращения
+на каждый пост (нужно хранилище `KVStore` из этого модуля).
+"""
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from core import tracing
+from core.cache import bump_generation
+from django.conf import settings
+from django.db import connection, transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+from sorl.thumbnail.parsers import parse_geometry
+
+from .models import (AUTHOR_SCOPE, CARD_POST_SCOPE, FEED_SCOPE, GROUP_SCOPE,
+                     Post)
+
+logger = logging.getLogger(__name__)
+
+# ширины вариантов миниатюры; пропорции у всех как у карточки 960x339
+THUMBNAIL_WIDTHS = (480, 720, 960)
+THUMBNAIL_RATIO = 339 / 960
+THUMBNAIL_FORMATS = ('JPEG', 'WEBP')
+THUMBNAIL_OPTIONS = {'padding': True, 'upscale': True}
+# ширина карточки в вёрстке, для атрибута sizes
+THUMBNAIL_SIZES = '(max-width: 960px) 100vw, 960px'
+
+
+def _geometry(width):
+    return f'{width}x{round(width * THUMBNAIL_RATIO)}'
+
+
+# варианты миниатюр, которые выводят шаблоны постов: (формат, ширина) →
+# (геометрия, параметры sorl); основной — самый широкий JPEG
+VARIANTS = {
+    (image_format, width): (
+        _geometry(width), dict(THUMBNAIL_OPTIONS, format=image_format))
+    for image_format in THUMBNAIL_FORMATS
+    for width in THUMBNAIL_WIDTHS
+}
+MAIN_VARIANT = (THUMBNAIL_FORMATS[0], THUMBNAIL_WIDTHS[-1])
+POST_THUMBNAILS = tuple(VARIANTS.values())
+
+# атрибут поста с миниатюрой, заранее найденной prefetch()
+THUMBNAIL_ATTR = '_thumbnail'
+
+_pool = None
+_pending = set()
+
+
+class PendingThumbnail:
+    """Заглушка, пока миниатюра не готова: исходник с её размерами."""
+
+    def __init__(self, source, geometry_string):
+        self.url = source.url
+        self.size = parse_geometry(geometry_string)
+        self.width, self.height = self.size
+
+
+class ResponsiveThumbnail:
+    """Варианты миниатюры поста для `<picture>` со srcset по форматам.
+
+    `url`, `width` и `height` — основного варианта; в srcset попадают
+    только готовые варианты.
+    """
+    sizes = THUMBNAIL_SIZES
+
+    def __init__(self, variants):
+        self.variants = variants
+        main = variants[MAIN_VARIANT]
+        self.url = main.url
+        self.size = main.size
+        self.width, self.height = main.size or (None, None)
+
+    def srcset(self, image_format):
+        return ', '.join(
+            f'{thumbnail.url} {width}w'
+            for (variant_format, width), thumbnail in self.variants.items()
+            if variant_format == image_format
+            and not isinstance(thumbnail, PendingThumbnail))
+
+    @property
+    def jpeg_srcset(self):
+        return self.srcset('JPEG')
+
+    @property
+    def webp_srcset(self):
+        return self.srcset('WEBP')
+
+
+class KVStore(cached_db_kvstore.KVStore):
+    """Хранилище ключей sorl с пакетным чтением."""
+
+    def get_many(self, image_files):
+        """Словарь ключ → найденный ImageFile для нескольких изображений."""
+        keys = {add_prefix(image_file.key): image_file.key
+                for image_file in image_files}
+        found = self.cache.get_many(list(keys))
+        missing = [key for key in keys if key not in found]
+        if missing:
+            stored = dict(KVStoreModel.objects.filter(
+                key__in=missing).values_list('key', 'value'))
+            loaded = {key: stored.get(key, cached_db_kvstore.EMPTY_VALUE)
+                      for key in missing}
+            self.cache.set_many(loaded, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+            found.update(loaded)
+        return {
+            keys[key]: deserialize_image_file(value)
+            for key, value in found.items()
+            if value and value != cached_db_kvstore.EMPTY_VALUE
+        }
+
+
+class BackgroundThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl, который не создаёт миниатюры во время запроса."""
+
+    def _thumbnail_file(self, source, geometry_string, options):
+        # имя миниатюры считается так же, как в ThumbnailBackend
+        options = dict(options)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not file_ or not _use_pool():
+            return super().get_thumbnail(file_, geometry_string, **options)
+        source = ImageFile(file_)
+        cached = default.kvstore.get(
+            self._thumbnail_file(source, geometry_string, options))
+        if cached:
+            return cached
+        # варианты постов создаются вместе, одной задачей на изображение
+        variant = (geometry_string, options)
+        schedule(source.name,
+                 POST_THUMBNAILS if variant in POST_THUMBNAILS else [variant])
+        return PendingThumbnail(source, geometry_string)
+
+    def find_thumbnails(self, requests):
+        """Готовые миниатюры по списку (файл, геометрия, параметры).
+
+        Ищет их в хранилище ключей одним пакетным запросом; на месте
+        отсутствующих возвращает None.
+        """
+        thumbnails = [
+            self._thumbnail_file(ImageFile(file_), geometry_string, options)
+            for file_, geometry_string, options in requests
+        ]
+        found = default.kvstore.get_many(thumbnails)
+        return [found.get(thumbnail.key) for thumbnail in thumbnails]
+
+
+def _use_pool():
+    """Создавать ли миниатюры в пуле процессов.
+
+    Процессы пула работают со своей копией настроек, поэтому БД в памяти
+    (как в тестах) им не видна: тогда миниатюры создаются сразу.
+    """
+    if not settings.THUMBNAIL_WORKERS:
+        return False
+    is_in_memory_db = getattr(connection, 'is_in_memory_db', None)
+    return not (is_in_memory_db and is_in_memory_db())
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            settings.THUMBNAIL_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+            # модуль задачи импортируется после настройки Django
+            initializer=django.setup)
+    return _pool
+
+
+def invalidate(name):
+    """Пересобирает карточки и ленты с постами, где есть изображение."""
+    for post in Post.objects.filter(image=name).only('author', 'group'):
+        scopes = [CARD_POST_SCOPE.format(post.pk), FEED_SCOPE,
+                  AUTHOR_SCOPE.format(post.author_id)]
+        if post.group_id is not None:
+            scopes.append(GROUP_SCOPE.format(post.group_id))
+        bump_generation(*scopes)
+
+
+def generate(name, variants=POST_THUMBNAILS):
+    """Создаёт миниатюры изображения; выполняется в процессе пула."""
+    backend = ThumbnailBackend()
+    # ключ миниатюр sorl зависит от хранилища исходника
+    source = ImageFile(name, Post.image.field.storage)
+    for geometry_string, options in variants:
+        backend.get_thumbnail(source, geometry_string, **dict(options))
+    invalidate(name)
+
+
+def _finished(future, task):
+    _pending.discard(task)
+    if not future.cancelled() and future.exception() is not None:
+        logger.error('Не удалось создать миниатюры %s', task[0],
+                     exc_info=future.exception())
+
+
+def schedule(name, variants=POST_THUMBNAILS):
+    """Ставит создание миниатюр в пул, если их ещё не создают."""
+    if not _use_pool():
+        generate(name, variants)
+        return
+    task = (name, repr(variants))
+    if task in _pending:
+        return
+    _pending.add(task)
+    future = _get_pool().submit(generate, name, variants)
+    future.add_done_callback(lambda future: _finished(future, task))
+
+
+def post_thumbnail(post):
+    """ResponsiveThumbnail изображения поста или None без изображения."""
+    if not post.image:
+        return None
+    if not hasattr(post, THUMBNAIL_ATTR):
+        prefetch([post])
+    return getattr(post, THUMBNAIL_ATTR)
+
+
+def prefetch(posts):
+    """Находит миниатюры всех постов списка за один пакетный запрос.
+
+    Посты, у которых миниатюра уже найдена, пропускаются.
+    """
+    posts = [post for post in posts
+             if post.image and not hasattr(post, THUMBNAIL_ATTR)]
+    if not posts:
+        return
+    with tracing.span('thumbnails', posts=len(posts)):
+        found = iter(default.backend.find_thumbnails([
+            (post.image, geometry_string, options)
+            for post in posts
+            for geometry_string, options in VARIANTS.values()
+        ]))
+        for post in posts:
+            variants = {variant: next(found) for variant in VARIANTS}
+            if None in variants.values():
+                _fill_missing(post, variants)
+            setattr(post, THUMBNAIL_ATTR, ResponsiveThumbnail(variants))
+
+
+def _fill_missing(post, variants):
+    """Заглушки на месте неготовых вариантов и одна задача на все."""
+    use_pool = _use_pool()
+    if use_pool:
+        schedule(post.image.name)
+    for variant, thumbnail in variants.items():
+        if thumbnail is not None:
+            continue
+        geometry_string, options = VARIANTS[variant]
+        if use_pool:
+            variants[variant] = PendingThumbnail(
+                ImageFile(post.image), geometry_string)
+        else:
+            variants[variant] = default.backend.get_thumbnail(
+                post.image, geometry_string, **options)
+
+
+def schedule_on_commit(post):
+    """Ставит миниатюры изображения поста в пул после коммита."""
+    if post.image:
+        name = post.image.name
+        transaction.on_commit(lambda: schedule(name))
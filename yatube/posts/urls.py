@@ -9,6 +9,7 @@ urlpatterns = [
     path('group/<slug:group_list>/', views.GroupPosts.as_view(),
          name='group_list'),
     path('profile/<str:username>/', views.Profile.as_view(), name='profile'),
+    path('search/', views.Search.as_view(), name='search'),
     path('posts/<int:pk>/', views.PostDetail.as_view(),
          name='post_detail'),
     path('create/', views.PostCreate.as_view(), name='post_create'),
@@ -1,31 +1,43 @@
+from core.cache import GenerationCacheMixin
+from core.paginator import CursorPaginationMixin
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse_lazy
+from django.utils.http import urlencode
 from django.views import View
 from django.views.generic import CreateView, DetailView, ListView, UpdateView
 
+from . import counters, lookups, search, thumbnails, timeline
 from .forms import CommentForm, PostForm
-from .models import Comment, Follow, Group, Post, User
+from .models import (AUTHOR_SCOPE, FEED_SCOPE, FOLLOW_SCOPE, GROUP_SCOPE,
+                     Comment, Follow, Post)
 
 QTY_OF_POSTS_ON_PAGE = 10
 
 
-class Index(ListView):
+class Index(GenerationCacheMixin, CursorPaginationMixin, ListView):
     template_name = 'posts/index.html'
     model = Post
     context_object_name = 'posts'
     extra_context = {'title': 'Это главная страница проекта Yatube'}
     paginate_by = QTY_OF_POSTS_ON_PAGE
+    cache_scopes = (FEED_SCOPE,)
+    queryset = Post.objects.select_related('author', 'group')
+    query_budget = 5
 
 
-class GroupPosts(ListView):
+class GroupPosts(GenerationCacheMixin, CursorPaginationMixin, ListView):
     template_name = 'posts/group_list.html'
     context_object_name = 'posts'
     paginate_by = QTY_OF_POSTS_ON_PAGE
+    query_budget = 6
 
     def get_queryset(self, **kwargs):
-        self.group = get_object_or_404(Group, slug=self.kwargs['group_list'])
-        return self.group.posts.all()
+        self.group = lookups.group_by_slug(self.kwargs['group_list'])
+        return self.group.posts.select_related('author', 'group')
+
+    def get_cache_scopes(self):
+        return (GROUP_SCOPE.format(self.group.id),)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -33,18 +45,23 @@ class GroupPosts(ListView):
         return context
 
 
-class Profile(ListView):
+class Profile(GenerationCacheMixin, CursorPaginationMixin, ListView):
     template_name = 'posts/profile.html'
     context_object_name = 'posts'
     paginate_by = QTY_OF_POSTS_ON_PAGE
+    query_budget = 8
 
     def get_queryset(self, **kwargs):
-        self.author = get_object_or_404(User, username=self.kwargs['username'])
-        return self.author.posts.all()
+        self.author = lookups.user_by_username(self.kwargs['username'])
+        return self.author.posts.select_related('author', 'group')
+
+    def get_cache_scopes(self):
+        return (AUTHOR_SCOPE.format(self.author.id),)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['author'] = self.author
+        context['author_counters'] = counters.for_user(self.author.id)
         user = self.request.user
         context['following'] = (self.request.user.is_authenticated
                                 and user.follower.filter
@@ -52,16 +69,37 @@ class Profile(ListView):
         return context
 
 
+class Search(ListView):
+    """Поиск по постам и комментариям, результаты по релевантности."""
+    template_name = 'posts/search.html'
+    context_object_name = 'posts'
+    paginate_by = QTY_OF_POSTS_ON_PAGE
+    query_budget = 5
+
+    def get_queryset(self, **kwargs):
+        self.query = self.request.GET.get('q', '').strip()
+        return search.search(
+            self.query, Post.objects.select_related('author', 'group'))
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.query
+        # ссылки пагинатора сохраняют запрос
+        context['page_query'] = urlencode({'q': self.query}) + '&'
+        return context
+
+
 class PostDetail(DetailView):
     template_name = 'posts/post_detail.html'
     context_object_name = 'post'
-    model = Post
+    queryset = Post.objects.select_related('author', 'group')
+    query_budget = 6
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['post_count'] = Post.objects.filter(
-            author_id=self.object.author).count()
-        context['comments'] = self.object.comments.all()
+        context['post_count'] = counters.for_user(
+            self.object.author_id).posts_count
+        context['comments'] = self.object.comments.select_related('author')
         context['form'] = CommentForm(self.request.POST or None)
         return context
 
@@ -70,11 +108,14 @@ class PostCreate(LoginRequiredMixin, CreateView):
     template_name = 'posts/create_post.html'
     model = Post
     form_class = PostForm
+    query_budget = 16
 
     def form_valid(self, form):
         post = form.save(commit=False)
         post.author = self.request.user
         post.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule_on_commit(post)
         return super().form_valid(form)
 
     def get_success_url(self):
@@ -86,20 +127,33 @@ class PostEdit(LoginRequiredMixin, UpdateView):
     template_name = 'posts/create_post.html'
     model = Post
     form_class = PostForm
+    query_budget = 10
 
     def dispatch(self, request, *args, **kwargs):
         post = self.get_object()
         if (self.request.user.is_authenticated
-                and post.author != self.request.user):
+                and post.author_id != self.request.user.pk):
             return redirect('posts:post_detail', pk=post.id)
         return super(PostEdit, self).dispatch(request, *args, **kwargs)
 
+    def get_object(self, queryset=None):
+        # пост загружается один раз: в dispatch, а get и post берут его же
+        if not hasattr(self, '_post'):
+            self._post = super().get_object(queryset)
+        return self._post
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['post_id'] = self.object.id
         context['is_edit'] = True
         return context
 
+    def form_valid(self, form):
+        response = super().form_valid(form)
+        if 'image' in form.changed_data:
+            thumbnails.schedule_on_commit(self.object)
+        return response
+
     def get_success_url(self):
         return reverse_lazy('posts:post_detail',
                             kwargs={'pk': self.object.id})
@@ -108,6 +162,7 @@ class PostEdit(LoginRequiredMixin, UpdateView):
 class AddComment(LoginRequiredMixin, CreateView):
     model = Comment
     form_class = CommentForm
+    query_budget = 12
 
     def form_valid(self, form):
         comment = form.save(commit=False)
@@ -121,32 +176,46 @@ class AddComment(LoginRequiredMixin, CreateView):
                             kwargs={'pk': self.kwargs['pk']})
 
 
-class FollowIndex(LoginRequiredMixin, ListView):
+class FollowIndex(LoginRequiredMixin, GenerationCacheMixin,
+                  CursorPaginationMixin, ListView):
     template_name = 'posts/follow.html'
     context_object_name = 'posts'
     paginate_by = QTY_OF_POSTS_ON_PAGE
+    query_budget = 7
 
     def get_queryset(self, **kwargs):
-        user = self.request.user
-        authors = user.follower.all().values('author')
-        return Post.objects.filter(author__in=authors)
+        queryset = Post.objects.select_related('author', 'group')
+        if self.is_cursor_mode():
+            # ключи страницы уже отобраны по ленте, посты берутся по pk
+            return queryset
+        authors = self.request.user.follower.all().values('author')
+        return queryset.filter(author__in=authors)
+
+    def get_cursor_sources(self, queryset):
+        return timeline.sources(self.request.user.id)
+
+    def get_cache_scopes(self):
+        return (FEED_SCOPE, FOLLOW_SCOPE.format(self.request.user.id))
 
 
 class ProfileFollow(LoginRequiredMixin, View):
+    query_budget = 14
+
     def get(self, request, username):
         user = self.request.user
-        author = get_object_or_404(User, username=username)
-        if (user != author and not
-                user.follower.filter(author=author.id).exists()):
-            follow = Follow(user=user, author=author)
-            follow.save()
+        author = lookups.user_by_username(username)
+        if user != author:
+            # уникальная пара (user, author) не даёт гонке создать дубль
+            Follow.objects.get_or_create(user=user, author=author)
         return redirect('posts:profile', username=username)
 
 
 class ProfileUnfollow(LoginRequiredMixin, View):
+    query_budget = 10
+
     def get(self, request, username):
         user = self.request.user
-        author = get_object_or_404(User, username=username)
+        author = lookups.user_by_username(username)
         follow = user.follower.get(author=author.id)
         follow.delete()
         return redirect('posts:profile', username=username)
@@ -51,14 +51,19 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.TracingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'core.middleware.RequestCoalescingMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'core.middleware.ProfilingMiddleware',
 ]
 
 INTERNAL_IPS = [
@@ -151,10 +156,128 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 # Настройка кеширования
+# default: LRU в памяти процесса перед общим кешем в таблице БД,
+# см. core.cache_backends.TieredCache
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache_backends.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 60,
+            'SYNC_INTERVAL': 0.5,
+            'SHARED_PREFIXES': ('lock:', 'coalesce:', 'tiered:'),
+        },
+    },
+    # L2 намного больше L1: при вытеснении удаляются и блокировки,
+    # и номера поколений
+    'shared': {
+        'BACKEND': 'core.cache_backends.BatchDatabaseCache',
+        'LOCATION': 'cache_table',
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'CULL_FREQUENCY': 10,
+        },
+    },
+}
+# Время жизни фрагментов лент; устаревают они по поколениям, см. core.cache
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Миниатюры создаются в фоне, см. posts.thumbnails;
+# при THUMBNAIL_WORKERS = 0 — сразу, во время запроса
+THUMBNAIL_BACKEND = 'posts.thumbnails.BackgroundThumbnailBackend'
+THUMBNAIL_KVSTORE = 'posts.thumbnails.KVStore'
+THUMBNAIL_WORKERS = 2
+
+# Загрузки пишутся на диск по частям с подсчётом хеша, см. core.uploads;
+# изображения хранятся по хешу содержимого, см. core.storage
+FILE_UPLOAD_HANDLERS = ['core.uploads.HashingUploadHandler']
+# Больше пикселей в изображении поста — отказ по заголовку, без декодирования
+MAX_IMAGE_PIXELS = 40_000_000
+
+# Максимальная длина материализованной ленты подписок
+TIMELINE_LENGTH = 1000
+# Начиная с этого числа подписчиков посты автора не раскладываются
+# по лентам, а подмешиваются при чтении
+TIMELINE_PULL_THRESHOLD = 10000
+
+# Бюджеты запросов к БД на view, см. core.query_budget;
+# в строгом режиме превышение бюджета — исключение, иначе запись в лог
+QUERY_BUDGET_STRICT = DEBUG
+# Запросы к этим таблицам сверяются с отдельным бюджетом на запрос:
+# сколько их можно при холодном кеше
+QUERY_BUDGET_CACHE_TABLES = ('cache_table', 'core_cacheinvalidation')
+QUERY_BUDGET_CACHE = 40
+
+# Метрики запросов, см. core.metrics: как часто процесс сохраняет свои
+# метрики, кому отдаётся /metrics и добавлять ли заголовок Server-Timing
+METRICS_FLUSH_INTERVAL = 15
+METRICS_ALLOWED_IPS = INTERNAL_IPS
+METRICS_SERVER_TIMING = True
+
+# Журнал медленных запросов к БД, см. core.slow_queries: порог
+# в миллисекундах (None — выключен), скрывать ли значения параметров,
+# файл JSONL и его ротация
+SLOW_QUERY_THRESHOLD_MS = 100
+SLOW_QUERY_REDACT_PARAMS = True
+SLOW_QUERY_LOG = os.path.join(BASE_DIR, 'slow_queries.jsonl')
+SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 5
+
+# Профилирование запросов, см. core.profiling: заголовок, по которому
+# сотрудник включает профиль запроса, доля профилируемых запросов
+# и сколько последних профилей хранить
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_SAMPLE_RATE = 0
+PROFILE_KEEP = 1000
+
+# Трассировка запросов, см. core.tracing: доля трассируемых запросов,
+# заголовок, по которому сотрудник включает трассу, файл JSONL
+# и его ротация
+TRACING_SAMPLE_RATE = 0
+TRACING_HEADER = 'HTTP_X_TRACE'
+TRACING_LOG = os.path.join(BASE_DIR, 'traces.jsonl')
+TRACING_LOG_MAX_BYTES = 50 * 1024 * 1024
+TRACING_LOG_BACKUPS = 5
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'maxBytes': SLOW_QUERY_LOG_MAX_BYTES,
+            'backupCount': SLOW_QUERY_LOG_BACKUPS,
+            'formatter': 'message',
+            'encoding': 'utf-8',
+            'delay': True,
+        },
+        'traces': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': TRACING_LOG,
+            'maxBytes': TRACING_LOG_MAX_BYTES,
+            'backupCount': TRACING_LOG_BACKUPS,
+            'formatter': 'message',
+            'encoding': 'utf-8',
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'core.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        'core.tracing': {
+            'handlers': ['traces'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
 }
 
 # Настройка кастомной страницы ошибки 403